@@ -0,0 +1,162 @@
+"""
+Admission control for the Intellicam AI Engine HTTP API.
+Rejects work early, with a Retry-After hint, when the engine cannot serve it
+in time instead of letting requests queue up in Flask threads.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from config import (
+    ADMISSION_MAX_INFLIGHT, ADMISSION_MAX_QUEUE_DEPTH, ADMISSION_LATENCY_BUDGET,
+    ADMISSION_MAX_STREAMS, ADMISSION_MAX_UTILIZATION, CLIENT_RATE_LIMIT,
+    CLIENT_BURST, CLIENT_BUCKETS_MAX
+)
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate` tokens per second."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self):
+        """
+        Try to take one token.
+
+        Returns:
+            tuple: (bool allowed, float seconds until a token is available)
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True, 0.0
+        return False, (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """
+    Load shedding based on measured engine state.
+
+    Single-frame requests are refused when too many are already running,
+    when the stream scheduler is backed up, or when smoothed request
+    latency is over budget. Each session_id additionally gets its own token
+    bucket. New streams are refused once the stream budget is reached or
+    the measured inference cost of all streams would exceed the worker time
+    available.
+    """
+
+    def __init__(self, scheduler, max_inflight=ADMISSION_MAX_INFLIGHT,
+                 max_queue_depth=ADMISSION_MAX_QUEUE_DEPTH, latency_budget=ADMISSION_LATENCY_BUDGET,
+                 max_streams=ADMISSION_MAX_STREAMS, max_utilization=ADMISSION_MAX_UTILIZATION,
+                 client_rate=CLIENT_RATE_LIMIT, client_burst=CLIENT_BURST):
+        self.scheduler = scheduler
+        self.max_inflight = max_inflight
+        self.max_queue_depth = max_queue_depth
+        self.latency_budget = latency_budget
+        self.max_streams = max_streams
+        self.max_utilization = max_utilization
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+        self._inflight = 0
+        self._latency = 0.0  # EWMA of /detect_frame service seconds
+        self.rejected = {"inflight": 0, "queue": 0, "latency": 0, "rate_limit": 0, "streams": 0}
+
+    def _retry_after(self, depth):
+        # Roughly the time needed to drain the work ahead of the caller
+        per_request = max(self._latency, self.scheduler.frame_latency(), 0.05)
+        return max(1, int(per_request * max(depth, 1) + 0.999))
+
+    def _reject(self, reason, retry_after):
+        self.rejected[reason] += 1
+        return False, retry_after, reason
+
+    def admit_frame(self, session_id):
+        """
+        Decide whether to serve a single-frame detection request.
+
+        Args:
+            session_id (str): Client key for the per-client token bucket
+
+        Returns:
+            tuple: (bool admitted, int Retry-After seconds, str reason)
+        """
+        queue_depth = self.scheduler.queue_depth()
+        with self._lock:
+            if self._inflight >= self.max_inflight:
+                return self._reject("inflight", self._retry_after(self._inflight))
+            if queue_depth >= self.max_queue_depth:
+                return self._reject("queue", self._retry_after(queue_depth))
+            if self._latency > self.latency_budget and self._inflight > 0:
+                return self._reject("latency", self._retry_after(self._inflight))
+
+            bucket = self._buckets.get(session_id)
+            if bucket is None:
+                bucket = self._buckets[session_id] = TokenBucket(self.client_rate, self.client_burst)
+                if len(self._buckets) > CLIENT_BUCKETS_MAX:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(session_id)
+            allowed, wait = bucket.take()
+            if not allowed:
+                return self._reject("rate_limit", max(1, int(wait + 0.999)))
+
+            self._inflight += 1
+            return True, 0, None
+
+    def finish_frame(self, started):
+        """Record completion of an admitted frame request."""
+        latency = time.monotonic() - started
+        with self._lock:
+            self._inflight -= 1
+            self._latency = latency if not self._latency else 0.8 * self._latency + 0.2 * latency
+
+    @contextmanager
+    def track_frame(self):
+        """Context manager wrapping the work of an admitted frame request."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.finish_frame(started)
+
+    def admit_stream(self, active_count, frame_interval):
+        """
+        Decide whether another camera stream fits in the capacity budget.
+
+        Args:
+            active_count (int): Streams currently running
+            frame_interval (float): Target interval of the new stream
+
+        Returns:
+            tuple: (bool admitted, str reason)
+        """
+        with self._lock:
+            if active_count >= self.max_streams:
+                self.rejected["streams"] += 1
+                return False, f"stream budget of {self.max_streams} reached"
+            utilization = self.scheduler.utilization(extra_interval=frame_interval)
+            if utilization > self.max_utilization:
+                self.rejected["streams"] += 1
+                return False, f"projected inference utilization {utilization:.0%} exceeds {self.max_utilization:.0%}"
+            return True, None
+
+    def stats(self):
+        """Return admission counters for health reporting."""
+        with self._lock:
+            return {
+                "inflight_frames": self._inflight,
+                "frame_latency_ms": round(self._latency * 1000, 1),
+                "utilization": round(self.scheduler.utilization(), 2),
+                "max_streams": self.max_streams,
+                "rejected": dict(self.rejected),
+            }
@@ -0,0 +1,331 @@
+"""
+Dwell-time analytics for Intellicam AI Engine.
+Follows detections across frames with a lightweight IoU tracker and keeps
+a few numbers per track (first/last seen, current zone, path length), so
+loitering and intrusion events come straight out of the inference results
+without extra model passes or database queries.
+"""
+
+import math
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from config import (
+    ANALYTICS_ENABLED, ANALYTICS_ZONES, ANALYTICS_LOITER_CLASSES, ANALYTICS_LOITER_SECONDS,
+    ANALYTICS_INTRUSION_CLASSES, ANALYTICS_MATCH_IOU, ANALYTICS_MIN_HITS,
+    ANALYTICS_TRACK_TTL, ANALYTICS_MAX_TRACKS
+)
+
+FRAME_ZONE = "frame"  # Implicit zone covering the whole frame when a stream has none configured
+
+
+def _iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    if not inter:
+        return 0.0
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class Zone:
+    """Rectangular region of the frame, in fractions of its width and height."""
+
+    def __init__(self, name, roi, restricted=False, loiter_seconds=None):
+        """
+        Args:
+            name (str): Zone name reported in events
+            roi (list): [x1, y1, x2, y2] with 0 <= x1 < x2 <= 1 and 0 <= y1 < y2 <= 1
+            restricted (bool): Entering the zone raises an intrusion event
+            loiter_seconds (float): Dwell before a loitering event; None uses
+                ANALYTICS_LOITER_SECONDS
+
+        Raises:
+            ValueError: If the zone is malformed
+        """
+        if not name:
+            raise ValueError("zone name is required")
+        roi = [float(v) for v in roi]
+        if len(roi) != 4 or not (0 <= roi[0] < roi[2] <= 1 and 0 <= roi[1] < roi[3] <= 1):
+            raise ValueError("zone roi must be [x1, y1, x2, y2] with 0 <= x1 < x2 <= 1 and 0 <= y1 < y2 <= 1")
+        if loiter_seconds is not None:
+            loiter_seconds = float(loiter_seconds)
+            if loiter_seconds <= 0:
+                raise ValueError("loiter_seconds must be positive")
+        self.name = name
+        self.roi = roi
+        self.restricted = bool(restricted)
+        self.loiter_seconds = loiter_seconds
+
+    def contains(self, x, y):
+        return self.roi[0] <= x <= self.roi[2] and self.roi[1] <= y <= self.roi[3]
+
+    def to_dict(self):
+        return {"name": self.name, "roi": self.roi, "restricted": self.restricted,
+                "loiter_seconds": self.loiter_seconds}
+
+
+class Track:
+    """Running state of one tracked object; every update is constant time."""
+
+    __slots__ = ("track_id", "object", "confidence", "bbox", "first_seen", "last_seen", "hits",
+                 "center", "path_length", "zone", "zone_entered", "reported")
+
+    def __init__(self, track_id, detection, now):
+        self.track_id = track_id
+        self.object = detection["object"]
+        self.confidence = detection["confidence"]
+        self.bbox = detection["bbox"]
+        self.first_seen = now
+        self.last_seen = now
+        self.hits = 1
+        self.center = ((self.bbox[0] + self.bbox[2]) / 2, (self.bbox[1] + self.bbox[3]) / 2)
+        self.path_length = 0.0
+        self.zone = None
+        self.zone_entered = now
+        self.reported = set()  # Event kinds already raised for the current zone visit
+
+    def update(self, detection, now):
+        bbox = detection["bbox"]
+        center = ((bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2)
+        self.path_length += math.hypot(center[0] - self.center[0], center[1] - self.center[1])
+        self.center = center
+        self.bbox = bbox
+        self.confidence = detection["confidence"]
+        self.last_seen = now
+        self.hits += 1
+
+    def to_dict(self, now):
+        return {
+            "track_id": self.track_id,
+            "object": self.object,
+            "zone": self.zone,
+            "first_seen": datetime.fromtimestamp(self.first_seen).isoformat(),
+            "last_seen": datetime.fromtimestamp(self.last_seen).isoformat(),
+            "dwell_seconds": round(now - self.zone_entered, 1) if self.zone else 0.0,
+            "path_length": round(self.path_length, 1),
+            "hits": self.hits,
+            "bbox": self.bbox,
+        }
+
+
+class _StreamState:
+    def __init__(self, zones):
+        self.zones = zones
+        self.tracks = {}  # track_id -> Track
+        self.next_id = 1
+        self.events = Counter()
+        self.expired = 0
+
+
+class DwellAnalytics:
+    """
+    Per-stream tracks and the loitering and intrusion events derived from them.
+
+    Detections are matched to tracks of the same class by greedy IoU. A
+    track's zone is the first configured zone containing the bottom centre
+    of its box (where a person stands). Loitering fires once per zone visit
+    when a track of a loitering class has stayed in one zone for the zone's
+    threshold; intrusion fires once per visit when a track of an intrusion
+    class enters a restricted zone. Tracks not matched for ANALYTICS_TRACK_TTL
+    seconds are dropped, and each stream keeps at most ANALYTICS_MAX_TRACKS.
+    """
+
+    def __init__(self, zones=ANALYTICS_ZONES, loiter_classes=ANALYTICS_LOITER_CLASSES,
+                 loiter_seconds=ANALYTICS_LOITER_SECONDS, intrusion_classes=ANALYTICS_INTRUSION_CLASSES,
+                 match_iou=ANALYTICS_MATCH_IOU, min_hits=ANALYTICS_MIN_HITS, track_ttl=ANALYTICS_TRACK_TTL,
+                 max_tracks=ANALYTICS_MAX_TRACKS, enabled=ANALYTICS_ENABLED):
+        """
+        Args:
+            zones (dict): stream_id -> list of zone settings (see Zone); the
+                "*" entry applies to streams without their own
+            loiter_classes (iterable): Classes that can loiter
+            loiter_seconds (float): Default dwell before a loitering event
+            intrusion_classes (iterable): Classes that trigger restricted zones
+            match_iou (float): Minimum IoU to continue a track
+            min_hits (int): Matches a track needs before it raises events
+            track_ttl (float): Seconds a track survives without a match
+            max_tracks (int): Tracks kept per stream; the stalest go first
+            enabled (bool): When False update() does nothing
+        """
+        self.loiter_classes = frozenset(loiter_classes)
+        self.loiter_seconds = loiter_seconds
+        self.intrusion_classes = frozenset(intrusion_classes)
+        self.match_iou = match_iou
+        self.min_hits = max(1, min_hits)
+        self.track_ttl = track_ttl
+        self.max_tracks = max(1, max_tracks)
+        self.enabled = enabled
+        self._zones = {stream_id: [Zone(**z) for z in zone_list] for stream_id, zone_list in zones.items()}
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def _state(self, stream_id):
+        state = self._streams.get(stream_id)
+        if state is None:
+            zones = self._zones.get(stream_id, self._zones.get("*", []))
+            state = self._streams[stream_id] = _StreamState(zones)
+        return state
+
+    def set_zones(self, stream_id, zones):
+        """
+        Replace a stream's zones; tracks re-evaluate their zone on the next frame.
+
+        Returns:
+            list: The new zones as dicts
+
+        Raises:
+            ValueError: If a zone is malformed
+        """
+        try:
+            parsed = [Zone(**z) for z in zones]
+        except TypeError as e:
+            raise ValueError(f"Invalid zone: {e}")
+        if len({z.name for z in parsed}) != len(parsed):
+            raise ValueError("zone names must be unique")
+        with self._lock:
+            self._zones[stream_id] = parsed
+            if stream_id in self._streams:
+                self._streams[stream_id].zones = parsed
+        return [z.to_dict() for z in parsed]
+
+    def zones_for(self, stream_id):
+        zones = self._zones.get(stream_id, self._zones.get("*", []))
+        return [z.to_dict() for z in zones]
+
+    def _zone_of(self, zones, bbox, width, height):
+        if not zones:
+            return FRAME_ZONE, None
+        x, y = (bbox[0] + bbox[2]) / 2 / width, bbox[3] / height
+        for zone in zones:
+            if zone.contains(x, y):
+                return zone.name, zone
+        return None, None
+
+    def _match(self, tracks, detections):
+        """Greedy IoU assignment of detections to tracks of the same class."""
+        pairs = []
+        for i, detection in enumerate(detections):
+            for track in tracks:
+                if track.object == detection["object"]:
+                    overlap = _iou(track.bbox, detection["bbox"])
+                    if overlap >= self.match_iou:
+                        pairs.append((overlap, i, track))
+        pairs.sort(key=lambda p: p[0], reverse=True)
+        matched, used = {}, set()
+        for _, i, track in pairs:
+            if i not in matched and track.track_id not in used:
+                matched[i] = track
+                used.add(track.track_id)
+        return matched
+
+    def _event(self, kind, stream_id, track, now, threshold=None):
+        event = {
+            "event": kind,
+            "stream_id": stream_id,
+            "track_id": track.track_id,
+            "object": track.object,
+            "confidence": track.confidence,
+            "zone": track.zone,
+            "dwell_seconds": round(now - track.zone_entered, 1),
+            "path_length": round(track.path_length, 1),
+            "first_seen": datetime.fromtimestamp(track.first_seen).isoformat(),
+            "timestamp": datetime.fromtimestamp(now).isoformat(),
+            "bbox": track.bbox,
+        }
+        if threshold is not None:
+            event["threshold_seconds"] = threshold
+        return event
+
+    def update(self, stream_id, detections, frame_shape, now=None):
+        """
+        Advance a stream's tracks by one inference result.
+
+        Args:
+            stream_id (str): Stream identifier
+            detections (list): Detection dicts with "object", "confidence"
+                and "bbox" in frame pixels
+            frame_shape (tuple): Shape of the frame the boxes refer to
+            now (float): Unix time of the frame (defaults to now)
+
+        Returns:
+            list: Loitering and intrusion events raised by this frame
+        """
+        if not self.enabled:
+            return []
+        now = time.time() if now is None else now
+        height, width = frame_shape[:2]
+        events = []
+
+        with self._lock:
+            state = self._state(stream_id)
+            tracks = state.tracks
+
+            for track_id in [tid for tid, t in tracks.items() if now - t.last_seen > self.track_ttl]:
+                del tracks[track_id]
+                state.expired += 1
+
+            matched = self._match(tracks.values(), detections)
+            for i, detection in enumerate(detections):
+                track = matched.get(i)
+                if track is None:
+                    track = Track(state.next_id, detection, now)
+                    tracks[track.track_id] = track
+                    state.next_id += 1
+                else:
+                    track.update(detection, now)
+
+                zone_name, zone = self._zone_of(state.zones, track.bbox, width, height)
+                if zone_name != track.zone:
+                    track.zone = zone_name
+                    track.zone_entered = now
+                    track.reported.clear()
+                if track.zone is None or track.hits < self.min_hits:
+                    continue
+
+                if (zone is not None and zone.restricted and track.object in self.intrusion_classes
+                        and "intrusion" not in track.reported):
+                    track.reported.add("intrusion")
+                    events.append(self._event("intrusion", stream_id, track, now))
+
+                threshold = zone.loiter_seconds if zone is not None and zone.loiter_seconds else self.loiter_seconds
+                if (track.object in self.loiter_classes and "loitering" not in track.reported
+                        and now - track.zone_entered >= threshold):
+                    track.reported.add("loitering")
+                    events.append(self._event("loitering", stream_id, track, now, threshold))
+
+            if len(tracks) > self.max_tracks:
+                for track in sorted(tracks.values(), key=lambda t: t.last_seen)[:len(tracks) - self.max_tracks]:
+                    del tracks[track.track_id]
+                    state.expired += 1
+
+            state.events.update(event["event"] for event in events)
+        return events
+
+    def tracks(self, stream_id):
+        """Live tracks of a stream, longest-dwelling first."""
+        now = time.time()
+        with self._lock:
+            state = self._streams.get(stream_id)
+            tracks = [t.to_dict(now) for t in state.tracks.values()] if state else []
+        return sorted(tracks, key=lambda t: t["dwell_seconds"], reverse=True)
+
+    def remove(self, stream_id):
+        """Forget a stopped stream's tracks (configured zones are kept)."""
+        with self._lock:
+            self._streams.pop(stream_id, None)
+
+    def stats(self):
+        """Track and event counts per stream for health reporting."""
+        with self._lock:
+            return {
+                stream_id: {
+                    "tracks": len(state.tracks),
+                    "expired": state.expired,
+                    "events": dict(state.events),
+                }
+                for stream_id, state in self._streams.items()
+            }
@@ -1,8 +1,8 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
 from flask_restx import Api, Resource, fields
 from flask_cors import CORS
-from ultralytics import YOLO
 import cv2
+import atexit
 import threading
 import time
 from datetime import datetime
@@ -10,21 +10,94 @@ import requests
 import os
 import base64
 import numpy as np
-from config import DETECTION_THRESHOLD, TARGET_CLASSES
+from concurrent.futures import ThreadPoolExecutor
+from config import (
+    DETECTION_THRESHOLD, TARGET_CLASSES, FRAME_INTERVAL, DEFAULT_STREAM_PRIORITY,
+    SCHEDULER_BATCH_SIZE, SCHEDULER_WORKERS, FFMPEG_FPS_MARGIN, ENGINE_CAPACITY,
+    PREVIEW_DEFAULT_WIDTH, PREVIEW_DEFAULT_FPS, MODEL_PATH, CASCADE_ENABLED,
+    DEFAULT_CAMERA_WIDTH, DEFAULT_CAMERA_HEIGHT, PROFILE_MAX_SECONDS, STREAM_RESUME_ENABLED,
+    QUALITY_STALE_SECONDS
+)
+from scheduler import InferenceScheduler
+from ffmpeg_capture import open_capture
+from clip_recorder import ClipRecorder
+from admission import AdmissionController
+from event_stream import EventBroadcaster
+from preview import PreviewHub
+from model_registry import ModelRegistry
+from cpu_inference import load_model as load_cpu_model
+from cascade import DetectionCascade
+from resources import ResourceManager
+from journal import DetectionJournal
+from tracing import StageTracer, HopLatency, new_trace_id, sample_profile
+from profiles import ProfileRegistry, MotionGate, PROFILE_FIELDS, merge_profiles
+from preprocess import Preprocessor
+from analytics import DwellAnalytics
+from stream_store import StreamStore, StreamResumer
+from quality import FrameQualityGate
+from capture_hub import CaptureHub, redact_url
 
 app = Flask(__name__)
 CORS(app)  # Allow all origins
 api = Api(app, version='1.0', title='Intellicam AI Engine API',
           description='YOLOv8 Object Detection API for Smart Surveillance')
 
+# Thread budget first, so the model's CPU benchmarks run under it
+resource_manager = ResourceManager()
+resource_manager.setup()
+
 # Load model
-model = YOLO('yolov8n.pt')
-active_streams = {}
+preprocessor = Preprocessor()
+model_registry = ModelRegistry(loader=load_cpu_model, preprocessor=preprocessor)
+model_registry.load_initial(MODEL_PATH)
+cascade = DetectionCascade.from_config(preprocessor)
+active_streams = {}  # stream_id -> stream settings
+profiles = ProfileRegistry()
+alert_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="alert")
+clip_recorder = ClipRecorder()
+event_broadcaster = EventBroadcaster()
+preview_hub = PreviewHub()
+detection_journal = DetectionJournal().start()
+atexit.register(detection_journal.close)
+tracer = StageTracer()
+alert_latency = HopLatency()  # Capture-to-backend hops of every alert, by trace ID
+analytics = DwellAnalytics()
+stream_store = StreamStore()
+quality_gates = {}  # source_id -> FrameQualityGate
 
 # API Models for Swagger
 start_detection_model = api.model('StartDetection', {
     'stream_url': fields.String(required=True, description='IP camera stream URL', example='http://10.172.201.200:8080/video'),
-    'stream_id': fields.String(required=False, description='Unique stream identifier', example='camera_1')
+    'stream_id': fields.String(required=False, description='Unique stream identifier', example='camera_1'),
+    'priority': fields.Integer(required=False, description='Scheduling priority; higher is served first under overload', example=DEFAULT_STREAM_PRIORITY),
+    'profile': fields.String(required=False, description='Pipeline profile (threshold, classes, sample rate, imgsz, gating, ROI)', example='default'),
+    'frame_interval': fields.Float(required=False, description='Per-stream override of the profile\'s seconds between inferences', example=FRAME_INTERVAL),
+    'cascade': fields.Boolean(required=False, description='Per-stream override: run a cheap low-resolution prefilter and only escalate candidate frames to full inference', example=CASCADE_ENABLED),
+    'user_id': fields.String(required=False, description='Owner of the camera; sent with every alert so the backend can notify them', example='65f0c0ffee')
+})
+
+profile_model = api.model('PipelineProfile', {
+    'threshold': fields.Float(required=False, description='Detection confidence threshold', example=0.5),
+    'target_classes': fields.List(fields.String, required=False, description='Classes that raise alerts', example=['knife', 'gun']),
+    'frame_interval': fields.Float(required=False, description='Target seconds between inferences', example=1.0),
+    'imgsz': fields.Integer(required=False, description='Inference size (multiple of 32, null = model default)', example=320),
+    'gating': fields.String(required=False, description='none, motion or cascade', example='motion'),
+    'roi': fields.List(fields.Float, required=False, description='[x1, y1, x2, y2] as fractions of the frame, null = whole frame', example=[0, 0.3, 1, 1])
+})
+
+stream_profile_model = api.model('StreamProfile', {
+    'profile': fields.String(required=True, description='Profile name', example='fast')
+})
+
+zone_model = api.model('Zone', {
+    'name': fields.String(required=True, description='Zone name', example='entrance'),
+    'roi': fields.List(fields.Float, required=True, description='[x1, y1, x2, y2] as fractions of the frame', example=[0.6, 0.4, 1, 1]),
+    'restricted': fields.Boolean(required=False, description='Entering the zone raises an intrusion event', example=True),
+    'loiter_seconds': fields.Float(required=False, description='Dwell before a loitering event (null = engine default)', example=30)
+})
+
+stream_zones_model = api.model('StreamZones', {
+    'zones': fields.List(fields.Nested(zone_model), required=True, description='Zones replacing the stream\'s current ones; empty = whole frame')
 })
 
 stop_detection_model = api.model('StopDetection', {
@@ -33,7 +106,14 @@ stop_detection_model = api.model('StopDetection', {
 
 frame_detection_model = api.model('FrameDetection', {
     'image_data': fields.String(required=True, description='Base64 encoded image frame'),
-    'session_id': fields.String(required=False, description='Session identifier', example='demo_session')
+    'session_id': fields.String(required=False, description='Session identifier', example='demo_session'),
+    'profile': fields.String(required=False, description='Pipeline profile for this frame', example='default')
+})
+
+load_model_model = api.model('LoadModel', {
+    'path': fields.String(required=True, description='Path to .pt or .onnx weights', example='models/custom/weapons.pt'),
+    'version': fields.String(required=False, description='Version label', example='weapons-2025-06-01'),
+    'canary_percent': fields.Integer(required=False, description='Percentage of streams routed to the new model before promotion (0 = promote when ready)', example=10)
 })
 
 detection_response = api.model('DetectionResponse', {
@@ -43,114 +123,391 @@ detection_response = api.model('DetectionResponse', {
     'stream_id': fields.String(description='Stream identifier')
 })
 
-def process_stream(stream_url, stream_id):
-    """Process camera stream and send detections to backend"""
-    print(f"Starting stream processing for {stream_id} at {stream_url}")
+def run_inference(frames, source_ids):
+    """Run a scheduler batch, grouping frames by model version and pipeline profile"""
+    groups = {}
+    for index, source_id in enumerate(source_ids):
+        source = capture_hub.get(source_id)
+        if source is None or source.profile is None:
+            continue  # Source closed while its frame was queued
+        # Each frame reads its source's profile once, so edits land between frames
+        version = model_registry.model_for(source_id)
+        profile = source.profile
+        groups.setdefault((id(version), id(profile)), (version, profile, []))[2].append(index)
+    
+    results = [None] * len(frames)
+    for version, profile, indices in groups.values():
+        crops, offsets = zip(*(profile.crop(frames[i]) for i in indices))
+        if profile.gating == "cascade":
+            # Cascade streams pay for the cheap pass first; the rest go straight to the full model
+            outputs = cascade.run(version.model, list(crops), [source_ids[i] for i in indices],
+                                  profile.threshold, target_classes=profile.target_classes, imgsz=profile.imgsz)
+        else:
+            outputs = preprocessor.run(version.model, list(crops), **profile.predict_args())
+        for index, offset, result in zip(indices, offsets, outputs):
+            results[index] = (result, profile, offset)
+    return results
+
+def benchmark_inference():
+    """One full scheduler-sized batch on blank frames, for the resource autotuner"""
+    frame = np.zeros((DEFAULT_CAMERA_HEIGHT, DEFAULT_CAMERA_WIDTH, 3), dtype=np.uint8)
+    preprocessor.run(model_registry.active.model, [frame] * SCHEDULER_BATCH_SIZE, conf=DETECTION_THRESHOLD, verbose=False)
+    return SCHEDULER_BATCH_SIZE
+
+_benchmark_jpeg = cv2.imencode('.jpg', np.random.randint(0, 255, (1080, 1920, 3), dtype=np.uint8))[1]
+
+def benchmark_decode():
+    """Decode and downscale one 1080p frame, standing in for camera capture"""
+    frame = cv2.imdecode(_benchmark_jpeg, cv2.IMREAD_COLOR)
+    cv2.resize(frame, (DEFAULT_CAMERA_WIDTH, DEFAULT_CAMERA_HEIGHT), interpolation=cv2.INTER_AREA)
+
+scheduler = InferenceScheduler(run_inference, batch_size=SCHEDULER_BATCH_SIZE, workers=SCHEDULER_WORKERS,
+                               thread_init=resource_manager.pin_inference_thread, tracer=tracer)
+scheduler.start()
+admission = AdmissionController(scheduler)
+
+def refresh_source(source):
+    """Re-merge a source's profile and scheduling after its streams or their profiles change"""
+    members = [profiles.for_stream(stream_id) for stream_id in source.stream_ids()]
+    if not members:
+        return
+    source.profile = merge_profiles(source.source_id, members)
+    scheduler.set_interval(source.source_id, source.profile.frame_interval)
+    scheduler.set_priority(source.source_id, source.priority())
+
+def on_profile_change(stream_id, profile):
+    source = capture_hub.source_for(stream_id)
+    if source is not None:
+        refresh_source(source)
+
+profiles.on_change(on_profile_change)
+
+def handle_source_results(source, frame, output, trace):
+    """Fan one inference result out to every stream on the source, each with its own filters"""
+    results, profile, (x_offset, y_offset) = output
+    tracer.record_result(source.source_id, results)
+    alert_latency.observe("capture_to_result", time.monotonic() - trace["captured"])
+    timestamp = datetime.now().isoformat()
+    height, width = frame.shape[:2]
+    boxes = []
+    for x1, y1, x2, y2, conf, class_id in results.boxes.data.tolist():
+        boxes.append((results.names[int(class_id)], conf,
+                      [int(x1) + x_offset, int(y1) + y_offset, int(x2) + x_offset, int(y2) + y_offset]))
+
+    now = time.monotonic()
+    clip_id = None
+    for stream_id in source.stream_ids():
+        stream_profile = profiles.for_stream(stream_id)
+        if not source.due(stream_id, stream_profile.frame_interval, now):
+            continue  # This stream samples slower than the source
+        matches = [box for box in boxes if stream_profile.accepts(*box, width, height)]
+        if matches and clip_id is None:
+            clip_id = clip_recorder.trigger(source.source_id)
+        total_objects = sum(1 for _, conf, _ in boxes if conf >= stream_profile.threshold)
+        handle_stream_results(stream_id, frame, matches, total_objects, timestamp, clip_id, trace)
+
+def handle_stream_results(stream_id, frame, matches, total_objects, timestamp, clip_id, trace):
+    """Turn one stream's share of a result into alerts and live events"""
+    started = time.perf_counter()
+    detections = [{
+        "object": class_name,
+        "confidence": round(conf, 2),
+        "timestamp": timestamp,
+        "stream_id": stream_id,
+        "clip_id": clip_id,
+        "trace_id": trace["trace_id"],
+        "bbox": bbox
+    } for class_name, conf, bbox in matches]
+
+    # Live viewers get every result, including empty ones
+    preview_hub.update_detections(stream_id, detections)
+    event_broadcaster.publish(stream_id, {
+        "stream_id": stream_id,
+        "timestamp": timestamp,
+        "detections": detections,
+        "total_objects": total_objects,
+        "threats_found": len(detections)
+    })
+
+    # Loitering and intrusion come from tracking the detections we already have
+    analytics_events = analytics.update(stream_id, detections, frame.shape)
+    for event in analytics_events:
+        event["clip_id"] = clip_id
+        event["trace_id"] = trace["trace_id"]
+        event_broadcaster.publish(stream_id, event, event_type="analytics")
+
+    backend_url = os.environ.get('BACKEND_URL')
+    user_id = active_streams.get(stream_id, {}).get("user_id")
+    for event in analytics_events:
+        print(f"{event['event'].upper()}: {event['object']} track {event['track_id']} in {event['zone']} "
+              f"for {event['dwell_seconds']}s - {stream_id}")
+        detection_journal.write(dict(event))
+        if backend_url:
+            alert = {k: v for k, v in event.items() if k != "bbox"}
+            if user_id:
+                alert["user_id"] = user_id
+            alert_executor.submit(post_alert, backend_url, alert, trace)
+
+    for detection in detections:
+        print(f"THREAT DETECTED: {detection}")
+        detection_journal.write(dict(detection))
+
+        # Send to backend if URL is configured via environment variable
+        if backend_url:
+            alert = {k: v for k, v in detection.items() if k != "bbox"}
+            if user_id:
+                alert["user_id"] = user_id
+            alert_executor.submit(post_alert, backend_url, alert, trace)
+
+    if not detections:
+        print(f"Coast clear - {stream_id} - {datetime.now().strftime('%H:%M:%S')}")
+    tracer.record(stream_id, "results", time.perf_counter() - started)
+
+def post_alert(backend_url, detection, trace=None):
+    """POST an alert off the inference thread, stamped with its frame's trace"""
+    headers = {}
+    if trace is not None:
+        # Wall-clock stamps let the backend time its own hops from capture;
+        # the engine's hops use the monotonic capture time
+        elapsed = time.monotonic() - trace["captured"]
+        detection = dict(detection, trace_id=trace["trace_id"], captured_at=trace["captured_at"],
+                         sent_at=time.time(), engine_ms=round(elapsed * 1000, 1))
+        headers["X-Trace-Id"] = trace["trace_id"]
+        alert_latency.observe("capture_to_alert_sent", elapsed)
+    try:
+        started = time.monotonic()
+        with tracer.span(detection.get("stream_id"), "alert_post"):
+            requests.post(backend_url, json=detection, headers=headers, timeout=3)
+        alert_latency.observe("alert_post", time.monotonic() - started)
+        if trace is not None:
+            alert_latency.observe("capture_to_alert_ack", time.monotonic() - trace["captured"])
+        print(f"Alert sent to backend: {backend_url}")
+    except Exception as e:
+        print(f"Failed to send alert: {e}")
+
+def release_stream(stream_id, source):
+    """Detach a stream from its capture source and, unless it was restarted elsewhere, clean it up"""
+    capture_hub.unsubscribe(stream_id, source)
+    if not source.closed:
+        refresh_source(source)
+    if stream_id in active_streams:
+        return  # Restarted on another source before this one noticed
+    event_broadcaster.close_stream(stream_id)
+    preview_hub.remove(stream_id)
+    tracer.remove(stream_id)
+    analytics.remove(stream_id)
+    profiles.release(stream_id)
+    print(f"Stream {stream_id} stopped")
+
+def process_source(source):
+    """
+    Capture one camera for every stream subscribed to it and hand frames to the inference scheduler.
+
+    Stale feeds are reconnected from inside this loop, so the loop must keep
+    turning even when a camera stalls. The capture's own read timeout is what
+    guarantees that: FFmpegCapture fails a read after FFMPEG_READ_TIMEOUT
+    seconds without data, and open_capture() gives OpenCV network captures
+    the same read timeout. A failed read counts towards staleness like a
+    frozen frame does, so QUALITY_STALE_SECONDS later the feed is reopened.
+    """
+    resource_manager.pin_capture_thread()
+    source_id, stream_url = source.source_id, source.stream_url
+    print(f"Starting capture {source_id} at {redact_url(stream_url)} for {', '.join(source.stream_ids())}")
     
     # Test connection first
     try:
-        import requests
         test_response = requests.head(stream_url, timeout=5)
         print(f"Stream URL test - Status: {test_response.status_code}")
     except Exception as e:
         print(f"WARNING: Stream URL not reachable via HTTP: {e}")
     
-    cap = cv2.VideoCapture(stream_url)
+    # The ffmpeg decode rate is fixed here; later profile changes only move the inference rate
+    refresh_source(source)
+    frame_interval = source.profile.frame_interval
+    cap = open_capture(stream_url, fps=FFMPEG_FPS_MARGIN / frame_interval)
     
     if not cap.isOpened():
-        print(f"ERROR: Cannot connect to camera stream: {stream_url}")
+        print(f"ERROR: Cannot connect to camera stream: {redact_url(stream_url)}")
         print(f"Possible causes: Local IP not accessible from cloud, stream offline, wrong URL")
-        if stream_id in active_streams:
-            del active_streams[stream_id]
+        for stream_id in source.stream_ids():
+            if capture_hub.source_for(stream_id) is source:
+                active_streams.pop(stream_id, None)
+            release_stream(stream_id, source)
         return
     
-    print(f"Successfully connected to camera: {stream_id}")
-    last_process_time = time.time()
+    print(f"Successfully connected to camera: {source_id}")
+    scheduler.register(source_id, source.profile.frame_interval, source.priority(),
+                       lambda frame, output, trace: handle_source_results(source, frame, output, trace))
+    motion_gate = MotionGate()
+    quality_gate = quality_gates[source_id] = FrameQualityGate()
+    next_gate_check = 0.0
     frame_count = 0
     
-    while stream_id in active_streams:
-        ret, frame = cap.read()
-        if not ret:
-            print(f"ERROR: Cannot read frame from {stream_id} - Stream may be disconnected")
-            time.sleep(1)
-            continue
-            
-        frame_count += 1
-        if frame_count % 30 == 0:  # Every 30 frames
-            print(f"Stream {stream_id} active - processed {frame_count} frames")
+    try:
+        while not source.closed:
+            # Streams stopped (or restarted elsewhere) since the last frame leave here;
+            # the last one to leave closes the source
+            for stream_id in source.stream_ids():
+                if stream_id not in active_streams or capture_hub.source_for(stream_id) is not source:
+                    release_stream(stream_id, source)
+            if source.closed:
+                break
             
-        current_time = time.time()
-        if current_time - last_process_time < 1:  # 1 FPS
-            continue
-        last_process_time = current_time
-        
-        try:
-            # Run detection
-            results = model(frame, conf=DETECTION_THRESHOLD)[0]
-            detections_found = False
+            # A frozen or dead feed looks healthy from cap.read(); reopen it instead
+            if quality_gate.is_stale():
+                print(f"WARNING: {source_id} has had no new frame for {QUALITY_STALE_SECONDS}s - reconnecting")
+                cap.release()
+                cap = open_capture(stream_url, fps=FFMPEG_FPS_MARGIN / frame_interval)
+                quality_gate.reconnects += 1
+                quality_gate.reset()
+                motion_gate = MotionGate()
+                continue
             
-            for r in results.boxes.data.tolist():
-                x1, y1, x2, y2, conf, class_id = r
-                class_name = model.names[int(class_id)]
+            with tracer.span(source_id, "capture"):
+                ret, frame = cap.read()
+            captured, captured_at = time.monotonic(), time.time()
+            if not ret:
+                print(f"ERROR: Cannot read frame from {source_id} - Stream may be disconnected")
+                time.sleep(1)
+                continue
                 
-                if class_name in TARGET_CLASSES:
-                    detections_found = True
-                    detection = {
-                        "object": class_name,
-                        "confidence": round(conf, 2),
-                        "timestamp": datetime.now().isoformat(),
-                        "stream_id": stream_id
-                    }
-                    
-                    print(f"THREAT DETECTED: {detection}")
-                    
-                    # Send to backend if URL is configured via environment variable
-                    backend_url = os.environ.get('BACKEND_URL')
-                    if backend_url:
-                        try:
-                            requests.post(backend_url, json=detection, timeout=3)
-                            print(f"Alert sent to backend: {backend_url}")
-                        except Exception as e:
-                            print(f"Failed to send alert: {e}")
+            frame_count += 1
+            source.frames = frame_count
+            if frame_count % 30 == 0:  # Every 30 frames
+                print(f"Source {source_id} active - processed {frame_count} frames")
             
-            if not detections_found:
-                print(f"Coast clear - {stream_id} - {datetime.now().strftime('%H:%M:%S')} - Frame: {frame_count}")
-                
-        except Exception as e:
-            print(f"Detection error: {e}")
+            # Only the latest due frame is kept; the scheduler decides when it runs.
+            # Copy it, since capture backends may reuse the frame buffer.
+            with tracer.span(source_id, "clip_buffer"):
+                clip_recorder.record(source_id, frame)
+            for stream_id in source.stream_ids():
+                preview_hub.update_frame(stream_id, frame)
+            if scheduler.is_due(source_id) and time.monotonic() >= next_gate_check:
+                # Dark, blurry, duplicate and frozen frames never reach the scheduler
+                with tracer.span(source_id, "quality_gate"):
+                    rejected = quality_gate.check(frame)
+                if rejected:
+                    continue
+                profile = source.profile
+                if profile.gating == "motion" and not motion_gate.check(frame):
+                    # Static scene: look again one interval later instead of every frame
+                    next_gate_check = time.monotonic() + profile.frame_interval
+                    continue
+                # The trace follows this frame through inference to the backend's notifications
+                scheduler.submit(source_id, frame.copy(), {
+                    "trace_id": new_trace_id(),
+                    "captured": captured,
+                    "captured_at": captured_at
+                })
+    finally:
+        for stream_id in source.stream_ids():
+            release_stream(stream_id, source)
+        scheduler.unregister(source_id)
+        clip_recorder.remove(source_id)
+        cascade.remove(source_id)
+        tracer.remove(source_id)
+        quality_gates.pop(source_id, None)
+        cap.release()
     
-    cap.release()
-    print(f"Stream {stream_id} stopped - Total frames processed: {frame_count}")
+    print(f"Capture {source_id} stopped - Total frames processed: {frame_count}")
+
+capture_hub = CaptureHub(process_source)
+
+def start_stream(stream_id, stream_url, priority, profile_name, overrides, user_id=None):
+    """
+    Admit a stream and attach it to the capture source for its URL.
+
+    Returns:
+        tuple: (response body, HTTP status)
+    """
     if stream_id in active_streams:
-        del active_streams[stream_id]
+        return {"error": "Stream already active", "stream_id": stream_id}, 400
+    
+    if profiles.get(profile_name) is None:
+        return {"error": f"Unknown profile: {profile_name}"}, 400
+    try:
+        profile = profiles.get(profile_name).replace(**overrides)
+    except (TypeError, ValueError) as e:
+        return {"error": f"Invalid stream settings: {e}"}, 400
+    
+    # A stream that shares an open camera at no faster a rate adds no inference load
+    shared = capture_hub.source_for_url(stream_url)
+    extra_interval = profile.frame_interval
+    if shared is not None and shared.profile is not None and shared.profile.frame_interval <= profile.frame_interval:
+        extra_interval = None
+    admitted, reason = admission.admit_stream(len(active_streams), extra_interval)
+    if not admitted:
+        return {"error": "Engine at capacity", "reason": reason, "stream_id": stream_id}, 503
+    
+    profiles.assign(stream_id, profile_name, overrides)
+    active_streams[stream_id] = {
+        "stream_url": stream_url,
+        "priority": priority,
+        "user_id": user_id
+    }
+    # Streams on the same camera share one capture, decode and inference pass
+    source = capture_hub.subscribe(stream_id, stream_url, priority)
+    active_streams[stream_id]["source_id"] = source.source_id
+    refresh_source(source)
+    
+    return {
+        "status": "detection_started", 
+        "stream_id": stream_id,
+        "stream_url": stream_url,
+        "source_id": source.source_id,
+        "shared_with": [sid for sid in source.stream_ids() if sid != stream_id],
+        "priority": priority,
+        "profile": profile_name,
+        "settings": profile.to_dict()
+    }, 200
+
+def resume_stream(stream_id, definition):
+    """Start a stream from its stored definition (used by the resumer after boot)"""
+    body, status = start_stream(stream_id, definition["stream_url"],
+                                int(definition.get("priority", DEFAULT_STREAM_PRIORITY)),
+                                definition.get("profile") or profiles.default, definition.get("overrides") or {},
+                                definition.get("user_id"))
+    return status == 200, body.get("error") if status != 200 else None
 
 @api.route('/start_detection')
 class StartDetection(Resource):
     @api.expect(start_detection_model)
     @api.doc('start_detection')
     def post(self):
-        """Start object detection on IP camera stream"""
+        """Start object detection on IP camera stream (persisted and resumed after restarts)"""
         data = request.json
         stream_url = data.get('stream_url')
         stream_id = data.get('stream_id', f'stream_{int(time.time())}')
         
-        if not stream_url:
-            return {"error": "stream_url is required"}, 400
+        try:
+            priority = int(data.get('priority', DEFAULT_STREAM_PRIORITY))
+        except (TypeError, ValueError):
+            return {"error": "priority must be an integer"}, 400
         
-        if stream_id in active_streams:
-            return {"error": "Stream already active", "stream_id": stream_id}, 400
+        # frame_interval and cascade are per-stream overrides on top of the profile
+        profile_name = data.get('profile') or profiles.default
+        overrides = {}
+        if data.get('frame_interval') is not None:
+            overrides["frame_interval"] = data['frame_interval']
+        if bool(data.get('cascade', CASCADE_ENABLED)):
+            overrides["gating"] = "cascade"
         
-        active_streams[stream_id] = True
-        thread = threading.Thread(target=process_stream, args=(stream_url, stream_id))
-        thread.daemon = True
-        thread.start()
+        if not stream_url:
+            return {"error": "stream_url is required"}, 400
         
-        return {
-            "status": "detection_started", 
-            "stream_id": stream_id,
-            "stream_url": stream_url,
-            "target_classes": list(TARGET_CLASSES)
-        }
+        user_id = data.get('user_id')
+        if user_id is not None:
+            user_id = str(user_id)
+        body, status = start_stream(stream_id, stream_url, priority, profile_name, overrides, user_id)
+        if status == 200:
+            stream_store.save(stream_id, {
+                "stream_url": stream_url,
+                "priority": priority,
+                "profile": profile_name,
+                "overrides": overrides,
+                "user_id": user_id
+            })
+        return body, status
 
 @api.route('/stop_detection')
 class StopDetection(Resource):
@@ -164,9 +521,14 @@ class StopDetection(Resource):
         if not stream_id:
             return {"error": "stream_id is required"}, 400
         
+        # Stopping also forgets the stream, including one that never came back after a restart
+        stored = stream_id in stream_store.all()
+        stream_store.remove(stream_id)
         if stream_id in active_streams:
             del active_streams[stream_id]
             return {"status": "detection_stopped", "stream_id": stream_id}
+        if stored:
+            return {"status": "detection_stopped", "stream_id": stream_id, "was_active": False}
         
         return {"error": "Stream not found"}, 404
 
@@ -179,10 +541,228 @@ class Health(Resource):
             "status": "AI engine running",
             "active_streams": len(active_streams),
             "stream_ids": list(active_streams.keys()),
-            "model_loaded": True,
-            "target_classes": list(TARGET_CLASSES)
+            "model_loaded": model_registry.active is not None,
+            "model_version": model_registry.active.version if model_registry.active else None,
+            "models": model_registry.stats(),
+            "capacity": ENGINE_CAPACITY,
+            "target_classes": sorted(profiles.get(profiles.default).target_classes),
+            "scheduler": scheduler.stats(),
+            "clips": clip_recorder.stats(),
+            "admission": admission.stats(),
+            "event_subscribers": event_broadcaster.stats(),
+            "preview_viewers": preview_hub.stats(),
+            "cascade": cascade.stats(),
+            "resources": resource_manager.stats(),
+            "journal": detection_journal.stats(),
+            "analytics": analytics.stats(),
+            "resume": stream_resumer.status(),
+            "quality": {source_id: gate.stats() for source_id, gate in list(quality_gates.items())},
+            "sources": capture_hub.stats()
         }
 
+@api.route('/clips/<string:clip_id>')
+class Clip(Resource):
+    @api.doc('get_clip')
+    def get(self, clip_id):
+        """Download a recorded alert clip"""
+        path = clip_recorder.clip_path(os.path.basename(clip_id))
+        if not os.path.isfile(path):
+            return {"error": "Clip not found or still recording"}, 404
+        return send_file(path, mimetype='video/x-msvideo')
+
+@api.route('/models')
+class Models(Resource):
+    @api.doc('get_models')
+    def get(self):
+        """Active, canary and previous model versions with load timings"""
+        return model_registry.stats()
+
+@api.route('/models/load')
+class LoadModel(Resource):
+    @api.expect(load_model_model)
+    @api.doc('load_model')
+    def post(self):
+        """Load and warm up a model version in the background, then swap it in"""
+        data = request.json or {}
+        path = data.get('path')
+        if not path:
+            return {"error": "path is required"}, 400
+        if not os.path.isfile(path):
+            return {"error": f"Model file not found: {path}"}, 400
+        
+        try:
+            canary_percent = int(data.get('canary_percent', 0))
+            entry = model_registry.load(path, version=data.get('version'), canary_percent=canary_percent)
+        except ValueError:
+            return {"error": "canary_percent must be an integer"}, 400
+        except RuntimeError as e:
+            return {"error": str(e)}, 409
+        
+        return {"status": "loading", "model": entry.to_dict()}, 202
+
+@api.route('/models/promote')
+class PromoteModel(Resource):
+    @api.doc('promote_model')
+    def post(self):
+        """Promote the canary model to every stream"""
+        try:
+            entry = model_registry.promote()
+        except RuntimeError as e:
+            return {"error": str(e)}, 409
+        return {"status": "promoted", "model": entry.to_dict()}
+
+@api.route('/models/rollback')
+class RollbackModel(Resource):
+    @api.doc('rollback_model')
+    def post(self):
+        """Drop the canary, or restore the previous active model"""
+        try:
+            entry = model_registry.rollback()
+        except RuntimeError as e:
+            return {"error": str(e)}, 409
+        return {"status": "rolled_back", "model": entry.to_dict()}
+
+@api.route('/journal')
+class Journal(Resource):
+    @api.doc('query_journal', params={
+        'stream_id': 'Only detections from this stream or session',
+        'start': 'ISO timestamp, inclusive',
+        'end': 'ISO timestamp, inclusive',
+        'limit': 'Maximum records returned (default 1000)'
+    })
+    def get(self):
+        """Query recorded detections by stream and time range"""
+        try:
+            limit = min(int(request.args.get('limit', 1000)), 10000)
+            records = list(detection_journal.query(
+                stream_id=request.args.get('stream_id'),
+                start=request.args.get('start'),
+                end=request.args.get('end'),
+                limit=limit
+            ))
+        except (ValueError, TypeError) as e:
+            return {"error": f"Invalid query: {e}"}, 400
+        return {"count": len(records), "detections": records}
+
+@api.route('/traces')
+class Traces(Resource):
+    @api.doc('get_traces', params={'stream_id': 'Only report this stream'})
+    def get(self):
+        """Rolling per-stage latency percentiles for every stream"""
+        return tracer.stats(request.args.get('stream_id'))
+
+@api.route('/traces/latency')
+class AlertLatency(Resource):
+    @api.doc('get_alert_latency')
+    def get(self):
+        """Histograms of each alert hop, from frame capture to the backend's acknowledgement"""
+        return alert_latency.stats()
+
+@api.route('/admin/profile')
+class Profile(Resource):
+    @api.doc('profile_engine', params={
+        'seconds': f'How long to sample (default 5, max {PROFILE_MAX_SECONDS})',
+        'limit': 'Entries per table (default 25)'
+    })
+    def get(self):
+        """Sample every engine thread's stack for a few seconds and report the hot spots"""
+        try:
+            seconds = min(max(float(request.args.get('seconds', 5)), 0.1), PROFILE_MAX_SECONDS)
+            limit = int(request.args.get('limit', 25))
+        except ValueError:
+            return {"error": "seconds and limit must be numbers"}, 400
+        try:
+            return sample_profile(seconds, limit=limit)
+        except RuntimeError as e:
+            return {"error": str(e)}, 409
+
+@api.route('/profiles')
+class PipelineProfiles(Resource):
+    @api.doc('get_profiles')
+    def get(self):
+        """Pipeline profiles and the profile each stream uses"""
+        return profiles.stats()
+
+@api.route('/profiles/<string:name>')
+class PipelineProfile(Resource):
+    @api.doc('get_profile')
+    def get(self, name):
+        """Get one pipeline profile"""
+        profile = profiles.get(name)
+        if profile is None:
+            return {"error": "Profile not found"}, 404
+        return profile.to_dict()
+
+    @api.expect(profile_model)
+    @api.doc('put_profile')
+    def put(self, name):
+        """Create or update a profile; streams using it switch on their next frame"""
+        data = request.json or {}
+        unknown = set(data) - set(PROFILE_FIELDS)
+        if unknown:
+            return {"error": f"Unknown profile settings: {', '.join(sorted(unknown))}"}, 400
+        try:
+            profile = profiles.put(name, data)
+        except (TypeError, ValueError) as e:
+            return {"error": f"Invalid profile: {e}"}, 400
+        return {"status": "profile_updated", "profile": profile.to_dict()}
+
+    @api.doc('delete_profile')
+    def delete(self, name):
+        """Delete a profile no stream uses"""
+        try:
+            profiles.delete(name)
+        except KeyError:
+            return {"error": "Profile not found"}, 404
+        except ValueError as e:
+            return {"error": str(e)}, 409
+        return {"status": "profile_deleted", "profile": name}
+
+@api.route('/streams/<string:stream_id>/profile')
+class StreamProfile(Resource):
+    @api.expect(stream_profile_model)
+    @api.doc('set_stream_profile')
+    def put(self, stream_id):
+        """Switch a running stream to another profile (dropping its overrides) without restarting it"""
+        if stream_id not in active_streams:
+            return {"error": "Stream not found"}, 404
+        name = (request.json or {}).get('profile')
+        try:
+            profile = profiles.assign(stream_id, name)
+        except KeyError:
+            return {"error": f"Unknown profile: {name}"}, 400
+        stream_store.update(stream_id, profile=profile.name, overrides={})
+        return {"status": "profile_changed", "stream_id": stream_id, "settings": profile.to_dict()}
+
+@api.route('/streams/<string:stream_id>/zones')
+class StreamZones(Resource):
+    @api.doc('get_stream_zones')
+    def get(self, stream_id):
+        """Zones used for a stream's loitering and intrusion analytics"""
+        return {"stream_id": stream_id, "zones": analytics.zones_for(stream_id)}
+
+    @api.expect(stream_zones_model)
+    @api.doc('set_stream_zones')
+    def put(self, stream_id):
+        """Replace a stream's analytics zones; running streams pick them up on the next frame"""
+        zones = (request.json or {}).get('zones')
+        if not isinstance(zones, list):
+            return {"error": "zones must be a list"}, 400
+        try:
+            zones = analytics.set_zones(stream_id, zones)
+        except ValueError as e:
+            return {"error": str(e)}, 400
+        return {"status": "zones_updated", "stream_id": stream_id, "zones": zones}
+
+@api.route('/streams/<string:stream_id>/tracks')
+class StreamTracks(Resource):
+    @api.doc('get_stream_tracks')
+    def get(self, stream_id):
+        """Objects currently tracked on a stream, with zone, dwell time and path length"""
+        if stream_id not in active_streams:
+            return {"error": "Stream not found"}, 404
+        return {"stream_id": stream_id, "tracks": analytics.tracks(stream_id)}
+
 @api.route('/streams')
 class ActiveStreams(Resource):
     @api.doc('get_active_streams')
@@ -193,6 +773,102 @@ class ActiveStreams(Resource):
             "stream_ids": list(active_streams.keys())
         }
 
+@api.route('/streams/<string:stream_id>/events')
+class StreamEvents(Resource):
+    @api.doc('stream_events')
+    def get(self, stream_id):
+        """Server-Sent Events feed of every inference result for a stream"""
+        if stream_id not in active_streams:
+            return {"error": "Stream not found"}, 404
+        
+        subscriber = event_broadcaster.subscribe(stream_id)
+        return Response(
+            stream_with_context(event_broadcaster.events(subscriber)),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+
+@api.route('/streams/<string:stream_id>/preview.mjpeg')
+class StreamPreview(Resource):
+    @api.doc('stream_preview', params={
+        'width': f'Preview width in pixels (default {PREVIEW_DEFAULT_WIDTH})',
+        'fps': f'Maximum preview frames per second (default {PREVIEW_DEFAULT_FPS})'
+    })
+    def get(self, stream_id):
+        """Live MJPEG preview annotated with the latest detections"""
+        if stream_id not in active_streams:
+            return {"error": "Stream not found"}, 404
+        
+        try:
+            width = int(request.args.get('width', PREVIEW_DEFAULT_WIDTH))
+            fps = float(request.args.get('fps', PREVIEW_DEFAULT_FPS))
+        except ValueError:
+            return {"error": "width must be an integer and fps a number"}, 400
+        
+        return Response(
+            stream_with_context(preview_hub.frames(stream_id, width=width, fps=fps)),
+            mimetype='multipart/x-mixed-replace; boundary=frame',
+            headers={'Cache-Control': 'no-cache'}
+        )
+
+def parse_frame_request(data):
+    """Validate a /detect_frame body; returns (image_data, session_id, profile, error response or None)"""
+    if not isinstance(data, dict):
+        return None, None, None, ({"error": "Request body must be a JSON object"}, 400)
+    image_data = data.get('image_data')
+    session_id = data.get('session_id', 'demo_session')
+    profile = profiles.get(data['profile']) if data.get('profile') else profiles.for_stream(session_id)
+    if profile is None:
+        return None, session_id, None, ({"error": f"Unknown profile: {data.get('profile')}"}, 400)
+    if not image_data:
+        return None, session_id, profile, ({"error": "image_data is required"}, 400)
+    return image_data, session_id, profile, None
+
+def decode_image(image_data):
+    """Decode a base64 (optionally data URL) image; ValueError carries the API error message"""
+    try:
+        # Remove data URL prefix if present
+        if 'data:image' in image_data:
+            image_data = image_data.split(',')[1]
+        
+        # Decode base64 to numpy array
+        img_bytes = base64.b64decode(image_data)
+        nparr = np.frombuffer(img_bytes, np.uint8)
+        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    except Exception as e:
+        raise ValueError(f"Failed to decode image: {str(e)}")
+    if frame is None:
+        raise ValueError("Invalid image data")
+    return frame
+
+def run_frame_detection(frame, session_id, profile):
+    """Run detection on one uploaded frame and build the /detect_frame response"""
+    crop, (x_offset, y_offset) = profile.crop(frame)
+    results = preprocessor.run(model_registry.model_for(session_id).model, [crop], **profile.predict_args())[0]
+    detections = []
+    
+    for r in results.boxes.data.tolist():
+        x1, y1, x2, y2, conf, class_id = r
+        class_name = results.names[int(class_id)]
+        
+        if class_name in profile.target_classes:
+            detection = {
+                "object": class_name,
+                "confidence": round(conf, 2),
+                "timestamp": datetime.now().isoformat(),
+                "session_id": session_id,
+                "bbox": [int(x1) + x_offset, int(y1) + y_offset, int(x2) + x_offset, int(y2) + y_offset]
+            }
+            detections.append(detection)
+            detection_journal.write(dict(detection, stream_id=session_id))
+    
+    return {
+        "status": "success",
+        "detections": detections,
+        "total_objects": len(results.boxes.data),
+        "threats_found": len(detections)
+    }
+
 @api.route('/detect_frame')
 class DetectFrame(Resource):
     @api.expect(frame_detection_model)
@@ -200,62 +876,35 @@ class DetectFrame(Resource):
     def post(self):
         """Process single frame for object detection"""
         try:
-            data = request.json
-            image_data = data.get('image_data')
-            session_id = data.get('session_id', 'demo_session')
+            image_data, session_id, profile, error = parse_frame_request(request.get_json(silent=True))
+            if error:
+                return error
             
-            if not image_data:
-                return {"error": "image_data is required"}, 400
+            admitted, retry_after, reason = admission.admit_frame(session_id)
+            if not admitted:
+                return ({"error": "Engine overloaded, retry later", "reason": reason},
+                        429, {"Retry-After": str(retry_after)})
             
-            # Decode base64 image
-            try:
-                # Remove data URL prefix if present
-                if 'data:image' in image_data:
-                    image_data = image_data.split(',')[1]
-                
-                # Decode base64 to numpy array
-                img_bytes = base64.b64decode(image_data)
-                nparr = np.frombuffer(img_bytes, np.uint8)
-                frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                
-                if frame is None:
-                    return {"error": "Invalid image data"}, 400
-                    
-            except Exception as e:
-                return {"error": f"Failed to decode image: {str(e)}"}, 400
-            
-            # Run detection
-            results = model(frame, conf=DETECTION_THRESHOLD)[0]
-            detections = []
-            
-            for r in results.boxes.data.tolist():
-                x1, y1, x2, y2, conf, class_id = r
-                class_name = model.names[int(class_id)]
-                
-                if class_name in TARGET_CLASSES:
-                    detection = {
-                        "object": class_name,
-                        "confidence": round(conf, 2),
-                        "timestamp": datetime.now().isoformat(),
-                        "session_id": session_id,
-                        "bbox": [int(x1), int(y1), int(x2), int(y2)]
-                    }
-                    detections.append(detection)
-            
-            return {
-                "status": "success",
-                "detections": detections,
-                "total_objects": len(results.boxes.data),
-                "threats_found": len(detections)
-            }
+            with admission.track_frame():
+                try:
+                    frame = decode_image(image_data)
+                except ValueError as e:
+                    return {"error": str(e)}, 400
+                return run_frame_detection(frame, session_id, profile)
             
         except Exception as e:
             print(f"Detection error: {e}")
             return {"error": f"Detection failed: {str(e)}"}, 500
 
+# Bring back the streams that were running before the last shutdown or crash
+stream_resumer = StreamResumer(stream_store, resume_stream)
+if STREAM_RESUME_ENABLED:
+    stream_resumer.start()
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8000))
     print(f"AI Engine starting on port {port}")
+    resource_manager.maybe_autotune(benchmark_inference, benchmark_decode)
     print(f"Target classes: {list(TARGET_CLASSES)}")
     print(f"Detection threshold: {DETECTION_THRESHOLD}")
     app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
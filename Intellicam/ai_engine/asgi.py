@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+ASGI serving mode for Intellicam AI Engine.
+Serves the same API as app.py, but the routes that hold connections open
+or do heavy work run as async handlers: /detect_frame hands decoding and
+inference to thread pools, and the SSE and MJPEG feeds wait on the event
+loop, so thousands of idle or slow clients cost no threads. Every other
+route, including the Swagger UI and swagger.json, is the unchanged Flask
+app mounted underneath.
+
+Run with:
+    python asgi.py
+    uvicorn asgi:app --host 0.0.0.0 --port 8000
+"""
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+import app as engine
+from config import (
+    ASGI_CODEC_WORKERS, ASGI_INFERENCE_WORKERS, ASGI_WSGI_WORKERS,
+    PREVIEW_DEFAULT_WIDTH, PREVIEW_DEFAULT_FPS, TARGET_CLASSES, DETECTION_THRESHOLD
+)
+
+codec_executor = ThreadPoolExecutor(max_workers=ASGI_CODEC_WORKERS, thread_name_prefix="asgi-codec")
+inference_executor = ThreadPoolExecutor(max_workers=ASGI_INFERENCE_WORKERS, thread_name_prefix="asgi-inference",
+                                        initializer=engine.resource_manager.pin_inference_thread)
+
+# The Flask app already adds CORS headers to the routes it serves
+cors = [Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])]
+
+
+async def detect_frame(request):
+    """Process single frame for object detection"""
+    try:
+        try:
+            data = await request.json()
+        except ValueError:
+            data = None  # Malformed JSON is rejected with the same 400 as app.py
+        image_data, session_id, profile, error = engine.parse_frame_request(data)
+        if error:
+            return JSONResponse(*error)
+
+        admitted, retry_after, reason = engine.admission.admit_frame(session_id)
+        if not admitted:
+            return JSONResponse({"error": "Engine overloaded, retry later", "reason": reason},
+                                429, {"Retry-After": str(retry_after)})
+
+        loop = asyncio.get_running_loop()
+        with engine.admission.track_frame():
+            try:
+                frame = await loop.run_in_executor(codec_executor, engine.decode_image, image_data)
+            except ValueError as e:
+                return JSONResponse({"error": str(e)}, 400)
+            return JSONResponse(await loop.run_in_executor(
+                inference_executor, engine.run_frame_detection, frame, session_id, profile))
+
+    except Exception as e:
+        print(f"Detection error: {e}")
+        return JSONResponse({"error": f"Detection failed: {str(e)}"}, 500)
+
+
+async def stream_events(request):
+    """Server-Sent Events feed of every inference result for a stream"""
+    stream_id = request.path_params["stream_id"]
+    if stream_id not in engine.active_streams:
+        return JSONResponse({"error": "Stream not found"}, 404)
+
+    subscriber = engine.event_broadcaster.subscribe(stream_id, loop=asyncio.get_running_loop())
+    return StreamingResponse(
+        engine.event_broadcaster.async_events(subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def stream_preview(request):
+    """Live MJPEG preview annotated with the latest detections"""
+    stream_id = request.path_params["stream_id"]
+    if stream_id not in engine.active_streams:
+        return JSONResponse({"error": "Stream not found"}, 404)
+
+    try:
+        width = int(request.query_params.get("width", PREVIEW_DEFAULT_WIDTH))
+        fps = float(request.query_params.get("fps", PREVIEW_DEFAULT_FPS))
+    except ValueError:
+        return JSONResponse({"error": "width must be an integer and fps a number"}, 400)
+
+    return StreamingResponse(
+        engine.preview_hub.async_frames(stream_id, width=width, fps=fps, executor=codec_executor),
+        media_type="multipart/x-mixed-replace; boundary=frame",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+
+def _mount_flask():
+    try:
+        return WSGIMiddleware(engine.app, workers=ASGI_WSGI_WORKERS)
+    except TypeError:
+        # Starlette's bundled middleware sizes its pool from anyio instead
+        return WSGIMiddleware(engine.app)
+
+
+@asynccontextmanager
+async def lifespan(_):
+    engine.resource_manager.maybe_autotune(engine.benchmark_inference, engine.benchmark_decode)
+    yield
+    codec_executor.shutdown(wait=False)
+    inference_executor.shutdown(wait=False)
+
+
+app = Starlette(
+    routes=[
+        Route("/detect_frame", detect_frame, methods=["POST", "OPTIONS"], middleware=cors),
+        Route("/streams/{stream_id}/events", stream_events, methods=["GET", "OPTIONS"], middleware=cors),
+        Route("/streams/{stream_id}/preview.mjpeg", stream_preview, methods=["GET", "OPTIONS"], middleware=cors),
+        Mount("/", app=_mount_flask()),
+    ],
+    lifespan=lifespan,
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    port = int(os.environ.get('PORT', 8000))
+    print(f"AI Engine (ASGI) starting on port {port}")
+    print(f"Target classes: {list(TARGET_CLASSES)}")
+    print(f"Detection threshold: {DETECTION_THRESHOLD}")
+    uvicorn.run(app, host='0.0.0.0', port=port, timeout_keep_alive=75)
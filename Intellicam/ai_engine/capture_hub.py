@@ -0,0 +1,180 @@
+"""
+Capture multiplexing for Intellicam AI Engine.
+Streams that point at the same camera share one capture source: the camera
+is opened and decoded once, inference runs once per sampled frame, and the
+results are fanned out to every subscribed stream.
+"""
+
+import itertools
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+_DEFAULT_PORTS = {"http": 80, "https": 443, "rtsp": 554, "rtmp": 1935}
+
+
+def normalise_url(url):
+    """
+    Canonical form of a camera URL, so equivalent spellings share a source.
+
+    Lowercases the scheme and host, drops default ports, trailing slashes and
+    fragments, and sorts query parameters. Credentials and the path are kept
+    as given. File paths and webcam indices are returned unchanged.
+    """
+    url = str(url).strip()
+    parts = urlsplit(url)
+    if not parts.scheme or not parts.netloc:
+        return url
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if ":" in host:
+        host = f"[{host}]"  # IPv6 literal
+    try:
+        port = parts.port
+    except ValueError:
+        return url
+    if port == _DEFAULT_PORTS.get(scheme):
+        port = None
+    userinfo = parts.netloc.rsplit("@", 1)[0] + "@" if "@" in parts.netloc else ""
+    netloc = f"{userinfo}{host}:{port}" if port else f"{userinfo}{host}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, parts.path.rstrip("/"), query, ""))
+
+
+def redact_url(url):
+    """URL with any password replaced, for health output and logs."""
+    parts = urlsplit(url)
+    if parts.password is None:
+        return url
+    netloc = parts.netloc.replace(f":{parts.password}@", ":***@", 1)
+    return urlunsplit((parts.scheme, netloc, parts.path, parts.query, parts.fragment))
+
+
+class CaptureSource:
+    """One opened camera and the streams subscribed to it."""
+
+    def __init__(self, source_id, key, stream_url):
+        self.source_id = source_id
+        self.key = key
+        self.stream_url = stream_url
+        self.subscribers = {}  # stream_id -> priority
+        self.profile = None  # Merged profile the source is inferred with
+        self.closed = False
+        self.frames = 0
+        self._next_delivery = {}  # stream_id -> monotonic time the stream next takes a result
+
+    def stream_ids(self):
+        return list(self.subscribers)
+
+    def priority(self):
+        return max(self.subscribers.values(), default=0)
+
+    def due(self, stream_id, interval, now=None):
+        """
+        True if a stream should receive this result, given its own interval.
+
+        Streams sampling slower than the source skip results in between, so
+        each still sees results at its own rate.
+        """
+        now = time.monotonic() if now is None else now
+        # Half an interval of slack, since results arrive on the source's (faster) cadence
+        if now < self._next_delivery.get(stream_id, 0.0) - interval / 2:
+            return False
+        self._next_delivery[stream_id] = max(self._next_delivery.get(stream_id, 0.0) + interval, now)
+        return True
+
+
+class CaptureHub:
+    """
+    Capture sources keyed by normalised URL, reference-counted by stream.
+
+    The first stream on a URL creates its source and starts `run_source`
+    for it in a new thread; later streams on the same URL just subscribe.
+    When the last subscriber leaves, the source is closed and dropped from
+    the hub, and its thread is expected to notice `source.closed` and exit.
+    """
+
+    def __init__(self, run_source):
+        """
+        Args:
+            run_source: Callable(CaptureSource) run in the source's capture thread
+        """
+        self.run_source = run_source
+        self._sources = {}  # normalised URL -> CaptureSource
+        self._by_id = {}  # source_id -> CaptureSource
+        self._by_stream = {}  # stream_id -> CaptureSource
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def subscribe(self, stream_id, stream_url, priority):
+        """
+        Attach a stream to the source for its URL, opening it if needed.
+
+        Returns:
+            CaptureSource: The shared source
+        """
+        key = normalise_url(stream_url)
+        with self._lock:
+            source = self._sources.get(key)
+            created = source is None
+            if created:
+                source = CaptureSource(f"source-{next(self._ids)}", key, stream_url)
+                self._sources[key] = source
+                self._by_id[source.source_id] = source
+            source.subscribers[stream_id] = priority
+            self._by_stream[stream_id] = source
+        if created:
+            thread = threading.Thread(target=self.run_source, args=(source,), name=f"capture-{source.source_id}")
+            thread.daemon = True
+            thread.start()
+        return source
+
+    def unsubscribe(self, stream_id, source=None):
+        """
+        Detach a stream; closes the source when it was the last subscriber.
+
+        Args:
+            stream_id (str): Stream identifier
+            source (CaptureSource): Source to detach from (defaults to the
+                stream's current one; a restarted stream may have moved on)
+
+        Returns:
+            CaptureSource: The source detached from, or None
+        """
+        with self._lock:
+            source = source or self._by_stream.get(stream_id)
+            if source is None or stream_id not in source.subscribers:
+                return None
+            del source.subscribers[stream_id]
+            source._next_delivery.pop(stream_id, None)
+            if self._by_stream.get(stream_id) is source:
+                del self._by_stream[stream_id]
+            if not source.subscribers and not source.closed:
+                source.closed = True
+                if self._sources.get(source.key) is source:
+                    del self._sources[source.key]
+                self._by_id.pop(source.source_id, None)
+        return source
+
+    def get(self, source_id):
+        return self._by_id.get(source_id)
+
+    def source_for(self, stream_id):
+        return self._by_stream.get(stream_id)
+
+    def source_for_url(self, stream_url):
+        """The open source a new stream on this URL would share, if any."""
+        return self._sources.get(normalise_url(stream_url))
+
+    def stats(self):
+        """Sources, their subscribers and frame counts for health reporting."""
+        with self._lock:
+            return {
+                source.source_id: {
+                    "url": redact_url(source.key),
+                    "streams": source.stream_ids(),
+                    "frames": source.frames,
+                    "profile": source.profile.to_dict() if source.profile else None,
+                }
+                for source in self._by_id.values()
+            }
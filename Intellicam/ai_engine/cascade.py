@@ -0,0 +1,132 @@
+"""
+Two-stage detection cascade for Intellicam AI Engine.
+Runs a cheap low-resolution (or tiny-model) pass on every sampled frame and
+only pays for full-resolution inference when that pass finds a candidate.
+"""
+
+import threading
+
+from config import (
+    TARGET_CLASSES, CASCADE_PREFILTER_IMGSZ, CASCADE_PREFILTER_THRESHOLD,
+    CASCADE_PREFILTER_MODEL
+)
+
+
+class DetectionCascade:
+    """
+    Prefilter + full detector.
+
+    Stage 1 runs on every frame at `prefilter_imgsz` with a low confidence
+    threshold. Frames where stage 1 sees any target class are escalated to
+    the full model at its default size; all other frames return the stage 1
+    result, which by construction holds no target detections.
+    """
+
+    def __init__(self, target_classes=TARGET_CLASSES, prefilter_imgsz=CASCADE_PREFILTER_IMGSZ,
+                 prefilter_threshold=CASCADE_PREFILTER_THRESHOLD, prefilter_model=None, preprocessor=None):
+        """
+        Args:
+            target_classes (set): Class names that justify escalation
+            prefilter_imgsz (int): Inference size of the cheap pass
+            prefilter_threshold (float): Confidence needed to escalate
+            prefilter_model: Optional separate tiny model for stage 1; the
+                serving model is reused at low resolution when None
+            preprocessor: Optional Preprocessor both passes run through
+        """
+        self.target_classes = set(target_classes)
+        self.prefilter_imgsz = prefilter_imgsz
+        self.prefilter_threshold = prefilter_threshold
+        self.prefilter_model = prefilter_model
+        self.prefilter_model_path = None
+        self.preprocessor = preprocessor
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    @classmethod
+    def from_config(cls, preprocessor=None):
+        """Build the cascade, loading CASCADE_PREFILTER_MODEL if one is configured."""
+        prefilter_model = None
+        if CASCADE_PREFILTER_MODEL:
+            from ultralytics import YOLO
+            prefilter_model = YOLO(CASCADE_PREFILTER_MODEL)
+        instance = cls(prefilter_model=prefilter_model, preprocessor=preprocessor)
+        instance.prefilter_model_path = CASCADE_PREFILTER_MODEL
+        return instance
+
+    def _predict(self, model, frames, imgsz, conf):
+        if self.preprocessor is not None:
+            return self.preprocessor.run(model, frames, imgsz=imgsz, conf=conf, verbose=False)
+        kwargs = {"imgsz": imgsz} if imgsz else {}
+        return model(frames, conf=conf, verbose=False, **kwargs)
+
+    def _has_candidate(self, result, target_classes):
+        for *_, conf, class_id in result.boxes.data.tolist():
+            if result.names[int(class_id)] in target_classes:
+                return True
+        return False
+
+    def _has_target(self, result, conf_threshold, target_classes):
+        for *_, conf, class_id in result.boxes.data.tolist():
+            if conf >= conf_threshold and result.names[int(class_id)] in target_classes:
+                return True
+        return False
+
+    def run(self, model, frames, stream_ids, conf, target_classes=None, imgsz=None):
+        """
+        Run the cascade on a batch.
+
+        Args:
+            model: Full detector (ultralytics model)
+            frames (list): Frames to process
+            stream_ids (list): Stream ID of each frame, for hit-rate stats
+            conf (float): Confidence threshold of the full pass
+            target_classes (set): Classes that justify escalation for this
+                batch (defaults to the cascade's own set)
+            imgsz (int): Inference size of the full pass (model default if None)
+
+        Returns:
+            list: One ultralytics result per frame
+        """
+        prefilter = self.prefilter_model or model
+        results = list(self._predict(prefilter, frames, self.prefilter_imgsz, self.prefilter_threshold))
+        target_classes = self.target_classes if target_classes is None else target_classes
+        escalate = [i for i, result in enumerate(results) if self._has_candidate(result, target_classes)]
+
+        confirmed = set()
+        if escalate:
+            full = self._predict(model, [frames[i] for i in escalate], imgsz, conf)
+            for index, result in zip(escalate, full):
+                results[index] = result
+                if self._has_target(result, conf, target_classes):
+                    confirmed.add(index)
+
+        with self._lock:
+            for index, stream_id in enumerate(stream_ids):
+                stats = self._stats.setdefault(stream_id, {"frames": 0, "escalated": 0, "confirmed": 0})
+                stats["frames"] += 1
+                if index in escalate:
+                    stats["escalated"] += 1
+                if index in confirmed:
+                    stats["confirmed"] += 1
+        return results
+
+    def remove(self, stream_id):
+        with self._lock:
+            self._stats.pop(stream_id, None)
+
+    def stats(self):
+        """Per-stream stage counters and hit rates for health reporting."""
+        with self._lock:
+            report = {}
+            for stream_id, s in self._stats.items():
+                report[stream_id] = dict(
+                    s,
+                    escalation_rate=round(s["escalated"] / s["frames"], 3) if s["frames"] else 0.0,
+                    confirmation_rate=round(s["confirmed"] / s["escalated"], 3) if s["escalated"] else 0.0,
+                )
+            return {
+                "prefilter_imgsz": self.prefilter_imgsz,
+                "prefilter_threshold": self.prefilter_threshold,
+                "prefilter_model": self.prefilter_model_path,
+                "streams": report,
+            }
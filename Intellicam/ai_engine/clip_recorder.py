@@ -0,0 +1,187 @@
+"""
+Pre-event clip recording for Intellicam AI Engine.
+Keeps a short, memory-bounded history of JPEG-encoded frames per stream and
+writes a pre-roll + post-roll clip in the background when an alert fires.
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from config import (
+    CLIPS_DIR, CLIP_PRE_ROLL, CLIP_POST_ROLL, CLIP_FPS, CLIP_MAX_BYTES,
+    CLIP_JPEG_QUALITY, CLIP_MAX_WIDTH
+)
+
+PARTIAL_DIR = ".partial"  # Subdirectory of clips_dir holding clips still being written
+
+
+class FrameRingBuffer:
+    """Ring buffer of (timestamp, jpeg_bytes) bounded by age and total size."""
+
+    def __init__(self, max_seconds, max_bytes):
+        self.max_seconds = max_seconds
+        self.max_bytes = max_bytes
+        self.frames = deque()
+        self.nbytes = 0
+
+    def append(self, timestamp, jpeg):
+        self.frames.append((timestamp, jpeg))
+        self.nbytes += len(jpeg)
+        while self.frames and (self.nbytes > self.max_bytes or timestamp - self.frames[0][0] > self.max_seconds):
+            _, old = self.frames.popleft()
+            self.nbytes -= len(old)
+
+    def snapshot(self):
+        return list(self.frames)
+
+
+class _PendingClip:
+    def __init__(self, clip_id, frames, end_time):
+        self.clip_id = clip_id
+        self.frames = frames
+        self.end_time = end_time
+
+
+class _StreamState:
+    def __init__(self, max_seconds, max_bytes):
+        self.buffer = FrameRingBuffer(max_seconds, max_bytes)
+        self.last_time = 0.0
+        self.active = None
+
+
+class ClipRecorder:
+    """
+    Per-stream pre-event recorder.
+
+    Capture threads call record() for every frame; only CLIP_FPS frames per
+    second are encoded and kept. trigger() starts a clip made of the buffered
+    pre-roll plus the next `post_roll` seconds, then writes it as an MJPEG
+    AVI on a background thread. Triggers during an active clip reuse it.
+    """
+
+    def __init__(self, clips_dir=CLIPS_DIR, pre_roll=CLIP_PRE_ROLL, post_roll=CLIP_POST_ROLL,
+                 fps=CLIP_FPS, max_bytes=CLIP_MAX_BYTES, quality=CLIP_JPEG_QUALITY,
+                 max_width=CLIP_MAX_WIDTH):
+        self.clips_dir = clips_dir
+        self.pre_roll = pre_roll
+        self.post_roll = post_roll
+        self.fps = fps
+        self.max_bytes = max_bytes
+        self.quality = quality
+        self.max_width = max_width
+        self._streams = {}
+        self._lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="clip-writer")
+
+    def _encode(self, frame):
+        height, width = frame.shape[:2]
+        if self.max_width and width > self.max_width:
+            scale = self.max_width / width
+            frame = cv2.resize(frame, (self.max_width, int(height * scale)), interpolation=cv2.INTER_AREA)
+        ok, buf = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        return buf.tobytes() if ok else None
+
+    def record(self, stream_id, frame):
+        """
+        Offer a captured frame to the stream's ring buffer.
+
+        Args:
+            stream_id (str): Stream identifier
+            frame: OpenCV frame (copied by encoding, so reused buffers are safe)
+        """
+        now = time.time()
+        with self._lock:
+            state = self._streams.get(stream_id)
+            if state is None:
+                state = self._streams[stream_id] = _StreamState(self.pre_roll, self.max_bytes)
+            if now - state.last_time < 1.0 / self.fps:
+                return
+            state.last_time = now
+
+        jpeg = self._encode(frame)
+        if jpeg is None:
+            return
+
+        with self._lock:
+            state.buffer.append(now, jpeg)
+            clip = state.active
+            if clip is None:
+                return
+            clip.frames.append((now, jpeg))
+            if now < clip.end_time:
+                return
+            state.active = None
+        self._writer.submit(self._write_clip, clip)
+
+    def trigger(self, stream_id):
+        """
+        Start (or join) a clip for the stream.
+
+        Returns:
+            str: Clip ID to attach to the alert, or None if nothing is buffered
+        """
+        now = time.time()
+        with self._lock:
+            state = self._streams.get(stream_id)
+            if state is None or not state.buffer.frames:
+                return None
+            if state.active is not None:
+                return state.active.clip_id
+            clip_id = f"{stream_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+            state.active = _PendingClip(clip_id, state.buffer.snapshot(), now + self.post_roll)
+            return clip_id
+
+    def remove(self, stream_id):
+        """Drop a stream's buffer, flushing any clip still collecting post-roll."""
+        with self._lock:
+            state = self._streams.pop(stream_id, None)
+        if state is not None and state.active is not None:
+            self._writer.submit(self._write_clip, state.active)
+
+    def clip_path(self, clip_id):
+        """Path of a finished clip; it only exists once the clip is completely written."""
+        return os.path.join(self.clips_dir, f"{clip_id}.avi")
+
+    def _write_clip(self, clip):
+        # Written under a separate directory (the writer needs the .avi extension), then moved into place
+        partial_dir = os.path.join(self.clips_dir, PARTIAL_DIR)
+        partial = os.path.join(partial_dir, f"{clip.clip_id}.avi")
+        try:
+            os.makedirs(partial_dir, exist_ok=True)
+            first = cv2.imdecode(np.frombuffer(clip.frames[0][1], np.uint8), cv2.IMREAD_COLOR)
+            height, width = first.shape[:2]
+            writer = cv2.VideoWriter(partial, cv2.VideoWriter_fourcc(*'MJPG'), self.fps, (width, height))
+            for _, jpeg in clip.frames:
+                frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+                if frame.shape[:2] != (height, width):
+                    frame = cv2.resize(frame, (width, height))
+                writer.write(frame)
+            writer.release()
+            os.replace(partial, self.clip_path(clip.clip_id))
+            print(f"Saved clip {clip.clip_id} ({len(clip.frames)} frames)")
+        except Exception as e:
+            print(f"Failed to write clip {clip.clip_id}: {e}")
+            try:
+                os.remove(partial)
+            except OSError:
+                pass
+
+    def stats(self):
+        """Return buffer usage per stream for health reporting."""
+        with self._lock:
+            return {
+                stream_id: {
+                    "buffered_frames": len(state.buffer.frames),
+                    "buffered_bytes": state.buffer.nbytes,
+                    "recording": state.active.clip_id if state.active else None,
+                }
+                for stream_id, state in self._streams.items()
+            }
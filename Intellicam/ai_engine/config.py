@@ -10,10 +10,112 @@ DETECTION_THRESHOLD = 0.5  # Confidence threshold for detections
 FRAME_INTERVAL = 1  # Process 1 frame per second
 TARGET_CLASSES = {"knife", "scissors", "gun", "person", "car"}  # Expanded for anomalies (intrusion, loitering)
 
+# Pipeline profiles: named per-stream settings, editable at runtime via /profiles.
+# Each entry overrides the defaults above (threshold, target_classes,
+# frame_interval) and imgsz (None = model default), gating ("none", "motion",
+# "cascade") and roi ([x1, y1, x2, y2] fractions of the frame, None = whole frame).
+DEFAULT_PIPELINE_PROFILE = "default"
+PIPELINE_PROFILES = {
+    "default": {},
+    "fast": {"imgsz": 320, "frame_interval": 2, "gating": "motion"},
+    "accurate": {"imgsz": 960, "threshold": 0.35},
+    "local": {"threshold": 0.25},  # local_ai.py: report everything the model sees
+}
+MOTION_GATE_WIDTH = 160  # Thumbnail width compared by the "motion" gating mode
+MOTION_GATE_MIN_AREA = 0.005  # Fraction of the thumbnail that must change to run inference
+
+# Scheduler settings
+DEFAULT_STREAM_PRIORITY = 1  # Higher values are served first under overload (e.g. 3 for perimeter cameras)
+SCHEDULER_BATCH_SIZE = 4  # Maximum frames per inference call across all streams
+SCHEDULER_WORKERS = 1  # Inference worker threads sharing the model
+ENGINE_CAPACITY = float(os.environ.get("ENGINE_CAPACITY", os.cpu_count() or 1))  # Relative weight for backend sharding
+
+# CPU budget settings
+CPU_CORES = os.environ.get("CPU_CORES")  # Cores the engine may use, e.g. "0-7"; default all available
+INFERENCE_CORES = os.environ.get("INFERENCE_CORES")  # Cores reserved for inference; unset = 3/4 of them, or autotuned
+RESOURCE_AUTOTUNE = os.environ.get("RESOURCE_AUTOTUNE", "0") == "1"  # Benchmark core splits when the server starts (takes seconds)
+RESOURCE_AUTOTUNE_SECONDS = float(os.environ.get("RESOURCE_AUTOTUNE_SECONDS", 1.5))  # Per candidate split; 0 disables
+
+# Admission control settings
+ADMISSION_MAX_INFLIGHT = 8  # Concurrent /detect_frame requests before shedding
+ADMISSION_MAX_QUEUE_DEPTH = 16  # Scheduler frames waiting before /detect_frame is shed
+ADMISSION_LATENCY_BUDGET = 1.0  # Seconds; shed /detect_frame while smoothed latency is above this
+ADMISSION_MAX_STREAMS = int(os.environ.get("ADMISSION_MAX_STREAMS", 32))  # Hard cap on concurrent streams
+ADMISSION_MAX_UTILIZATION = 0.9  # Refuse new streams past this projected inference utilization
+CLIENT_RATE_LIMIT = 5.0  # /detect_frame requests per second per session_id
+CLIENT_BURST = 10
+CLIENT_BUCKETS_MAX = 10000  # Least recently seen sessions are forgotten beyond this
+
+# CPU inference settings (PyTorch .pt models on machines without CUDA)
+CPU_INFERENCE_MODE = os.environ.get("CPU_INFERENCE_MODE", "auto")  # "off", "auto", "eager", "bf16", "compile" or "compile_bf16"
+CPU_INFERENCE_COMPILE = os.environ.get("CPU_INFERENCE_COMPILE", "0") == "1"  # Let "auto" try torch.compile (slow first start)
+CPU_BENCHMARK_RUNS = 5  # Timed batches per mode in the startup benchmark
+CPU_PARITY_IOU = 0.9  # Minimum IoU between matching boxes of the stock and optimised paths
+CPU_PARITY_CONF_TOL = 0.02  # Maximum confidence difference for fp32 modes
+CPU_PARITY_BF16_CONF_TOL = 0.08  # bf16 rounds activations, so its confidences drift further
+
+# Model registry settings
+MODEL_WARMUP_RUNS = 2  # Dummy inferences run on a new model before it takes traffic
+
+# Preprocessing settings
+PREPROCESS_ENABLED = True  # Letterbox into reused input tensors instead of per-call arrays (needs torch)
+PREPROCESS_IMGSZ = 640  # Inference size when the profile doesn't set imgsz
+PREPROCESS_STRIDE = 32
+PREPROCESS_PAD_VALUE = 114  # Letterbox padding gray, as used by ultralytics
+
+# Detection cascade settings
+CASCADE_ENABLED = False  # Default for streams that don't set "cascade" in /start_detection; true overrides the profile's gating
+CASCADE_PREFILTER_IMGSZ = 320  # Inference size of the cheap first pass
+CASCADE_PREFILTER_THRESHOLD = 0.25  # Confidence a target class needs in the first pass to escalate
+CASCADE_PREFILTER_MODEL = os.environ.get("CASCADE_PREFILTER_MODEL")  # Optional tiny model for the first pass
+
+# Offline footage processing settings
+OFFLINE_SAMPLE_FPS = 1.0  # Frames of footage per second sent to the detector
+OFFLINE_BATCH_SIZE = 16
+OFFLINE_SEGMENT_SECONDS = 600  # Long files are split into chunks decoded by different workers
+OFFLINE_FRAME_TIMEOUT = 5.0  # Seconds to wait for a decoded frame before checking the decode workers are still alive
+OFFLINE_VIDEO_EXTENSIONS = {".mp4", ".avi", ".mkv", ".mov", ".ts", ".m4v"}
+
+# ASGI serving settings (asgi.py)
+ASGI_CODEC_WORKERS = 4  # Threads decoding uploads and encoding previews for the async server
+ASGI_INFERENCE_WORKERS = ADMISSION_MAX_INFLIGHT  # Threads running /detect_frame inference
+ASGI_WSGI_WORKERS = 16  # Threads serving the remaining (short) Flask routes
+
+# Frame quality gate settings (checks run on a small grayscale thumbnail)
+QUALITY_GATE_ENABLED = True
+QUALITY_GATE_WIDTH = 160
+QUALITY_MIN_BRIGHTNESS = 20  # Mean gray level; darker frames are skipped
+QUALITY_MAX_BRIGHTNESS = 240  # Mean gray level; washed-out frames are skipped
+QUALITY_MIN_SHARPNESS = 15  # Laplacian variance; blurrier frames (shake, defocus) are skipped
+QUALITY_DUPLICATE_DIFF = 1.0  # Mean gray-level change from the last inferred frame at or below which a frame is a duplicate
+QUALITY_DUPLICATE_REFRESH = 5  # Seconds after which a duplicate is inferred anyway (keeps still objects tracked)
+QUALITY_STALE_SECONDS = 30  # A feed with no changed frame for this long is stale and gets reconnected (keep above frame intervals)
+
+# Live event settings
+SSE_SUBSCRIBER_BUFFER = 32  # Events buffered per viewer before the oldest are dropped
+SSE_HEARTBEAT_INTERVAL = 15  # Seconds between keep-alive comments on idle feeds
+
+# Preview settings
+PREVIEW_DEFAULT_WIDTH = 640
+PREVIEW_MIN_WIDTH = 160
+PREVIEW_MAX_WIDTH = 1920
+PREVIEW_WIDTH_STEP = 160  # Requested widths snap to multiples of this so viewers share encodings
+PREVIEW_DEFAULT_FPS = 5
+PREVIEW_MAX_FPS = 15  # Frames handed from capture threads to the preview while someone watches
+PREVIEW_JPEG_QUALITY = 70
+
 # Camera settings
 DEFAULT_CAMERA_WIDTH = 640
 DEFAULT_CAMERA_HEIGHT = 480
 
+# Capture backend settings
+CAPTURE_BACKEND = os.environ.get("CAPTURE_BACKEND", "opencv")  # "opencv" or "ffmpeg"
+FFMPEG_BINARY = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+FFMPEG_SKIP_NONKEY = False  # Decode keyframes only; cheapest but limited to the camera's GOP rate
+FFMPEG_FPS_MARGIN = 2.0  # Decode this many frames per inference interval so deadline jitter never costs a slot
+FFMPEG_BUFFERS = 4  # Reused frame buffers; a frame stays valid for this many reads
+FFMPEG_READ_TIMEOUT = 10.0  # Seconds without frame data before a stalled stream's ffmpeg is killed and the read fails
+
 # Backend settings
 BACKEND_URL = "http://localhost:5000/api/alerts"
 
@@ -22,12 +124,57 @@ MOTION_THRESHOLD = 5000  # Minimum contour area for motion detection
 MOTION_BLUR_SIZE = (21, 21)  # Gaussian blur for motion
 
 # Paths
-MODEL_PATH = "yolov8n.pt"  # Default model; replace with custom if trained
+MODEL_PATH = os.environ.get("MODEL_PATH", "yolov8n.pt")  # Default model; replace with custom if trained (.pt or .onnx)
 FRAMES_DIR = os.path.join(os.path.dirname(__file__), "frames")
-LOG_FILE = os.path.join(os.path.dirname(__file__), "..", "..", "detections.log")
+JOURNAL_DIR = os.environ.get("JOURNAL_DIR", os.path.join(os.path.dirname(__file__), "journal"))
+CLIPS_DIR = os.path.join(os.path.dirname(__file__), "clips")
+
+# Stream registry settings
+STREAM_STORE_PATH = os.environ.get("STREAM_STORE_PATH", os.path.join(os.path.dirname(__file__), "streams.json"))
+STREAM_RESUME_ENABLED = os.environ.get("STREAM_RESUME_ENABLED", "1") != "0"  # Restart stored streams on boot
+STREAM_RESUME_DELAY = 5  # Seconds after boot before the first stored stream is resumed
+STREAM_RESUME_INTERVAL = 2  # Seconds between resumed streams, so cameras and the model aren't hit at once
+STREAM_RESUME_JITTER = 1  # Up to this many random seconds added to each gap
+
+# Clip recording settings
+CLIP_PRE_ROLL = 10  # Seconds of history kept per stream
+CLIP_POST_ROLL = 5  # Seconds recorded after the triggering detection
+CLIP_FPS = 5  # Frames per second kept in the ring buffer and written to clips
+CLIP_MAX_BYTES = 8 * 1024 * 1024  # Hard cap on buffered JPEG bytes per stream
+CLIP_JPEG_QUALITY = 80
+CLIP_MAX_WIDTH = 960  # Larger frames are downscaled before buffering
+
+# Detection journal settings
+JOURNAL_MAX_BYTES = 64 * 1024 * 1024  # Rotate segments at this size...
+JOURNAL_MAX_SECONDS = 3600  # ...or after this long, whichever comes first
+JOURNAL_COMPRESS = True  # Gzip closed segments
+JOURNAL_FLUSH_INTERVAL = 1.0  # Seconds between flushes of the open segment
+JOURNAL_QUEUE_SIZE = 10000  # Records buffered in memory; further records are dropped, never waited on
+JOURNAL_MAX_SEGMENTS = 0  # Delete the oldest segments beyond this count (0 keeps everything)
+
+# Tracing settings
+TRACE_ENABLED = True  # Per-stage timings per stream; a deque append per stage
+TRACE_WINDOW = 512  # Samples kept per stream and stage for percentiles
+PROFILE_INTERVAL = 0.005  # Seconds between stack samples of the on-demand profiler
+PROFILE_MAX_SECONDS = 60
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)  # Upper bounds of the end-to-end hop histograms
+
+# Dwell-time analytics settings
+ANALYTICS_ENABLED = True  # Track detections across frames and raise loitering/intrusion events
+ANALYTICS_LOITER_CLASSES = {"person"}
+ANALYTICS_LOITER_SECONDS = 60  # Seconds in one zone before a track is loitering
+ANALYTICS_INTRUSION_CLASSES = {"person", "car"}  # Classes that trigger restricted zones
+# stream_id (or "*" for all streams) -> zones, e.g.
+# {"*": [{"name": "door", "roi": [0.6, 0.4, 1.0, 1.0], "restricted": True, "loiter_seconds": 30}]}
+# Streams without zones treat the whole frame as one (unrestricted) zone
+ANALYTICS_ZONES = {}
+ANALYTICS_MATCH_IOU = 0.3  # Minimum box overlap to continue a track
+ANALYTICS_MIN_HITS = 2  # Matches before a track can raise events (filters one-frame false positives)
+ANALYTICS_TRACK_TTL = 10  # Seconds a track survives without a matching detection
+ANALYTICS_MAX_TRACKS = 256  # Per stream; the stalest tracks are dropped beyond this
 
 # Alert settings
 ALERT_CONFIDENCE_THRESHOLD = 0.7  # Minimum confidence to trigger Twilio alert (backend handles)
 
-# Multi-camera (placeholder for future)
+# Multi-camera: sources run by inference.py when no --stream is given
 CAMERA_SOURCES = ["0"]  # List of sources; e.g., ["0", "http://ip:port/video"]
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+CPU-optimised PyTorch inference for Intellicam AI Engine.
+For sites running the .pt model on CPU: conv+BN layers are fused once at
+load time and batches from the Preprocessor run straight through the
+network under torch.inference_mode() in channels-last layout, optionally
+with bf16 autocast and torch.compile. A short startup benchmark picks the
+fastest mode that still matches the stock ultralytics path's detections.
+
+Run directly to benchmark the modes and check parity on a model:
+    python cpu_inference.py --model yolov8n.pt --mode auto
+"""
+
+import argparse
+import json
+import threading
+import time
+
+import cv2
+import numpy as np
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+from config import (
+    CPU_INFERENCE_MODE, CPU_INFERENCE_COMPILE, CPU_BENCHMARK_RUNS, CPU_PARITY_IOU,
+    CPU_PARITY_CONF_TOL, CPU_PARITY_BF16_CONF_TOL, DETECTION_THRESHOLD,
+    PREPROCESS_IMGSZ, SCHEDULER_BATCH_SIZE, MODEL_PATH
+)
+from preprocess import Preprocessor
+
+MODES = ("eager", "bf16", "compile", "compile_bf16")
+
+# Ultralytics predictor defaults, used when a call doesn't pass its own
+_DEFAULT_IOU = 0.7
+_DEFAULT_CONF = 0.25
+_DEFAULT_MAX_DET = 300
+
+
+def cpu_supports_bf16():
+    """True if the CPU has native bf16 instructions (AVX512-BF16 or AMX)."""
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def available_modes(compile_enabled=CPU_INFERENCE_COMPILE):
+    """Modes worth trying on this machine."""
+    modes = ["eager"]
+    if cpu_supports_bf16():
+        modes.append("bf16")
+    if compile_enabled and hasattr(torch, "compile"):
+        modes.append("compile")
+        if cpu_supports_bf16():
+            modes.append("compile_bf16")
+    return modes
+
+
+def _nms():
+    try:
+        from ultralytics.utils.nms import non_max_suppression
+    except ImportError:
+        from ultralytics.utils.ops import non_max_suppression
+    return non_max_suppression
+
+
+class CPUInferenceModel:
+    """
+    Callable stand-in for an ultralytics YOLO model on CPU.
+
+    Tensor batches (what Preprocessor.run() passes) go through the fused
+    network directly and only NMS is borrowed from ultralytics; anything
+    else (numpy frames, file paths) falls back to the wrapped YOLO object.
+    Results have the same shape as ultralytics', with boxes in input-tensor
+    coordinates exactly as the stock path returns them for tensor input.
+    """
+
+    def __init__(self, yolo, mode="eager"):
+        """
+        Args:
+            yolo: Ultralytics YOLO model whose network was fused with fuse_model()
+            mode (str): "eager", "bf16", "compile" or "compile_bf16"
+        """
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        self.yolo = yolo
+        self.names = yolo.names
+        self.mode = mode
+        self.bf16 = mode.endswith("bf16")
+        self.optimization = None
+        net = yolo.model
+        self.net = torch.compile(net, dynamic=False) if mode.startswith("compile") else net
+        self._non_max_suppression = _nms()
+        from ultralytics.engine.results import Results
+        self._results = Results
+        # Compiled graphs are specialised per input shape; new shapes compile one at a time
+        self._seen_shapes = set()
+        self._compile_lock = threading.Lock()
+
+    def _forward(self, x):
+        with torch.inference_mode(), torch.autocast("cpu", dtype=torch.bfloat16, enabled=self.bf16):
+            preds = self.net(x.contiguous(memory_format=torch.channels_last))
+        preds = preds[0] if isinstance(preds, (list, tuple)) else preds
+        return preds.float()
+
+    def __call__(self, source, conf=_DEFAULT_CONF, iou=_DEFAULT_IOU, classes=None, max_det=_DEFAULT_MAX_DET,
+                 agnostic_nms=False, **kwargs):
+        if not torch.is_tensor(source):
+            return self.yolo(source, conf=conf, iou=iou, classes=classes, max_det=max_det,
+                             agnostic_nms=agnostic_nms, **kwargs)
+        started = time.perf_counter()
+        shape = tuple(source.shape)
+        if self.net is not self.yolo.model and shape not in self._seen_shapes:
+            with self._compile_lock:
+                preds = self._forward(source)
+                self._seen_shapes.add(shape)
+        else:
+            preds = self._forward(source)
+        inferred = time.perf_counter()
+
+        with torch.inference_mode():
+            detections = self._non_max_suppression(preds, conf, iou, classes=classes, agnostic=agnostic_nms,
+                                                   max_det=max_det)
+            # Boxes refer to the input tensor; a zero-strided stand-in gives Results its shape without a copy
+            blank = np.broadcast_to(np.uint8(0), (shape[2], shape[3], 3))
+            results = [self._results(blank, path="", names=self.names, boxes=d) for d in detections]
+        finished = time.perf_counter()
+
+        per_image = 1000 / len(results) if results else 0
+        for result in results:
+            result.speed = {"preprocess": None, "inference": (inferred - started) * per_image,
+                            "postprocess": (finished - inferred) * per_image}
+        return results
+
+
+def fuse_model(yolo):
+    """Fuse conv+BN in place and switch the network to eval, no-grad, channels-last."""
+    net = yolo.model
+    net.fuse(verbose=False)
+    net.eval()
+    for param in net.parameters():
+        param.requires_grad_(False)
+    net.to(memory_format=torch.channels_last)
+    return yolo
+
+
+def sample_frames(count, paths=None):
+    """Frames for benchmarking and parity: given images, else ultralytics' bundled samples."""
+    if not paths:
+        try:
+            from ultralytics.utils import ASSETS
+            paths = sorted(str(p) for p in ASSETS.glob("*.jpg"))
+        except Exception:
+            paths = []
+    frames = [frame for frame in (cv2.imread(p) for p in paths) if frame is not None]
+    if not frames:
+        frames = [np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8)]
+    return [frames[i % len(frames)] for i in range(count)]
+
+
+def compare_detections(reference, candidate, iou=CPU_PARITY_IOU, conf_tol=CPU_PARITY_CONF_TOL,
+                       conf_threshold=DETECTION_THRESHOLD):
+    """
+    Check that two lists of results hold the same detections.
+
+    Every box must have a partner of the same class with IoU >= iou and a
+    confidence within conf_tol. Boxes that exist on only one side are
+    tolerated only if their confidence is within conf_tol of the threshold,
+    where precision differences can legitimately flip them.
+
+    Returns:
+        dict: matched, missing, extra and borderline counts, worst IoU and
+            confidence difference, and whether parity holds
+    """
+    matched = missing = extra = borderline = 0
+    worst_iou, worst_conf = 1.0, 0.0
+    for ref, cand in zip(reference, candidate):
+        ref_boxes = ref.boxes.data.tolist()
+        cand_boxes = cand.boxes.data.tolist()
+        used = set()
+        for rb in ref_boxes:
+            best, best_iou = None, iou
+            for j, cb in enumerate(cand_boxes):
+                if j in used or int(cb[5]) != int(rb[5]):
+                    continue
+                x1, y1 = max(rb[0], cb[0]), max(rb[1], cb[1])
+                x2, y2 = min(rb[2], cb[2]), min(rb[3], cb[3])
+                inter = max(0, x2 - x1) * max(0, y2 - y1)
+                union = (rb[2] - rb[0]) * (rb[3] - rb[1]) + (cb[2] - cb[0]) * (cb[3] - cb[1]) - inter
+                overlap = inter / union if union > 0 else 0.0
+                if overlap >= best_iou:
+                    best, best_iou = j, overlap
+            if best is None:
+                if rb[4] < conf_threshold + conf_tol:
+                    borderline += 1
+                else:
+                    missing += 1
+                continue
+            used.add(best)
+            matched += 1
+            worst_iou = min(worst_iou, best_iou)
+            worst_conf = max(worst_conf, abs(rb[4] - cand_boxes[best][4]))
+        for j, cb in enumerate(cand_boxes):
+            if j not in used:
+                if cb[4] < conf_threshold + conf_tol:
+                    borderline += 1
+                else:
+                    extra += 1
+    return {
+        "matched": matched,
+        "missing": missing,
+        "extra": extra,
+        "borderline": borderline,
+        "min_iou": round(worst_iou, 4),
+        "max_conf_diff": round(worst_conf, 4),
+        "passed": missing == 0 and extra == 0 and worst_conf <= conf_tol,
+    }
+
+
+def _time_batches(fn, batch, runs):
+    fn(batch)  # Warm up (and compile, for compiled modes)
+    started = time.perf_counter()
+    for _ in range(runs):
+        fn(batch)
+    return round((time.perf_counter() - started) / runs * 1000, 2)
+
+
+def optimize(yolo, mode=CPU_INFERENCE_MODE, batch_size=SCHEDULER_BATCH_SIZE, imgsz=PREPROCESS_IMGSZ,
+             runs=CPU_BENCHMARK_RUNS, sample_paths=None, compile_enabled=CPU_INFERENCE_COMPILE):
+    """
+    Build the CPU inference path for a freshly loaded model.
+
+    The stock ultralytics path is timed and its detections recorded first;
+    then the network is fused and each candidate mode is timed on the same
+    batch and checked against those detections. The fastest mode that
+    passes parity wins; if none beats the stock path, the (fused) YOLO
+    object itself is returned.
+
+    Args:
+        yolo: Ultralytics YOLO model as loaded
+        mode (str): "off", "auto" or one of MODES
+        batch_size (int): Batch size benchmarked
+        imgsz (int): Inference size benchmarked
+        runs (int): Timed batches per mode
+        sample_paths (list): Images used for benchmarking and parity
+        compile_enabled (bool): Let "auto" try the torch.compile modes
+
+    Returns:
+        The model to serve with; its `optimization` attribute holds the report
+    """
+    if (mode == "off" or torch is None or not isinstance(getattr(yolo, "model", None), torch.nn.Module)
+            or torch.cuda.is_available()):
+        return yolo
+
+    frames = sample_frames(batch_size, sample_paths)
+    batch, _ = Preprocessor(imgsz=imgsz, capacity=batch_size, enabled=True).prepare(frames)
+    batch = torch.from_numpy(batch.copy())
+    predict_args = {"conf": DETECTION_THRESHOLD, "verbose": False}
+
+    report = {"requested": mode, "batch_size": batch_size, "input_shape": list(batch.shape), "modes": {}}
+    reference = yolo(batch, **predict_args)
+    report["modes"]["default"] = {"ms_per_batch": _time_batches(lambda b: yolo(b, **predict_args), batch, runs)}
+
+    fuse_model(yolo)
+    candidates = available_modes(compile_enabled) if mode == "auto" else [mode]
+    chosen, chosen_ms = yolo, report["modes"]["default"]["ms_per_batch"]
+    for candidate_mode in candidates:
+        try:
+            model = CPUInferenceModel(yolo, candidate_mode)
+            ms = _time_batches(lambda b: model(b, **predict_args), batch, runs)
+            tolerance = CPU_PARITY_BF16_CONF_TOL if model.bf16 else CPU_PARITY_CONF_TOL
+            parity = compare_detections(reference, model(batch, **predict_args), conf_tol=tolerance)
+        except Exception as e:
+            report["modes"][candidate_mode] = {"error": str(e)}
+            continue
+        report["modes"][candidate_mode] = {"ms_per_batch": ms, "parity": parity}
+        if parity["passed"] and (ms < chosen_ms or mode != "auto"):
+            chosen, chosen_ms = model, ms
+
+    report["selected"] = chosen.mode if chosen is not yolo else "default"
+    chosen.optimization = report
+    print(f"CPU inference mode: {report['selected']} "
+          + ", ".join(f"{name} {entry.get('ms_per_batch', 'failed')} ms" for name, entry in report["modes"].items()))
+    return chosen
+
+
+def load_model(path):
+    """ModelRegistry loader: YOLO(path), optimised for CPU according to CPU_INFERENCE_MODE."""
+    from ultralytics import YOLO
+    return optimize(YOLO(path))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark CPU inference modes and check parity with ultralytics")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--mode", default="auto", help="auto or one of: " + ", ".join(MODES))
+    parser.add_argument("--compile", action="store_true", help="Include torch.compile modes in auto")
+    parser.add_argument("--batch-size", type=int, default=SCHEDULER_BATCH_SIZE)
+    parser.add_argument("--imgsz", type=int, default=PREPROCESS_IMGSZ)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--images", nargs="*", help="Images for parity (default: ultralytics samples)")
+    args = parser.parse_args()
+
+    if torch is None:
+        raise SystemExit("torch is not installed")
+    from ultralytics import YOLO
+    served = optimize(YOLO(args.model), args.mode, args.batch_size, args.imgsz, args.runs, args.images,
+                      compile_enabled=args.compile)
+    report = getattr(served, "optimization", None)
+    if report is None:
+        raise SystemExit("Model is not a CPU PyTorch model; nothing to optimise")
+    print(json.dumps(report, indent=2))
+    failed = [name for name, entry in report["modes"].items() if entry.get("parity", {}).get("passed") is False]
+    if failed:
+        raise SystemExit(f"Parity FAILED for: {', '.join(failed)}")
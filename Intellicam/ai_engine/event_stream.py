@@ -0,0 +1,140 @@
+"""
+Server-Sent Events fan-out for Intellicam AI Engine.
+Publishes every inference result of a stream to any number of live viewers.
+Each event is serialised once; slow viewers lose their oldest events instead
+of holding up the inference thread.
+"""
+
+import asyncio
+import json
+import threading
+from collections import deque
+
+from config import SSE_SUBSCRIBER_BUFFER, SSE_HEARTBEAT_INTERVAL
+
+
+class Subscriber:
+    """
+    One SSE viewer with a bounded backlog of encoded events.
+
+    Thread-served viewers wait on `ready`; viewers served from an asyncio
+    loop pass that loop and wait on `async_ready` instead.
+    """
+
+    def __init__(self, stream_id, maxlen, loop=None):
+        self.stream_id = stream_id
+        self.queue = deque(maxlen=maxlen)
+        self.ready = threading.Event()
+        self.loop = loop
+        self.async_ready = asyncio.Event() if loop is not None else None
+        self.dropped = 0
+        self.closed = False
+
+    def wake(self):
+        self.ready.set()
+        if self.loop is not None:
+            try:
+                self.loop.call_soon_threadsafe(self.async_ready.set)
+            except RuntimeError:
+                pass  # Loop already closed
+
+
+class EventBroadcaster:
+    """Per-stream publish/subscribe hub for SSE viewers."""
+
+    def __init__(self, buffer_size=SSE_SUBSCRIBER_BUFFER, heartbeat=SSE_HEARTBEAT_INTERVAL):
+        self.buffer_size = buffer_size
+        self.heartbeat = heartbeat
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, stream_id, loop=None):
+        """Register a viewer; pass the running asyncio loop for async_events()."""
+        subscriber = Subscriber(stream_id, self.buffer_size, loop)
+        with self._lock:
+            self._subscribers.setdefault(stream_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        subscriber.closed = True
+        subscriber.wake()
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.stream_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[subscriber.stream_id]
+
+    def close_stream(self, stream_id):
+        """Disconnect every viewer of a stream that has stopped."""
+        with self._lock:
+            subscribers = self._subscribers.pop(stream_id, set())
+        for subscriber in subscribers:
+            subscriber.closed = True
+            subscriber.wake()
+
+    def publish(self, stream_id, event, event_type="detection"):
+        """
+        Send an event to every viewer of a stream.
+
+        Args:
+            stream_id (str): Stream identifier
+            event (dict): JSON-serialisable payload
+            event_type (str): SSE event name
+        """
+        with self._lock:
+            subscribers = list(self._subscribers.get(stream_id, ()))
+        if not subscribers:
+            return
+
+        message = f"event: {event_type}\ndata: {json.dumps(event)}\n\n"
+        for subscriber in subscribers:
+            if len(subscriber.queue) == subscriber.queue.maxlen:
+                subscriber.dropped += 1
+            subscriber.queue.append(message)
+            subscriber.wake()
+
+    def events(self, subscriber):
+        """
+        Generator yielding SSE text for one viewer until it disconnects.
+
+        Heartbeat comments keep proxies from closing idle connections.
+        """
+        try:
+            yield "retry: 3000\n\n"
+            while not subscriber.closed:
+                if not subscriber.ready.wait(timeout=self.heartbeat):
+                    yield ": heartbeat\n\n"
+                    continue
+                subscriber.ready.clear()
+                while subscriber.queue:
+                    yield subscriber.queue.popleft()
+        finally:
+            self.unsubscribe(subscriber)
+
+    async def async_events(self, subscriber):
+        """Async generator counterpart of events() for subscribers bound to a loop."""
+        try:
+            yield "retry: 3000\n\n"
+            while not subscriber.closed:
+                try:
+                    await asyncio.wait_for(subscriber.async_ready.wait(), timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                subscriber.async_ready.clear()
+                while subscriber.queue:
+                    yield subscriber.queue.popleft()
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self):
+        """Return viewer counts per stream for health reporting."""
+        with self._lock:
+            return {
+                stream_id: {
+                    "subscribers": len(subscribers),
+                    "dropped": sum(s.dropped for s in subscribers),
+                }
+                for stream_id, subscribers in self._subscribers.items()
+            }
@@ -0,0 +1,195 @@
+"""
+FFmpeg subprocess capture backend for Intellicam AI Engine.
+Decodes camera streams in an ffmpeg child process that drops and scales
+frames before they reach Python, so only the frames the detector needs
+are ever decoded at the size it needs.
+"""
+
+import select
+import shutil
+import subprocess
+
+import cv2
+import numpy as np
+
+from config import (
+    CAPTURE_BACKEND, DEFAULT_CAMERA_WIDTH, DEFAULT_CAMERA_HEIGHT,
+    FFMPEG_BINARY, FFMPEG_SKIP_NONKEY, FFMPEG_BUFFERS, FFMPEG_READ_TIMEOUT
+)
+
+
+class FFmpegCapture:
+    """
+    Minimal drop-in replacement for cv2.VideoCapture backed by ffmpeg.
+
+    Frames are read as raw BGR into a small pool of preallocated buffers
+    that are reused in rotation, so a returned frame stays valid only until
+    `buffers` more frames have been read. Callers that keep frames longer
+    must copy them.
+
+    A read that gets no data for `read_timeout` seconds (a camera that
+    stalled without closing the connection) kills ffmpeg and fails like a
+    disconnect, so callers notice and reconnect instead of blocking forever.
+    """
+
+    def __init__(self, source, width=DEFAULT_CAMERA_WIDTH, height=DEFAULT_CAMERA_HEIGHT,
+                 fps=None, skip_nonkey=FFMPEG_SKIP_NONKEY, buffers=FFMPEG_BUFFERS,
+                 read_timeout=FFMPEG_READ_TIMEOUT):
+        """
+        Args:
+            source (str): Stream URL or file path understood by ffmpeg
+            width (int): Output frame width
+            height (int): Output frame height
+            fps (float): Output frame rate, or None to keep the source rate
+            skip_nonkey (bool): Decode keyframes only (cheapest, lowest rate)
+            buffers (int): Number of frame buffers reused in rotation
+            read_timeout (float): Seconds without data before a read fails
+        """
+        self.source = source
+        self.width = int(width)
+        self.height = int(height)
+        self.fps = fps
+        self.skip_nonkey = skip_nonkey
+        self.read_timeout = read_timeout
+        self._frame_bytes = self.width * self.height * 3
+        self._pool = [np.empty((self.height, self.width, 3), dtype=np.uint8) for _ in range(max(1, buffers))]
+        self._next = 0
+        self._proc = None
+        self._primed = None
+        self.open()
+
+    def _command(self):
+        cmd = [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-nostdin"]
+        source = str(self.source)
+        if source.startswith("rtsp://"):
+            cmd += ["-rtsp_transport", "tcp"]
+        elif "://" in source:
+            # Network protocols also give up on their own; RTSP relies on the select() read timeout
+            cmd += ["-rw_timeout", str(int(self.read_timeout * 1_000_000))]
+        if self.skip_nonkey:
+            cmd += ["-skip_frame", "nokey"]
+        cmd += ["-i", str(self.source), "-an", "-sn"]
+
+        filters = []
+        if self.fps:
+            filters.append(f"fps={self.fps:g}")
+        # Letterbox into the fixed output size so the buffer shape never changes
+        filters.append(f"scale={self.width}:{self.height}:force_original_aspect_ratio=decrease")
+        filters.append(f"pad={self.width}:{self.height}:(ow-iw)/2:(oh-ih)/2")
+        cmd += ["-vf", ",".join(filters), "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1"]
+        return cmd
+
+    def open(self):
+        """
+        Start the ffmpeg process and read the first frame to confirm the
+        source is reachable.
+
+        Returns:
+            bool: True if the first frame was decoded
+        """
+        self.release()
+        try:
+            self._proc = subprocess.Popen(
+                self._command(), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                bufsize=0  # Unbuffered, so select() sees exactly what is left to read
+            )
+        except OSError as e:
+            print(f"ERROR: Cannot start ffmpeg: {e}")
+            self._proc = None
+            return False
+
+        ret, frame = self._read_raw()
+        if not ret:
+            self.release()
+            return False
+        self._primed = frame
+        return True
+
+    def isOpened(self):
+        return self._proc is not None and self._proc.poll() is None
+
+    def _read_raw(self):
+        buf = self._pool[self._next]
+        view = memoryview(buf).cast("B")
+        filled = 0
+        while filled < self._frame_bytes:
+            ready, _, _ = select.select([self._proc.stdout], [], [], self.read_timeout)
+            if not ready:
+                print(f"WARNING: No data from {self.source} for {self.read_timeout:g}s - dropping the stream")
+                return False, None
+            n = self._proc.stdout.readinto(view[filled:])
+            if not n:
+                return False, None
+            filled += n
+        self._next = (self._next + 1) % len(self._pool)
+        return True, buf
+
+    def read(self):
+        """
+        Read the next decoded frame.
+
+        Returns:
+            tuple: (bool, numpy.ndarray) like cv2.VideoCapture.read
+        """
+        if self._primed is not None:
+            frame, self._primed = self._primed, None
+            return True, frame
+        if self._proc is None:
+            # Previous read hit end of stream; try to reconnect once per call
+            if not self.open():
+                return False, None
+            return self.read()
+
+        ret, frame = self._read_raw()
+        if not ret:
+            self.release()
+        return ret, frame
+
+    def release(self):
+        """Stop the ffmpeg process."""
+        proc, self._proc = self._proc, None
+        self._primed = None
+        if proc is None:
+            return
+        try:
+            proc.stdout.close()
+            proc.terminate()
+            proc.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        except Exception:
+            pass
+
+
+def open_capture(source, backend=CAPTURE_BACKEND, width=DEFAULT_CAMERA_WIDTH,
+                 height=DEFAULT_CAMERA_HEIGHT, fps=None):
+    """
+    Open a camera source with the configured capture backend.
+
+    Webcam indices and hosts without an ffmpeg binary always use OpenCV.
+
+    Args:
+        source: Stream URL, file path or webcam index
+        backend (str): "opencv" or "ffmpeg"
+        width (int): Target frame width (ffmpeg scales, OpenCV only hints)
+        height (int): Target frame height
+        fps (float): Target decode rate for the ffmpeg backend
+
+    Returns:
+        Capture object exposing isOpened(), read() and release()
+    """
+    if backend == "ffmpeg" and not isinstance(source, int) and shutil.which(FFMPEG_BINARY):
+        return FFmpegCapture(source, width=width, height=height, fps=fps)
+
+    if backend == "ffmpeg":
+        print(f"WARNING: ffmpeg backend unavailable for {source}; falling back to OpenCV")
+    if isinstance(source, int) or not hasattr(cv2, "CAP_PROP_READ_TIMEOUT_MSEC"):
+        cap = cv2.VideoCapture(source)
+    else:
+        # Bound connects and reads so a stalled network camera can't block the capture thread forever
+        timeout_ms = int(FFMPEG_READ_TIMEOUT * 1000)
+        cap = cv2.VideoCapture(source, cv2.CAP_ANY, [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, timeout_ms,
+                                                     cv2.CAP_PROP_READ_TIMEOUT_MSEC, timeout_ms])
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    return cap
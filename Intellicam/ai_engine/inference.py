@@ -2,7 +2,8 @@
 """
 Intellicam - Smart Predictive Surveillance
 AI Inference Module for detecting harmful objects in real-time camera streams.
-Supports both IP camera and PC webcam input.
+Supports both IP camera and PC webcam input, and several cameras per process
+sharing a single model.
 """
 
 import cv2
@@ -10,28 +11,38 @@ import time
 import json
 import logging
 import argparse
+import threading
 import requests
 import numpy as np
 from pathlib import Path
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from ultralytics import YOLO
 from config import (
     DETECTION_THRESHOLD, BACKEND_URL, TARGET_CLASSES, FRAME_INTERVAL,
     DEFAULT_CAMERA_WIDTH, DEFAULT_CAMERA_HEIGHT, MODEL_PATH, FRAMES_DIR,
-    LOG_FILE, ALERT_CONFIDENCE_THRESHOLD, MOTION_THRESHOLD, MOTION_BLUR_SIZE
+    ALERT_CONFIDENCE_THRESHOLD, MOTION_THRESHOLD, MOTION_BLUR_SIZE,
+    CAPTURE_BACKEND, CAMERA_SOURCES, DEFAULT_STREAM_PRIORITY, SCHEDULER_BATCH_SIZE,
+    SCHEDULER_WORKERS, FFMPEG_FPS_MARGIN
 )
+from ffmpeg_capture import open_capture
+from clip_recorder import ClipRecorder
+from scheduler import InferenceScheduler
+from journal import DetectionJournal
+from tracing import StageTracer
+from preprocess import Preprocessor
 
-# Configure logging
+# Configure logging; detections themselves go to the detection journal
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(LOG_FILE),
-        logging.StreamHandler()
-    ]
+    handlers=[logging.StreamHandler()]
 )
 
-def connect_camera(stream_url):
+alert_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="alert")
+frame_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="frame-save")  # Detection stills, off the inference thread
+
+def connect_camera(stream_url, backend=CAPTURE_BACKEND, fps=None):
     """
     Connect to IP camera stream or webcam.
     
@@ -39,20 +50,20 @@ def connect_camera(stream_url):
         stream_url: Can be:
             - Integer for webcam (e.g., 0 for built-in webcam)
             - URL string for IP camera stream
+        backend (str): "opencv" or "ffmpeg" (decodes and scales in a subprocess)
+        fps (float): Decode rate for the ffmpeg backend, None for full rate
             
     Returns:
-        cv2.VideoCapture: OpenCV video capture object
+        Capture object with the cv2.VideoCapture read interface
     """
-    # Try to connect to the camera source
-    cap = cv2.VideoCapture(stream_url)
+    # Try to connect to the camera source; OpenCV receives the size as a hint,
+    # ffmpeg scales server-side to exactly this size
+    cap = open_capture(stream_url, backend=backend, width=DEFAULT_CAMERA_WIDTH,
+                       height=DEFAULT_CAMERA_HEIGHT, fps=fps)
     
     if not cap.isOpened():
         raise ConnectionError(f"Failed to connect to camera source: {stream_url}")
     
-    # Set frame properties for better performance
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-    
     # Display camera info
     source_type = "webcam" if isinstance(stream_url, int) else "IP camera"
     logging.info(f"Successfully connected to {source_type}: {stream_url}")
@@ -109,6 +120,19 @@ def detect_objects(frame, model):
     """
     # Run inference on frame
     results = model(frame, conf=DETECTION_THRESHOLD)[0]
+    return parse_detections(results, model)
+
+def parse_detections(results, model):
+    """
+    Convert a YOLOv8 result into target-class detections.
+
+    Args:
+        results: Single ultralytics Results object
+        model: YOLOv8 model instance (for class names)
+
+    Returns:
+        list: List of detections with class, confidence and coordinates
+    """
     detections = []
 
     # Process each detection
@@ -159,13 +183,14 @@ def save_frame(frame, detection, frame_dir="frames"):
     logging.info(f"Saved detection frame: {frame_name}")
     return frame_name
 
-def send_alert(detection, frame_name):
+def send_alert(detection, frame_name, clip_id=None):
     """
     Send detection alert to backend API.
     
     Args:
         detection (dict): Detection information
         frame_name (str): Name of saved frame file
+        clip_id (str): ID of the pre/post-event clip, if one is recording
         
     Returns:
         bool: True if alert was sent successfully
@@ -174,7 +199,8 @@ def send_alert(detection, frame_name):
         "object": detection["object"],
         "confidence": detection["confidence"],
         "timestamp": datetime.now().isoformat(),
-        "frame_id": frame_name
+        "frame_id": frame_name,
+        "clip_id": clip_id
     }
     
     # Try sending alert twice in case of failure
@@ -191,82 +217,204 @@ def send_alert(detection, frame_name):
                 logging.error(f"Failed to send alert after retry. Error: {e}")
     return False
 
-def main(stream_url):
+class CameraWorker:
+    """
+    Capture thread and counters for one camera source.
+
+    Frames are read continuously so the camera buffer never lags; only frames
+    the shared scheduler is ready to accept are copied and submitted.
+    """
+
+    def __init__(self, name, source, capture_backend, scheduler, clip_recorder, journal, tracer):
+        self.name = name
+        self.source = source
+        self.capture_backend = capture_backend
+        self.scheduler = scheduler
+        self.clip_recorder = clip_recorder
+        self.journal = journal
+        self.tracer = tracer
+        self.latest_frame = None
+        self.state = "connecting"
+        self.frames = 0
+        self.inferences = 0
+        self.detections = 0
+        self.last_detection = None
+        self._fps_window = (time.time(), 0)
+        self.fps = 0.0
+        self.thread = threading.Thread(target=self._run, name=f"capture-{name}", daemon=True)
+
+    def _run(self):
+        try:
+            # Like the engine, decode only a couple of frames per inference interval
+            cap = connect_camera(self.source, backend=self.capture_backend, fps=FFMPEG_FPS_MARGIN / FRAME_INTERVAL)
+        except ConnectionError as e:
+            logging.error(f"[{self.name}] {e}")
+            self.state = "failed"
+            return
+
+        self.state = "running"
+        try:
+            while self.state == "running":
+                with self.tracer.span(self.name, "capture"):
+                    ret, frame = cap.read()
+                if not ret:
+                    logging.error(f"[{self.name}] Failed to read frame from camera")
+                    self.state = "disconnected"
+                    break
+
+                self.frames += 1
+                self.latest_frame = frame
+                with self.tracer.span(self.name, "clip_buffer"):
+                    self.clip_recorder.record(self.name, frame)
+                if self.scheduler.is_due(self.name):
+                    self.scheduler.submit(self.name, frame.copy())
+        finally:
+            cap.release()
+            self.clip_recorder.remove(self.name)
+
+    def handle_results(self, frame, results, model):
+        """Save, alert and log the detections of one inference result."""
+        self.inferences += 1
+        self.tracer.record_result(self.name, results)
+        detections = parse_detections(results, model)
+        if not detections:
+            return
+
+        self.detections += len(detections)
+        self.last_detection = datetime.now()
+        clip_id = self.clip_recorder.trigger(self.name)
+        # Disk writes and alerts must not hold up the shared model; the frame is this result's own copy
+        frame_executor.submit(self._publish, frame, detections, clip_id)
+
+    def _publish(self, frame, detections, clip_id):
+        """Save a still per detection, then alert the backend and journal it."""
+        for detection in detections:
+            with self.tracer.span(self.name, "save_frame"):
+                frame_name = save_frame(frame, detection)
+
+            alert_executor.submit(self._send_alert, detection, frame_name, clip_id)
+
+            # Record detection
+            self.journal.write(dict(detection, stream_id=self.name, source=str(self.source),
+                                    frame_id=frame_name, clip_id=clip_id))
+            logging.info(
+                f"[{self.name}] Detection: {detection['object']}, "
+                f"Confidence: {detection['confidence']:.2f}, "
+                f"Frame: {frame_name}"
+            )
+
+    def _send_alert(self, detection, frame_name, clip_id):
+        with self.tracer.span(self.name, "alert_post"):
+            send_alert(detection, frame_name, clip_id)
+
+    def stage_line(self):
+        """p50/p95 per pipeline stage, e.g. 'capture 30.1/41.0 ms'."""
+        stages = self.tracer.stats(self.name).get(self.name, {})
+        return f"[{self.name}] " + ", ".join(
+            f"{stage} {s['p50_ms']}/{s['p95_ms']} ms" for stage, s in stages.items())
+
+    def status_line(self):
+        now = time.time()
+        started, frames = self._fps_window
+        if now - started >= 1:
+            self.fps = (self.frames - frames) / (now - started)
+            self._fps_window = (now, self.frames)
+        last = self.last_detection.strftime('%H:%M:%S') if self.last_detection else "-"
+        return (f"[{self.name}] {self.state} frames={self.frames} fps={self.fps:.1f} "
+                f"inferences={self.inferences} detections={self.detections} last={last}")
+
+def main(sources, capture_backend=CAPTURE_BACKEND, headless=False, status_interval=10):
     """
-    Main inference loop.
+    Main inference loop for one or more cameras sharing a single model.
     
     Args:
-        stream_url: Camera source (IP camera URL or webcam index)
+        sources (list): Camera sources (IP camera URLs or webcam indices)
+        capture_backend (str): "opencv" or "ffmpeg"
+        headless (bool): Skip the preview windows (for edge boxes without a display)
+        status_interval (float): Seconds between per-camera status lines
     """
-    # Load YOLOv8 model
+    # Load YOLOv8 model once for every camera
     print("Loading YOLOv8n model...")
     model = YOLO('yolov8n.pt')
     print("✅ Model loaded successfully!")
     logging.info("Loaded YOLOv8n model")
     print(f"\nAvailable classes: {list(model.names.values())}")
-    print("\nPress 'q' to quit the application")
-    
-    # Connect to camera
-    cap = connect_camera(stream_url)
-    last_process_time = time.time()
-    
+    if not headless:
+        print("\nPress 'q' to quit the application")
+
+    tracer = StageTracer()
+    preprocessor = Preprocessor()
+    scheduler = InferenceScheduler(
+        lambda frames, stream_ids: preprocessor.run(model, frames, conf=DETECTION_THRESHOLD, verbose=False),
+        batch_size=SCHEDULER_BATCH_SIZE, workers=SCHEDULER_WORKERS, tracer=tracer
+    )
+    clip_recorder = ClipRecorder()
+    journal = DetectionJournal(writer="inference").start()
+    workers = []
+    for index, source in enumerate(sources):
+        worker = CameraWorker(f"cam{index}", source, capture_backend, scheduler, clip_recorder, journal, tracer)
+        scheduler.register(worker.name, FRAME_INTERVAL, DEFAULT_STREAM_PRIORITY,
+                           lambda frame, results, context, w=worker: w.handle_results(frame, results, model))
+        logging.info(f"[{worker.name}] Source: {source}")
+        workers.append(worker)
+
+    scheduler.start()
+    for worker in workers:
+        worker.thread.start()
+
+    last_status = time.time()
     try:
-        while True:
-            # Read frame from camera
-            ret, frame = cap.read()
-            if not ret:
-                logging.error("Failed to read frame from camera")
-                break
-                
-            # Process one frame per second
-            current_time = time.time()
-            if current_time - last_process_time < FRAME_INTERVAL:
-                # Show live preview
-                cv2.imshow('Intellicam Detection', frame)
-                
-                # Check for 'q' key to quit
-                if cv2.waitKey(1) & 0xFF == ord('q'):
+        while any(worker.thread.is_alive() for worker in workers):
+            if headless:
+                time.sleep(0.5)
+            else:
+                # Show live preview; HighGUI must stay on the main thread
+                for worker in workers:
+                    if worker.latest_frame is not None:
+                        cv2.imshow(f'Intellicam Detection - {worker.name}', worker.latest_frame)
+                if cv2.waitKey(30) & 0xFF == ord('q'):
                     break
-                continue
-                
-            last_process_time = current_time
-            
-            # Detect objects in frame
-            detections = detect_objects(frame, model)
-            
-            # Process detections
-            for detection in detections:
-                # Save frame with detection
-                frame_name = save_frame(frame, detection)
-                
-                # Send alert to backend
-                send_alert(detection, frame_name)
-                
-                # Log detection
-                logging.info(
-                    f"Detection: {detection['object']}, "
-                    f"Confidence: {detection['confidence']:.2f}, "
-                    f"Frame: {frame_name}"
-                )
+
+            if time.time() - last_status >= status_interval:
+                last_status = time.time()
+                for worker in workers:
+                    print(worker.status_line())
+                    print(worker.stage_line())
     
     except KeyboardInterrupt:
         logging.info("Stopping inference...")
     finally:
-        cap.release()
-        cv2.destroyAllWindows()
+        for worker in workers:
+            if worker.state == "running":
+                worker.state = "stopped"
+        for worker in workers:
+            worker.thread.join(timeout=2)
+            print(worker.status_line())
+            print(worker.stage_line())
+        scheduler.stop()
+        frame_executor.shutdown(wait=True)  # Journal the detections still being saved
+        journal.close()
+        if not headless:
+            cv2.destroyAllWindows()
 
 if __name__ == "__main__":
     # Parse command line arguments
     parser = argparse.ArgumentParser(description="Intellicam AI Inference Module")
-    parser.add_argument("--stream", "--source", dest="source",
-                      default="0",
-                      help="Camera source: IP camera URL or webcam index (default: 0 for built-in webcam)")
+    parser.add_argument("--stream", "--source", dest="sources", action="append",
+                      help="Camera source: IP camera URL or webcam index; repeat for several cameras "
+                           "(default: CAMERA_SOURCES from config.py)")
+    parser.add_argument("--capture", choices=["opencv", "ffmpeg"], default=CAPTURE_BACKEND,
+                      help="Capture backend; ffmpeg decodes and scales to 640x480 in a subprocess")
+    parser.add_argument("--headless", action="store_true",
+                      help="Run without preview windows")
+    parser.add_argument("--status-interval", type=float, default=10,
+                      help="Seconds between per-camera status lines (default: 10)")
     args = parser.parse_args()
     
-    # Convert source to integer if it's a number (webcam index)
-    source = args.source
-    if source.isdigit():
-        source = int(source)
+    # Convert sources to integers if they are numbers (webcam indices)
+    sources = [int(source) if source.isdigit() else source
+               for source in (args.sources or CAMERA_SOURCES)]
     
     # Start inference
-    main(source)
\ No newline at end of file
+    main(sources, capture_backend=args.capture, headless=args.headless,
+         status_interval=args.status_interval)
\ No newline at end of file
@@ -0,0 +1,345 @@
+"""
+Detection journal for Intellicam AI Engine.
+Structured JSONL record of every detection, written by a background thread
+into size/time-rotated segments with a sidecar index, so the inference loop
+never waits on disk and time-range queries only open the segments they need.
+
+Each writing process (the API engine, inference.py, run_once.py) keeps its
+segments and index in its own subdirectory of JOURNAL_DIR, held under a file
+lock; queries read every writer's index.
+"""
+
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # No writer locking on Windows
+
+from config import (
+    JOURNAL_DIR, JOURNAL_MAX_BYTES, JOURNAL_MAX_SECONDS, JOURNAL_COMPRESS,
+    JOURNAL_FLUSH_INTERVAL, JOURNAL_QUEUE_SIZE, JOURNAL_MAX_SEGMENTS
+)
+
+INDEX_FILE = "index.json"
+LOCK_FILE = ".lock"
+
+
+def _parse_time(value):
+    """
+    Accept datetimes, ISO strings or epoch seconds; return a naive local datetime or None.
+
+    Records are stamped in naive local time, so timezone-aware values are
+    converted to it rather than compared with naive ones.
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value)
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(str(value))
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+
+def _lock_directory(directory):
+    """Take the writer lock of a journal directory; return the open lock file, or None if it is held."""
+    handle = open(os.path.join(directory, LOCK_FILE), "a")
+    if fcntl is None:
+        return handle
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+
+class DetectionJournal:
+    """
+    Append-only detection log split into segments.
+
+    write() only enqueues; a writer thread serialises records, flushes every
+    `flush_interval` seconds and rolls to a new segment once the current one
+    exceeds `max_bytes` or `max_seconds`. Closed segments are optionally
+    gzipped. index.json lists every segment with its time range, streams and
+    record count.
+
+    Segments go to `directory`/`writer`. If another process holds that
+    writer's lock, this one writes to `writer`-<pid> instead, so no two
+    processes ever share an index.
+    """
+
+    def __init__(self, directory=JOURNAL_DIR, writer="engine", max_bytes=JOURNAL_MAX_BYTES, max_seconds=JOURNAL_MAX_SECONDS,
+                 compress=JOURNAL_COMPRESS, flush_interval=JOURNAL_FLUSH_INTERVAL,
+                 queue_size=JOURNAL_QUEUE_SIZE, max_segments=JOURNAL_MAX_SEGMENTS):
+        """
+        Args:
+            directory (str): Journal root shared by every writing process
+            writer (str): Subdirectory this process writes its segments and index to
+            max_bytes (int): Rotate once a segment reaches this size
+            max_seconds (float): Rotate once a segment has been open this long
+            compress (bool): Gzip segments after they are closed
+            flush_interval (float): Seconds between flushes of the open segment
+            queue_size (int): Records buffered before new ones are dropped
+            max_segments (int): Oldest segments are deleted beyond this count (0 keeps all)
+        """
+        self.root = directory
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.compress = compress
+        self.flush_interval = flush_interval
+        self.max_segments = max_segments
+        self.dropped = 0
+        self.written = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._segments = []
+        self._current = None
+        self._file = None
+        self._thread = None
+
+        self.directory = os.path.join(directory, writer)
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock_file = _lock_directory(self.directory)
+        if self._lock_file is None:
+            fallback = f"{writer}-{os.getpid()}"
+            print(f"WARNING: Journal writer '{writer}' is in use by another process; writing to '{fallback}'")
+            self.directory = os.path.join(directory, fallback)
+            os.makedirs(self.directory, exist_ok=True)
+            self._lock_file = _lock_directory(self.directory)
+        index_path = os.path.join(self.directory, INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path, encoding="utf-8") as f:
+                self._segments = json.load(f)
+        # A segment left open by a crash is still readable; just mark it closed
+        for segment in self._segments:
+            segment["open"] = False
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="detection-journal", daemon=True)
+            self._thread.start()
+        return self
+
+    def write(self, record):
+        """
+        Queue one detection record; never blocks.
+
+        Args:
+            record (dict): JSON-serialisable record; "timestamp" (ISO) and
+                "stream_id" are used for the index and filled in if missing
+
+        Returns:
+            bool: False if the queue was full and the record was dropped
+        """
+        record.setdefault("timestamp", datetime.now().isoformat())
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def close(self, timeout=5):
+        """Flush queued records and close the open segment."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    # Writer thread
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                record = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                record = False
+            if record is None:
+                self._rotate()
+                return
+            if record:
+                try:
+                    self._append(record)
+                except Exception as e:
+                    print(f"Detection journal write failed: {e}")
+            now = time.monotonic()
+            if self._file is not None and now - last_flush >= self.flush_interval:
+                last_flush = now
+                self._flush()
+            if self._current is not None and (
+                    self._current["bytes"] >= self.max_bytes
+                    or time.time() - self._current["opened"] >= self.max_seconds):
+                self._rotate()
+
+    def _open_segment(self):
+        name = f"detections-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.jsonl"
+        self._file = open(os.path.join(self.directory, name), "a", encoding="utf-8")
+        self._current = {
+            "file": name, "start": None, "end": None, "streams": [], "count": 0,
+            "bytes": 0, "opened": time.time(), "open": True,
+        }
+        with self._lock:
+            self._segments.append(self._current)
+        self._save_index()
+
+    def _append(self, record):
+        if self._file is None:
+            self._open_segment()
+        line = json.dumps(record, default=str) + "\n"
+        self._file.write(line)
+
+        segment = self._current
+        timestamp = record["timestamp"]
+        with self._lock:
+            if segment["start"] is None or timestamp < segment["start"]:
+                segment["start"] = timestamp
+            if segment["end"] is None or timestamp > segment["end"]:
+                segment["end"] = timestamp
+            stream_id = record.get("stream_id")
+            if stream_id is not None and stream_id not in segment["streams"]:
+                segment["streams"].append(stream_id)
+            segment["count"] += 1
+            segment["bytes"] += len(line)
+        self.written += 1
+
+    def _flush(self):
+        self._file.flush()
+        self._save_index()
+
+    def _rotate(self):
+        # The next record opens a fresh segment
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        segment, self._current = self._current, None
+        if self.compress:
+            path = os.path.join(self.directory, segment["file"])
+            with open(path, "rb") as src, gzip.open(f"{path}.gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(path)
+            segment["file"] += ".gz"
+        segment["open"] = False
+        self._enforce_retention()
+        self._save_index()
+
+    def _enforce_retention(self):
+        if not self.max_segments:
+            return
+        with self._lock:
+            closed = [s for s in self._segments if not s["open"]]
+            expired = closed[:max(0, len(self._segments) - self.max_segments)]
+            for segment in expired:
+                self._segments.remove(segment)
+        for segment in expired:
+            try:
+                os.remove(os.path.join(self.directory, segment["file"]))
+            except OSError:
+                pass
+
+    def _save_index(self):
+        with self._lock:
+            data = json.dumps(self._segments)
+        path = os.path.join(self.directory, INDEX_FILE)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(f"{path}.tmp", path)
+
+    # Queries
+
+    def _all_segments(self):
+        """This writer's segments plus those other writers have indexed, each with its full path."""
+        with self._lock:
+            segments = [dict(s, path=os.path.join(self.directory, s["file"])) for s in self._segments]
+        try:
+            writers = sorted(os.listdir(self.root))
+        except OSError:
+            writers = []
+        for writer in writers:
+            directory = os.path.join(self.root, writer)
+            if directory == self.directory or not os.path.isdir(directory):
+                continue
+            try:
+                with open(os.path.join(directory, INDEX_FILE), encoding="utf-8") as f:
+                    others = json.load(f)
+            except (OSError, ValueError):
+                continue  # Not a writer directory, or no index yet
+            segments.extend(dict(s, path=os.path.join(directory, s["file"])) for s in others)
+        return segments
+
+    def segments_for(self, stream_id=None, start=None, end=None):
+        """
+        Return the index entries, across all writers, that may hold matching records.
+
+        Args:
+            stream_id (str): Only segments that saw this stream
+            start, end: Time range (datetime, ISO string or epoch seconds)
+        """
+        start, end = _parse_time(start), _parse_time(end)
+        selected = []
+        for segment in self._all_segments():
+            if not segment["count"]:
+                continue
+            if stream_id is not None and stream_id not in segment["streams"]:
+                continue
+            if start is not None and _parse_time(segment["end"]) < start:
+                continue
+            if end is not None and _parse_time(segment["start"]) > end:
+                continue
+            selected.append(segment)
+        selected.sort(key=lambda s: s["start"])
+        return selected
+
+    def query(self, stream_id=None, start=None, end=None, limit=None):
+        """
+        Yield records for a stream and/or time range, oldest segment first.
+
+        Only segments whose index entry overlaps the request are opened.
+        Records still waiting in the write queue are not visible yet.
+        """
+        start, end = _parse_time(start), _parse_time(end)
+        matched = 0
+        for segment in self.segments_for(stream_id, start, end):
+            path = segment["path"]
+            opener = gzip.open if path.endswith(".gz") else open
+            try:
+                with opener(path, "rt", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue  # Partially written last line
+                        if stream_id is not None and record.get("stream_id") != stream_id:
+                            continue
+                        timestamp = _parse_time(record["timestamp"])
+                        if (start is not None and timestamp < start) or (end is not None and timestamp > end):
+                            continue
+                        yield record
+                        matched += 1
+                        if limit is not None and matched >= limit:
+                            return
+            except FileNotFoundError:
+                continue  # Removed by retention while we were reading
+
+    def stats(self):
+        """Return writer counters for health reporting."""
+        with self._lock:
+            return {
+                "directory": self.directory,
+                "segments": len(self._segments),
+                "written": self.written,
+                "dropped": self.dropped,
+                "queued": self._queue.qsize(),
+                "current_segment": self._current["file"] if self._current else None,
+            }
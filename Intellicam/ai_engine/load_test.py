@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Load test for the Intellicam AI engines.
+Fires concurrent /detect_frame (app.py) or /detect (local_ai.py) requests
+at a fixed rate or flat out, and reports latency percentiles, throughput,
+error and 429 rates and the engine's own queue metrics. A --ramp run steps
+through several rates to find the saturation point of an instance.
+
+Examples:
+    python load_test.py --target engine --rate 10 --duration 30
+    python load_test.py --target local --concurrency 8 --duration 20
+    python load_test.py --ramp 2,4,8,16,32 --images ./frames
+"""
+
+import argparse
+import base64
+import json
+import queue
+import random
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+import cv2
+import numpy as np
+import requests
+
+from tracing import percentile
+
+TARGETS = {
+    # name: (default base URL, path, image field)
+    "engine": ("http://localhost:8000", "/detect_frame", "image_data"),
+    "local": ("http://localhost:5001", "/detect", "image"),
+}
+SYNTHETIC_SIZES = [(640, 480), (1280, 720), (1920, 1080)]
+
+
+def build_corpus(image_dir=None, synthetic=12, seed=0):
+    """
+    Load real JPEGs and add synthetic ones, base64-encoded once up front.
+
+    Synthetic frames mix flat scenes, gradients, shapes and noise at common
+    camera resolutions, so payload sizes and decode cost vary like real
+    traffic.
+
+    Returns:
+        list: (label, base64 string) pairs
+    """
+    corpus = []
+    if image_dir:
+        for path in sorted(Path(image_dir).rglob("*")):
+            if path.suffix.lower() in (".jpg", ".jpeg", ".png"):
+                frame = cv2.imread(str(path))
+                if frame is not None:
+                    ok, buf = cv2.imencode(".jpg", frame)
+                    corpus.append((path.name, base64.b64encode(buf).decode()))
+
+    rng = np.random.default_rng(seed)
+    for i in range(synthetic):
+        width, height = SYNTHETIC_SIZES[i % len(SYNTHETIC_SIZES)]
+        kind = ("flat", "gradient", "shapes", "noise")[i % 4]
+        if kind == "flat":
+            frame = np.full((height, width, 3), rng.integers(0, 255), dtype=np.uint8)
+        elif kind == "gradient":
+            ramp = np.linspace(0, 255, width, dtype=np.uint8)
+            frame = np.repeat(np.tile(ramp, (height, 1))[:, :, None], 3, axis=2)
+        elif kind == "shapes":
+            frame = np.zeros((height, width, 3), dtype=np.uint8)
+            for _ in range(10):
+                x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+                color = tuple(int(c) for c in rng.integers(0, 255, 3))
+                cv2.rectangle(frame, (x, y), (x + width // 8, y + height // 6), color, -1)
+        else:
+            frame = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+        ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
+        corpus.append((f"synthetic-{kind}-{width}x{height}", base64.b64encode(buf).decode()))
+    return corpus
+
+
+def _percentile_ms(ordered, fraction):
+    value = percentile(ordered, fraction)
+    return round(value * 1000, 1) if value is not None else None
+
+
+class LoadRun:
+    """One load step: sends requests, collects latencies and status codes."""
+
+    def __init__(self, url, field, corpus, rate, concurrency, duration, sessions, timeout):
+        self.url = url
+        self.field = field
+        self.corpus = corpus
+        self.rate = rate
+        self.concurrency = concurrency
+        self.duration = duration
+        self.sessions = sessions
+        self.timeout = timeout
+        self.latencies = []
+        self.statuses = {}
+        self.errors = 0
+        self.client_dropped = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._counter = 0
+
+    def _session(self):
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def _payload(self):
+        with self._lock:
+            self._counter += 1
+            counter = self._counter
+        _, image = self.corpus[counter % len(self.corpus)]
+        payload = {self.field: image}
+        if self.field == "image_data":
+            # Spread requests over sessions so per-client rate limits don't dominate
+            payload["session_id"] = f"loadtest-{counter % self.sessions}"
+        return payload
+
+    def _send(self, intended_at):
+        try:
+            response = self._session().post(self.url, json=self._payload(), timeout=self.timeout)
+            status = response.status_code
+        except requests.exceptions.RequestException:
+            status = None
+        # Measured from the intended send time, so client-side delays are not hidden
+        latency = time.monotonic() - intended_at
+        with self._lock:
+            if status is None:
+                self.errors += 1
+            else:
+                self.statuses[status] = self.statuses.get(status, 0) + 1
+                if status == 200:
+                    self.latencies.append(latency)
+
+    def _open_loop(self, deadline):
+        """
+        Poisson arrivals at `rate`; requests beyond `concurrency` in flight are dropped.
+
+        A fixed pool of `concurrency` workers takes arrival times from a
+        queue, so each keeps its session (and connection) across requests
+        and measured latency excludes client-side connection setup.
+        """
+        arrivals = queue.Queue()
+
+        def worker():
+            while True:
+                at = arrivals.get()
+                if at is None:
+                    return
+                try:
+                    self._send(at)
+                finally:
+                    self._slots.release()
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        next_at = time.monotonic()
+        while next_at < deadline:
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            # A free slot means a worker is idle, so the arrival is picked up at once
+            if self._slots.acquire(blocking=False):
+                arrivals.put(next_at)
+            else:
+                with self._lock:
+                    self.client_dropped += 1
+            next_at += random.expovariate(self.rate)
+        for _ in threads:
+            arrivals.put(None)
+        for thread in threads:
+            thread.join(timeout=self.timeout)
+
+    def _closed_loop(self, deadline):
+        """`concurrency` workers sending back to back."""
+        def worker():
+            while time.monotonic() < deadline:
+                self._send(time.monotonic())
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def run(self):
+        started = time.monotonic()
+        deadline = started + self.duration
+        if self.rate:
+            self._open_loop(deadline)
+        else:
+            self._closed_loop(deadline)
+        self.elapsed = time.monotonic() - started
+        return self
+
+    def summary(self):
+        total = sum(self.statuses.values()) + self.errors
+        ordered = sorted(self.latencies)
+        return {
+            "offered_rps": self.rate or None,
+            "concurrency": self.concurrency,
+            "requests": total,
+            "ok": self.statuses.get(200, 0),
+            "throughput_rps": round(self.statuses.get(200, 0) / self.elapsed, 2),
+            "rate_limited_pct": round(100 * self.statuses.get(429, 0) / total, 1) if total else 0.0,
+            "error_pct": round(100 * (total - self.statuses.get(200, 0) - self.statuses.get(429, 0)) / total, 1)
+                         if total else 0.0,
+            "client_dropped": self.client_dropped,
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+            "latency_ms": {
+                "p50": _percentile_ms(ordered, 0.50),
+                "p90": _percentile_ms(ordered, 0.90),
+                "p95": _percentile_ms(ordered, 0.95),
+                "p99": _percentile_ms(ordered, 0.99),
+                "max": round(ordered[-1] * 1000, 1) if ordered else None,
+            },
+        }
+
+
+class HealthPoller:
+    """Samples /health during a step and keeps the engine's queue metrics, if it reports any."""
+
+    def __init__(self, base_url, interval=1.0):
+        self.url = f"{base_url}/health"
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                health = requests.get(self.url, timeout=2).json()
+                scheduler = health.get("scheduler") or {}
+                admission = health.get("admission") or {}
+                self.samples.append({
+                    "queue_depth": scheduler.get("queue_depth"),
+                    "frame_latency_ms": admission.get("frame_latency_ms", scheduler.get("frame_latency_ms")),
+                    "inflight": admission.get("inflight_frames"),
+                })
+            except (requests.exceptions.RequestException, ValueError):
+                pass
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+    def summary(self):
+        report = {}
+        for key in ("queue_depth", "frame_latency_ms", "inflight"):
+            values = [s[key] for s in self.samples if s.get(key) is not None]
+            if values:
+                report[f"{key}_max"] = max(values)
+                report[f"{key}_mean"] = round(sum(values) / len(values), 1)
+        return report
+
+
+def saturated(result, latency_budget_ms):
+    """A step is saturated when requests pile up, the engine sheds load or errors, or p95 misses the budget."""
+    p95 = result["latency_ms"]["p95"]
+    attempted = result["requests"] + result["client_dropped"]
+    # Drops mean `concurrency` requests were already waiting on the engine
+    return ((attempted and result["client_dropped"] > 0.01 * attempted)
+            or result["rate_limited_pct"] > 5 or result["error_pct"] > 1
+            or (p95 is not None and p95 > latency_budget_ms))
+
+
+def print_result(result):
+    latency = result["latency_ms"]
+    server = result.get("server") or {}
+    offered = f"{result['offered_rps']:>6}" if result["offered_rps"] else "  max "
+    print(f"{offered} rps | {result['throughput_rps']:>7} ok/s | "
+          f"p50 {latency['p50']} p95 {latency['p95']} p99 {latency['p99']} ms | "
+          f"429 {result['rate_limited_pct']}% err {result['error_pct']}% | "
+          f"queue max {server.get('queue_depth_max', '-')} | dropped {result['client_dropped']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Intellicam AI engine load test")
+    parser.add_argument("--target", choices=sorted(TARGETS), default="engine",
+                        help="engine = app.py /detect_frame, local = local_ai.py /detect")
+    parser.add_argument("--url", help="Base URL (default: localhost port of the target)")
+    parser.add_argument("--rate", type=float, default=0,
+                        help="Requests per second (Poisson arrivals); 0 = closed loop, as fast as possible")
+    parser.add_argument("--ramp", help="Comma-separated rates to step through, e.g. 2,4,8,16")
+    parser.add_argument("--concurrency", type=int, default=16, help="Maximum requests in flight")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds per step")
+    parser.add_argument("--warmup", type=float, default=3, help="Seconds of unmeasured load before the first step")
+    parser.add_argument("--images", help="Directory of real JPEG/PNG frames to include in the corpus")
+    parser.add_argument("--synthetic", type=int, default=12, help="Synthetic frames added to the corpus")
+    parser.add_argument("--sessions", type=int, default=64, help="Distinct session_ids (engine target)")
+    parser.add_argument("--timeout", type=float, default=30, help="Per-request timeout in seconds")
+    parser.add_argument("--latency-budget", type=float, default=1000,
+                        help="p95 ms above which a ramp step counts as saturated")
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    default_url, path, field = TARGETS[args.target]
+    base_url = (args.url or default_url).rstrip("/")
+    if urlparse(base_url).hostname not in ("localhost", "127.0.0.1", "::1"):
+        print(f"⚠️  {base_url} is not a localhost engine; results include network latency")
+
+    corpus = build_corpus(args.images, args.synthetic)
+    if not corpus:
+        parser.error("The corpus is empty; pass --images or --synthetic > 0")
+    print(f"🚀 Load testing {base_url}{path} with {len(corpus)} frames "
+          f"({sum(len(b) for _, b in corpus) // len(corpus) // 1024} KB average payload)")
+
+    try:
+        requests.get(f"{base_url}/health", timeout=5).raise_for_status()
+    except requests.exceptions.RequestException as e:
+        print(f"❌ Engine not reachable: {e}")
+        return
+
+    def step(rate, duration, poll=True):
+        run = LoadRun(f"{base_url}{path}", field, corpus, rate, args.concurrency,
+                      duration, args.sessions, args.timeout)
+        if not poll:
+            return run.run().summary()
+        with HealthPoller(base_url) as poller:
+            result = run.run().summary()
+        result["server"] = poller.summary()
+        return result
+
+    if args.warmup > 0:
+        step(args.rate or 0, args.warmup, poll=False)
+
+    rates = [float(r) for r in args.ramp.split(",")] if args.ramp else [args.rate]
+    results = []
+    for rate in rates:
+        result = step(rate, args.duration)
+        results.append(result)
+        print_result(result)
+        if args.ramp and saturated(result, args.latency_budget):
+            print(f"📈 Saturated at {rate} rps offered "
+                  f"(sustained {result['throughput_rps']} ok/s)")
+            break
+    else:
+        if args.ramp:
+            print("📈 Not saturated at the highest rate tried; extend --ramp")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"target": args.target, "url": base_url, "steps": results}, f, indent=2)
+        print(f"Results written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ import base64
 import numpy as np
 from datetime import datetime
 import os
+from profiles import ProfileRegistry
 
 app = Flask(__name__)
 CORS(app, origins="*")
@@ -18,8 +19,10 @@ except Exception as e:
     print(f"Error loading model: {e}")
     model = None
 
-# Detect ALL objects - no filtering
-DETECTION_THRESHOLD = 0.25
+# Detect ALL objects - no filtering; the "local" pipeline profile sets the
+# threshold and which classes count as threats, and can be switched per request
+profiles = ProfileRegistry()
+LOCAL_PROFILE = "local"
 
 @app.route('/health', methods=['GET'])
 def health():
@@ -29,7 +32,8 @@ def health():
         "model_loaded": model is not None,
         "all_classes": available_classes,
         "total_classes": len(available_classes),
-        "detection_threshold": DETECTION_THRESHOLD
+        "detection_threshold": profiles.get(LOCAL_PROFILE).threshold,
+        "profiles": sorted(profiles.stats()["profiles"])
     }
 
 @app.route('/classes', methods=['GET'])
@@ -45,6 +49,10 @@ def detect_objects():
     try:
         data = request.json
         image_data = data.get('image')
+        profile = profiles.get(data.get('profile') or LOCAL_PROFILE)
+        
+        if profile is None:
+            return {"error": f"Unknown profile: {data.get('profile')}"}, 400
         
         if not image_data:
             return {"error": "No image data provided"}, 400
@@ -70,7 +78,8 @@ def detect_objects():
             return {"error": f"Failed to decode image: {str(e)}"}, 400
         
         # Run YOLO detection
-        results = model(frame, conf=DETECTION_THRESHOLD)[0]
+        crop, (x_offset, y_offset) = profile.crop(frame)
+        results = model(crop, **profile.predict_args())[0]
         detections = []
         all_objects = []
         
@@ -86,7 +95,7 @@ def detect_objects():
                 "object": class_name,
                 "confidence": round(conf, 2),
                 "timestamp": datetime.now().isoformat(),
-                "bbox": [int(x1), int(y1), int(x2), int(y2)]
+                "bbox": [int(x1) + x_offset, int(y1) + y_offset, int(x2) + x_offset, int(y2) + y_offset]
             }
             detections.append(detection)
         
@@ -98,7 +107,7 @@ def detect_objects():
         return {
             "success": True,
             "detections": detections,
-            "threats_found": len([d for d in detections if d['object'] in {'knife', 'scissors', 'gun'}]),
+            "threats_found": len([d for d in detections if d['object'] in profile.target_classes]),
             "total_objects": len(detections),
             "timestamp": datetime.now().isoformat()
         }
@@ -113,7 +122,7 @@ if __name__ == '__main__':
         print(f"YOLOv8 classes available: {len(model.names)}")
         all_classes = list(model.names.values())
         print(f"All classes: {', '.join(all_classes)}")
-    print(f"Detection threshold: {DETECTION_THRESHOLD}")
+    print(f"Detection threshold: {profiles.get(LOCAL_PROFILE).threshold}")
     print("AI Engine running on http://localhost:5001")
     port = int(os.environ.get('PORT', 5001))
     app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
@@ -0,0 +1,222 @@
+"""
+Model registry for Intellicam AI Engine.
+Loads and warms up new model versions in the background and swaps them in
+between inference batches, with optional canary routing and instant
+rollback, so retrained weights can ship without dropping camera streams.
+"""
+
+import os
+import threading
+import time
+import zlib
+from datetime import datetime
+
+import numpy as np
+from ultralytics import YOLO
+
+from config import DEFAULT_CAMERA_WIDTH, DEFAULT_CAMERA_HEIGHT, MODEL_WARMUP_RUNS, SCHEDULER_BATCH_SIZE
+
+
+class ModelVersion:
+    """A loaded model plus its provenance and load timings."""
+
+    def __init__(self, version, path):
+        self.version = version
+        self.path = path
+        self.model = None
+        self.status = "loading"
+        self.error = None
+        self.load_ms = None
+        self.warmup_ms = None
+        self.loaded_at = None
+
+    def to_dict(self):
+        return {
+            "version": self.version,
+            "path": self.path,
+            "status": self.status,
+            "error": self.error,
+            "load_ms": self.load_ms,
+            "warmup_ms": self.warmup_ms,
+            "loaded_at": self.loaded_at,
+            "cpu_optimization": getattr(self.model, "optimization", None),
+        }
+
+
+class ModelRegistry:
+    """
+    Holds the active, canary and previous model versions.
+
+    Readers call model_for() once per batch and use that reference for the
+    whole batch, so a swap only ever takes effect between batches. Retired
+    versions are dropped and freed once no batch still uses them. A canary
+    receives a stable percentage of streams chosen by hashing stream_id.
+    """
+
+    def __init__(self, loader=YOLO, warmup_runs=MODEL_WARMUP_RUNS,
+                 warmup_shape=(DEFAULT_CAMERA_HEIGHT, DEFAULT_CAMERA_WIDTH, 3), preprocessor=None,
+                 warmup_batch=SCHEDULER_BATCH_SIZE):
+        """
+        Args:
+            loader: Callable(path) returning a model
+            warmup_runs (int): Warm-up inferences per batch size
+            warmup_shape (tuple): Shape of the blank warm-up frames
+            preprocessor: Preprocessor the scheduler serves through; warm-up
+                then feeds the model the same tensor batches live traffic
+                does (so CPU-optimised and compiled paths are warmed, not the
+                numpy fallback)
+            warmup_batch (int): Largest batch warmed up (single frames are
+                warmed too)
+        """
+        self.loader = loader
+        self.warmup_runs = warmup_runs
+        self.warmup_shape = warmup_shape
+        self.preprocessor = preprocessor
+        self.warmup_batch = warmup_batch
+        self.active = None
+        self.canary = None
+        self.canary_percent = 0
+        self.previous = None
+        self.loading = None
+        self._lock = threading.Lock()
+        self._counter = 0
+
+    def _new_version(self, path, version):
+        # Caller holds the lock
+        if not version:
+            version = f"{os.path.splitext(os.path.basename(path))[0]}-{self._counter + 1}"
+        for entry in (self.active, self.canary, self.loading):
+            if entry is not None and entry.version == version:
+                raise RuntimeError(f"Model version {version} is already {entry.status}")
+        self._counter += 1
+        return ModelVersion(version, path)
+
+    def _load(self, entry):
+        """Load and warm up a version in the calling thread."""
+        try:
+            started = time.monotonic()
+            entry.model = self.loader(entry.path)
+            entry.load_ms = round((time.monotonic() - started) * 1000, 1)
+
+            started = time.monotonic()
+            dummy = np.zeros(self.warmup_shape, dtype=np.uint8)
+            for _ in range(self.warmup_runs):
+                if self.preprocessor is None:
+                    entry.model(dummy, verbose=False)
+                    continue
+                # Each input shape is compiled on first use; warm the shapes live batches use
+                for batch in sorted({1, self.warmup_batch}):
+                    self.preprocessor.run(entry.model, [dummy] * batch, verbose=False)
+            entry.warmup_ms = round((time.monotonic() - started) * 1000, 1)
+
+            entry.loaded_at = datetime.now().isoformat()
+            entry.status = "ready"
+            return True
+        except Exception as e:
+            entry.status = "failed"
+            entry.error = str(e)
+            print(f"Failed to load model {entry.version} from {entry.path}: {e}")
+            return False
+
+    def load_initial(self, path, version=None):
+        """Synchronously load the startup model and make it active."""
+        with self._lock:
+            entry = self._new_version(path, version)
+        if not self._load(entry):
+            raise RuntimeError(f"Cannot load model {path}: {entry.error}")
+        entry.status = "active"
+        self.active = entry
+        return entry
+
+    def load(self, path, version=None, canary_percent=0):
+        """
+        Load a new version in the background.
+
+        Once warmed up it becomes the canary (if canary_percent > 0) or is
+        promoted straight to active.
+
+        Returns:
+            ModelVersion: The version being loaded
+
+        Raises:
+            RuntimeError: A load is already running, or `version` names the
+                active, canary or loading version
+        """
+        # Check and claim the loading slot atomically so concurrent requests can't both start a load
+        with self._lock:
+            if self.loading is not None:
+                raise RuntimeError(f"Model {self.loading.version} is still loading")
+            entry = self.loading = self._new_version(path, version)
+
+        def run():
+            ok = self._load(entry)
+            with self._lock:
+                self.loading = None
+                if not ok:
+                    return
+                if canary_percent > 0:
+                    if self.canary is not None:
+                        self.canary.status = "retired"
+                    entry.status = "canary"
+                    self.canary = entry
+                    self.canary_percent = min(100, canary_percent)
+                else:
+                    self._promote(entry)
+            print(f"Model {entry.version} ready (load {entry.load_ms} ms, warm-up {entry.warmup_ms} ms) as {entry.status}")
+
+        threading.Thread(target=run, name=f"model-load-{entry.version}", daemon=True).start()
+        return entry
+
+    def _promote(self, entry):
+        # Caller holds the lock
+        if self.previous is not None and self.previous is not entry:
+            self.previous.status = "retired"
+        if self.active is not None:
+            self.active.status = "previous"
+        self.previous = self.active
+        entry.status = "active"
+        self.active = entry
+        if self.canary is entry:
+            self.canary = None
+            self.canary_percent = 0
+
+    def promote(self):
+        """Make the current canary the active version for every stream."""
+        with self._lock:
+            if self.canary is None:
+                raise RuntimeError("No canary model to promote")
+            self._promote(self.canary)
+            return self.active
+
+    def rollback(self):
+        """Drop the canary if there is one, otherwise restore the previous version."""
+        with self._lock:
+            if self.canary is not None:
+                self.canary.status = "retired"
+                self.canary = None
+                self.canary_percent = 0
+                return self.active
+            if self.previous is None:
+                raise RuntimeError("No previous model to roll back to")
+            self.active.status = "retired"
+            self.previous.status = "active"
+            self.active, self.previous = self.previous, None
+            return self.active
+
+    def model_for(self, stream_id=None):
+        """Return the version that should serve a stream's next batch."""
+        canary, percent = self.canary, self.canary_percent
+        if canary is not None and stream_id is not None:
+            if zlib.crc32(str(stream_id).encode()) % 100 < percent:
+                return canary
+        return self.active
+
+    def stats(self):
+        """Return registry state for health reporting."""
+        with self._lock:
+            return {
+                "active": self.active.to_dict() if self.active else None,
+                "canary": dict(self.canary.to_dict(), percent=self.canary_percent) if self.canary else None,
+                "previous": self.previous.to_dict() if self.previous else None,
+                "loading": self.loading.to_dict() if self.loading else None,
+            }
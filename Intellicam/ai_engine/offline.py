@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Intellicam - Offline footage processing
+Re-scans recorded video files faster than real time. Files are split into
+segments that are decoded and sampled in parallel worker processes, while
+the main process batches the sampled frames through a single detector.
+Results go to JSONL with the original timestamps, and interrupted runs
+resume from the last checkpoint.
+"""
+
+import os
+import cv2
+import json
+import time
+import queue
+import logging
+import argparse
+import multiprocessing as mp
+from pathlib import Path
+from datetime import datetime, timedelta
+from ultralytics import YOLO
+from config import (
+    DETECTION_THRESHOLD, MODEL_PATH, DEFAULT_CAMERA_WIDTH, OFFLINE_SAMPLE_FPS,
+    OFFLINE_BATCH_SIZE, OFFLINE_SEGMENT_SECONDS, OFFLINE_VIDEO_EXTENSIONS, OFFLINE_FRAME_TIMEOUT
+)
+from inference import parse_detections, save_frame
+from preprocess import Preprocessor
+from cpu_inference import optimize
+
+
+def find_videos(inputs):
+    """
+    Expand files and directories into a sorted list of video files.
+
+    Args:
+        inputs (list): File or directory paths
+
+    Returns:
+        list: Video file paths
+    """
+    videos = []
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            videos.extend(p for p in path.rglob("*") if p.suffix.lower() in OFFLINE_VIDEO_EXTENSIONS)
+        elif path.is_file():
+            videos.append(path)
+        else:
+            logging.warning(f"Skipping missing input: {item}")
+    return sorted(str(v) for v in videos)
+
+
+def probe_video(path):
+    """
+    Read duration and recording start time of a video.
+
+    The start time is estimated as the file's modification time minus its
+    duration, since recorders close the file when the recording ends.
+
+    Returns:
+        tuple: (duration seconds, datetime start)
+    """
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0
+    frames = cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0
+    cap.release()
+    duration = frames / fps if fps > 0 else 0.0
+    start = datetime.fromtimestamp(os.path.getmtime(path)) - timedelta(seconds=duration)
+    return duration, start
+
+
+def decode_worker(tasks, frames, sample_fps, max_width, current, slot):
+    """
+    Worker process: decode assigned segments and emit sampled frames.
+
+    Frames between samples are only grabbed, never converted, which keeps
+    decode cost close to the demuxing cost on most codecs. The number of the
+    segment being decoded is kept in current[slot] (-1 when idle), so the
+    main process knows which input a crashed worker was on.
+    """
+    step = 1.0 / sample_fps
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        number, key, path, seg_start, seg_end, resume_from = task
+        current[slot] = number
+        cap = cv2.VideoCapture(path)
+        next_sample = max(seg_start, resume_from)
+        if next_sample > 0:
+            cap.set(cv2.CAP_PROP_POS_MSEC, next_sample * 1000)
+
+        while cap.grab():
+            offset = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+            if offset >= seg_end:
+                break
+            if offset + 1e-3 < next_sample:
+                continue
+            ok, frame = cap.retrieve()
+            if not ok:
+                break
+            height, width = frame.shape[:2]
+            if width > max_width:
+                frame = cv2.resize(frame, (max_width, int(height * max_width / width)), interpolation=cv2.INTER_AREA)
+            frames.put((key, offset, frame))
+            next_sample = offset + step
+
+        cap.release()
+        frames.put((key, None, None))
+        current[slot] = -1
+
+
+class Checkpoint:
+    """
+    Resume state: the last processed offset of every segment.
+
+    Written atomically next to the output file after every batch, so an
+    interrupted run restarts each segment just after its last written frame.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.state = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.state = json.load(f)
+
+    def offset(self, key):
+        return self.state.get(key, {}).get("offset", -1.0)
+
+    def done(self, key):
+        return self.state.get(key, {}).get("done", False)
+
+    def update(self, key, offset=None, done=False):
+        entry = self.state.setdefault(key, {"offset": -1.0, "done": False})
+        if offset is not None:
+            entry["offset"] = max(entry["offset"], offset)
+        entry["done"] = entry["done"] or done
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.path)
+
+
+def main(inputs, output, sample_fps=OFFLINE_SAMPLE_FPS, workers=None, batch_size=OFFLINE_BATCH_SIZE,
+         segment_seconds=OFFLINE_SEGMENT_SECONDS, stills_dir=None, progress_interval=5):
+    """
+    Process recorded footage.
+
+    Args:
+        inputs (list): Video files or directories
+        output (str): JSONL file detections are appended to
+        sample_fps (float): Frames per second of footage to run the detector on
+        workers (int): Decode worker processes (default: CPU count - 1)
+        batch_size (int): Frames per detector call
+        segment_seconds (float): Length of the chunks files are split into
+        stills_dir (str): Directory for annotated stills, or None to skip
+        progress_interval (float): Seconds between progress lines
+
+    Returns:
+        list: Keys ("<file>#<start second>") of segments that failed because
+            their decode worker died
+    """
+    videos = find_videos(inputs)
+    if not videos:
+        logging.error("No video files found")
+        return
+
+    checkpoint = Checkpoint(f"{output}.checkpoint.json")
+    segments = {}
+    for path in videos:
+        duration, start = probe_video(path)
+        if not duration:
+            # Unknown length: treat the whole file as one open-ended segment
+            key = f"{path}#0"
+            if not checkpoint.done(key):
+                segments[key] = (path, 0.0, float("inf"), start)
+            continue
+        seg_start = 0.0
+        while seg_start < duration:
+            key = f"{path}#{int(seg_start)}"
+            if not checkpoint.done(key):
+                segments[key] = (path, seg_start, min(seg_start + segment_seconds, duration), start)
+            seg_start += segment_seconds
+
+    if not segments:
+        logging.info("Nothing to do; every segment is already in the checkpoint")
+        return
+    known = [end - max(seg_start, checkpoint.offset(key)) for key, (_, seg_start, end, _) in segments.items()
+             if end != float("inf")]
+    logging.info(f"{len(videos)} file(s), {len(segments)} segment(s) to process "
+                 f"({sum(known) / 3600:.1f} h of footage)")
+
+    # Start decoders before loading the model so forked workers stay small
+    ctx = mp.get_context("fork" if "fork" in mp.get_all_start_methods() else "spawn")
+    tasks = ctx.Queue()
+    frames = ctx.Queue(maxsize=batch_size * 4)
+    workers = min(workers or max(1, (os.cpu_count() or 2) - 1), len(segments))
+    keys = list(segments)
+    for number, (key, (path, seg_start, seg_end, _)) in enumerate(segments.items()):
+        tasks.put((number, key, path, seg_start, seg_end, checkpoint.offset(key) + 1e-3))
+    current = ctx.Array("i", [-1] * workers)
+    processes = [ctx.Process(target=decode_worker, daemon=True,
+                             args=(tasks, frames, sample_fps, DEFAULT_CAMERA_WIDTH, current, slot))
+                 for slot in range(workers)]
+    for process in processes:
+        tasks.put(None)
+        process.start()
+
+    print("Loading YOLOv8n model...")
+    model = optimize(YOLO(MODEL_PATH), batch_size=batch_size)
+    preprocessor = Preprocessor(capacity=batch_size)
+    print("✅ Model loaded successfully!")
+
+    remaining = set(segments)
+    failed = []
+    started = last_progress = time.time()
+    sampled = detections_written = 0
+    footage_seconds = 0.0
+    batch = []
+
+    def flush(out):
+        nonlocal detections_written, footage_seconds
+        results = preprocessor.run(model, [frame for _, _, frame in batch], conf=DETECTION_THRESHOLD, verbose=False)
+        for (key, offset, frame), result in zip(batch, results):
+            path, _, _, start = segments[key]
+            for detection in parse_detections(result, model):
+                record = {
+                    "file": path,
+                    "offset_s": round(offset, 3),
+                    "timestamp": (start + timedelta(seconds=offset)).isoformat(),
+                    **detection
+                }
+                if stills_dir:
+                    record["still"] = save_frame(frame.copy(), detection, stills_dir)
+                out.write(json.dumps(record) + "\n")
+                detections_written += 1
+            checkpoint.update(key, offset=offset)
+        footage_seconds += len(batch) / sample_fps
+        out.flush()
+        checkpoint.save()
+        batch.clear()
+
+    def reap_workers(drained=False):
+        """
+        Fail the segments of workers that died mid-segment.
+
+        With `drained` (frames.get just timed out, so everything the exited
+        workers sent has been read) also fail whatever is left once no worker
+        is running.
+        """
+        for slot, process in enumerate(processes):
+            if process.exitcode is None or current[slot] < 0:
+                continue
+            key = keys[current[slot]]
+            current[slot] = -1
+            if key in remaining:
+                remaining.discard(key)
+                failed.append(key)
+                logging.error(f"Decode worker died (exit code {process.exitcode}) on {key}; marked as failed")
+        if drained and remaining and all(process.exitcode is not None for process in processes):
+            logging.error(f"No decode workers left; {len(remaining)} segment(s) marked as failed")
+            failed.extend(sorted(remaining))
+            remaining.clear()
+
+    try:
+        with open(output, "a", encoding="utf-8") as out:
+            while remaining:
+                try:
+                    key, offset, frame = frames.get(timeout=OFFLINE_FRAME_TIMEOUT)
+                except queue.Empty:
+                    reap_workers(drained=True)
+                    continue
+                if key not in remaining:
+                    continue  # Late frame of a segment already marked as failed
+                if offset is None:
+                    if batch:
+                        flush(out)
+                    remaining.discard(key)
+                    checkpoint.update(key, done=True)
+                    checkpoint.save()
+                    continue
+
+                sampled += 1
+                batch.append((key, offset, frame))
+                if len(batch) >= batch_size:
+                    flush(out)
+
+                now = time.time()
+                if now - last_progress >= progress_interval:
+                    last_progress = now
+                    reap_workers()
+                    elapsed = now - started
+                    logging.info(
+                        f"Progress: {len(segments) - len(remaining)}/{len(segments)} segments, "
+                        f"{sampled} frames ({sampled / elapsed:.1f} fps), "
+                        f"{footage_seconds / elapsed:.0f}x real time, {detections_written} detections"
+                    )
+            if batch:
+                flush(out)
+    except KeyboardInterrupt:
+        logging.info("Interrupted; re-run the same command to resume from the checkpoint")
+    finally:
+        for process in processes:
+            process.terminate()
+
+    elapsed = time.time() - started
+    logging.info(f"Done: {sampled} frames in {elapsed:.1f}s "
+                 f"({footage_seconds / max(elapsed, 1e-6):.0f}x real time), "
+                 f"{detections_written} detections written to {output}")
+    if failed:
+        logging.error(f"{len(failed)} segment(s) failed and were not checkpointed; "
+                      f"re-run to retry: {', '.join(failed)}")
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Intellicam offline footage processing")
+    parser.add_argument("inputs", nargs="+", help="Video files or directories of videos")
+    parser.add_argument("--output", "-o", default="detections.jsonl",
+                        help="JSONL output file (default: detections.jsonl)")
+    parser.add_argument("--sample-fps", type=float, default=OFFLINE_SAMPLE_FPS,
+                        help=f"Frames of footage per second to analyse (default: {OFFLINE_SAMPLE_FPS})")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Decode worker processes (default: CPU count - 1)")
+    parser.add_argument("--batch-size", type=int, default=OFFLINE_BATCH_SIZE,
+                        help=f"Frames per detector call (default: {OFFLINE_BATCH_SIZE})")
+    parser.add_argument("--segment-seconds", type=float, default=OFFLINE_SEGMENT_SECONDS,
+                        help=f"Split files into chunks of this length (default: {OFFLINE_SEGMENT_SECONDS})")
+    parser.add_argument("--stills", dest="stills_dir", default=None,
+                        help="Also save annotated stills of detections to this directory")
+    args = parser.parse_args()
+
+    failed = main(args.inputs, args.output, sample_fps=args.sample_fps, workers=args.workers,
+                  batch_size=args.batch_size, segment_seconds=args.segment_seconds, stills_dir=args.stills_dir)
+    raise SystemExit(1 if failed else 0)
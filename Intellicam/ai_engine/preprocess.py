@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Allocation-free preprocessing for Intellicam AI Engine.
+Letterboxes frames straight into preallocated, reused input tensors and
+hands the ready batch to the model, instead of letting every inference
+allocate fresh arrays for the resize, padding, BGR->RGB, HWC->CHW and
+float conversion steps.
+
+Run directly to benchmark it against the allocating path:
+    python preprocess.py --benchmark
+"""
+
+import argparse
+import resource
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+from config import (
+    PREPROCESS_ENABLED, PREPROCESS_IMGSZ, PREPROCESS_STRIDE, PREPROCESS_PAD_VALUE,
+    DEFAULT_CAMERA_WIDTH, DEFAULT_CAMERA_HEIGHT, SCHEDULER_BATCH_SIZE
+)
+
+_SCALE = np.float32(1 / 255)
+
+
+def letterbox_shape(height, width, imgsz, stride=PREPROCESS_STRIDE):
+    """
+    Resized size and minimal stride-aligned input shape for a frame.
+
+    Matches ultralytics' rectangular letterbox: the long side becomes imgsz
+    and each side is padded up to a multiple of the stride.
+
+    Returns:
+        tuple: (resized width, resized height, input height, input width, gain)
+    """
+    gain = min(imgsz / height, imgsz / width)
+    new_w, new_h = max(1, round(width * gain)), max(1, round(height * gain))
+    input_h = -(-new_h // stride) * stride
+    input_w = -(-new_w // stride) * stride
+    return new_w, new_h, input_h, input_w, gain
+
+
+class _TensorPool:
+    """Reused batch tensor plus per-slot resize scratch for one input shape."""
+
+    def __init__(self, height, width, capacity):
+        self.height = height
+        self.width = width
+        self.capacity = capacity
+        self.tensor = np.full((capacity, 3, height, width), PREPROCESS_PAD_VALUE * _SCALE, dtype=np.float32)
+        self.scratch = np.empty((capacity, height, width, 3), dtype=np.uint8)
+        self.layouts = [None] * capacity  # (new_h, new_w, top, left) last written to each slot
+
+
+class Preprocessor:
+    """
+    Shared workspaces of preallocated input tensors, keyed by input shape.
+
+    prepare() resizes each frame directly into its slot's scratch buffer and
+    converts that region in place into the float CHW tensor; the padding
+    around it is only rewritten when the slot's layout changes.
+
+    Each call checks a workspace out of a free list and returns it when done,
+    so there are only as many workspaces as calls that ever ran at once,
+    however many threads (scheduler workers, one per Flask request) call in.
+    The tensor prepare() returns may be reused by any later call; copy it to
+    keep it.
+    """
+
+    def __init__(self, imgsz=PREPROCESS_IMGSZ, stride=PREPROCESS_STRIDE, capacity=SCHEDULER_BATCH_SIZE,
+                 enabled=PREPROCESS_ENABLED):
+        """
+        Args:
+            imgsz (int): Default inference size (long side)
+            stride (int): Model stride input sides are padded to
+            capacity (int): Batch slots allocated up front per shape; pools
+                grow if a larger batch arrives
+            enabled (bool): When False (or torch is missing) run() passes
+                frames to the model unchanged
+        """
+        self.imgsz = imgsz
+        self.stride = stride
+        self.capacity = max(1, capacity)
+        self.enabled = enabled and torch is not None
+        self._free = []  # Idle workspaces: {(height, width): _TensorPool}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _workspace(self):
+        with self._lock:
+            pools = self._free.pop() if self._free else {}
+        try:
+            yield pools
+        finally:
+            with self._lock:
+                self._free.append(pools)
+
+    @staticmethod
+    def _pool(pools, height, width, size, capacity):
+        pool = pools.get((height, width))
+        if pool is None or pool.capacity < size:
+            pool = pools[(height, width)] = _TensorPool(height, width, max(size, capacity))
+        return pool
+
+    def prepare(self, frames, imgsz=None):
+        """
+        Letterbox a batch of BGR frames into a reused float32 NCHW array.
+
+        Returns:
+            tuple: (array view of the batch, [(gain, left, top, height, width) per frame])
+        """
+        with self._workspace() as pools:
+            return self._prepare(pools, frames, imgsz)
+
+    def _prepare(self, pools, frames, imgsz):
+        imgsz = imgsz or self.imgsz
+        shapes = [letterbox_shape(*frame.shape[:2], imgsz, self.stride) for frame in frames]
+        # One tensor shape per batch: the largest stride-aligned shape of its frames
+        input_h = max(shape[2] for shape in shapes)
+        input_w = max(shape[3] for shape in shapes)
+        pool = self._pool(pools, input_h, input_w, len(frames), self.capacity)
+
+        metas = []
+        for slot, (frame, (new_w, new_h, _, _, gain)) in enumerate(zip(frames, shapes)):
+            top, left = (input_h - new_h) // 2, (input_w - new_w) // 2
+            layout = (new_h, new_w, top, left)
+            if pool.layouts[slot] != layout:
+                pool.tensor[slot].fill(PREPROCESS_PAD_VALUE * _SCALE)
+                pool.layouts[slot] = layout
+
+            region = pool.scratch[slot, :new_h, :new_w]
+            if (new_h, new_w) == frame.shape[:2]:
+                region[...] = frame
+            else:
+                cv2.resize(frame, (new_w, new_h), dst=region, interpolation=cv2.INTER_LINEAR)
+            # BGR->RGB, HWC->CHW and /255 in one pass, straight into the tensor
+            np.multiply(region[:, :, ::-1].transpose(2, 0, 1), _SCALE,
+                        out=pool.tensor[slot, :, top:top + new_h, left:left + new_w])
+            metas.append((gain, left, top) + frame.shape[:2])
+        return pool.tensor[:len(frames)], metas
+
+    @staticmethod
+    def restore(result, meta):
+        """Map a result's boxes from letterboxed input coordinates back onto the frame, in place."""
+        gain, left, top, height, width = meta
+        boxes = result.boxes.data
+        if not len(boxes):
+            return
+        boxes[:, [0, 2]] -= left
+        boxes[:, [1, 3]] -= top
+        boxes[:, :4] /= gain
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clamp(0, width)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clamp(0, height)
+
+    def run(self, model, frames, imgsz=None, **kwargs):
+        """
+        Run an ultralytics model on frames through the preallocated tensors.
+
+        Args:
+            model: Ultralytics model
+            frames (list): BGR frames, any mix of resolutions
+            imgsz (int): Inference size (defaults to the preprocessor's)
+            **kwargs: Passed to the model call (conf, verbose, ...)
+
+        Returns:
+            list: One result per frame, boxes in frame coordinates
+        """
+        if not self.enabled:
+            if imgsz:
+                kwargs["imgsz"] = imgsz
+            return model(frames, **kwargs)
+        with self._workspace() as pools:
+            batch, metas = self._prepare(pools, frames, imgsz)
+            results = model(torch.from_numpy(batch), **kwargs)
+        # Result tensors are created under inference mode and can only be edited in place inside it
+        with torch.inference_mode():
+            for result, meta in zip(results, metas):
+                self.restore(result, meta)
+        return results
+
+
+def allocating_preprocess(frames, imgsz=PREPROCESS_IMGSZ, stride=PREPROCESS_STRIDE):
+    """The per-call path this module replaces (ultralytics' default steps), for benchmarking."""
+    letterboxed = []
+    for frame in frames:
+        new_w, new_h, input_h, input_w, _ = letterbox_shape(*frame.shape[:2], imgsz, stride)
+        resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        top, left = (input_h - new_h) // 2, (input_w - new_w) // 2
+        letterboxed.append(cv2.copyMakeBorder(resized, top, input_h - new_h - top, left, input_w - new_w - left,
+                                              cv2.BORDER_CONSTANT, value=(PREPROCESS_PAD_VALUE,) * 3))
+    batch = np.stack(letterboxed)[..., ::-1].transpose(0, 3, 1, 2)
+    return np.ascontiguousarray(batch).astype(np.float32) / 255
+
+
+def benchmark(batch_size=SCHEDULER_BATCH_SIZE, iterations=200, imgsz=PREPROCESS_IMGSZ,
+              width=DEFAULT_CAMERA_WIDTH * 2, height=DEFAULT_CAMERA_HEIGHT * 2):
+    """
+    Compare per-frame latency, peak array allocations (numpy reports to
+    tracemalloc) and minor page faults of the allocating and preallocated paths.
+    """
+    frames = [np.random.randint(0, 255, (height, width, 3), dtype=np.uint8) for _ in range(batch_size)]
+    preprocessor = Preprocessor(imgsz=imgsz, capacity=batch_size, enabled=True)
+    candidates = {
+        "allocating": lambda: allocating_preprocess(frames, imgsz),
+        "preallocated": lambda: preprocessor.prepare(frames, imgsz),
+    }
+    print(f"Preprocessing {batch_size} x {width}x{height} frames to imgsz {imgsz}, {iterations} batches")
+    for name, fn in candidates.items():
+        fn()  # Warm up pools and caches
+        faults = resource.getrusage(resource.RUSAGE_SELF).ru_minflt
+        started = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        elapsed = time.perf_counter() - started
+        faults = resource.getrusage(resource.RUSAGE_SELF).ru_minflt - faults
+
+        tracemalloc.start()
+        for _ in range(20):
+            fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        frames_done = iterations * batch_size
+        print(f"  {name:>12}: {elapsed / frames_done * 1000:.3f} ms/frame, "
+              f"{faults / frames_done:.1f} page faults/frame, "
+              f"peak allocated {peak / 1024 / 1024:.2f} MiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Intellicam preprocessing benchmark")
+    parser.add_argument("--benchmark", action="store_true", help="Run the preprocessing benchmark")
+    parser.add_argument("--batch-size", type=int, default=SCHEDULER_BATCH_SIZE)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--imgsz", type=int, default=PREPROCESS_IMGSZ)
+    parser.add_argument("--width", type=int, default=DEFAULT_CAMERA_WIDTH * 2)
+    parser.add_argument("--height", type=int, default=DEFAULT_CAMERA_HEIGHT * 2)
+    args = parser.parse_args()
+    if args.benchmark:
+        benchmark(args.batch_size, args.iterations, args.imgsz, args.width, args.height)
+    else:
+        parser.print_help()
@@ -0,0 +1,199 @@
+"""
+Annotated MJPEG preview for Intellicam AI Engine.
+Draws the most recent inference result onto live captured frames, so
+dashboards can show moving boxes without running the model any faster.
+"""
+
+import asyncio
+import threading
+import time
+
+import cv2
+
+from config import (
+    PREVIEW_DEFAULT_WIDTH, PREVIEW_MIN_WIDTH, PREVIEW_MAX_WIDTH, PREVIEW_WIDTH_STEP,
+    PREVIEW_DEFAULT_FPS, PREVIEW_MAX_FPS, PREVIEW_JPEG_QUALITY
+)
+
+
+class _PreviewState:
+    def __init__(self):
+        self.frame = None
+        self.seq = 0
+        self.captured_at = 0.0
+        self.detections = []
+        self.viewers = 0
+        self.encoded = {}  # width -> (seq, jpeg bytes)
+        self.encoders = {}  # width -> lock held while that width is being encoded
+        self.cond = threading.Condition()
+
+
+class PreviewHub:
+    """
+    Latest frame, latest detections and shared JPEG encodings per stream.
+
+    Capture threads hand over frames only while someone is watching, at no
+    more than PREVIEW_MAX_FPS. Each (frame, width) pair is annotated and
+    encoded once, then served to every viewer that asked for that width.
+    """
+
+    def __init__(self, quality=PREVIEW_JPEG_QUALITY, max_fps=PREVIEW_MAX_FPS):
+        self.quality = quality
+        self.max_fps = max_fps
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def _state(self, stream_id):
+        with self._lock:
+            state = self._streams.get(stream_id)
+            if state is None:
+                state = self._streams[stream_id] = _PreviewState()
+            return state
+
+    def update_frame(self, stream_id, frame):
+        """Offer a captured frame; cheap no-op when nobody is watching."""
+        state = self._streams.get(stream_id)
+        if state is None or state.viewers == 0:
+            return
+        now = time.monotonic()
+        if now - state.captured_at < 1.0 / self.max_fps:
+            return
+        copy = frame.copy()
+        with state.cond:
+            state.frame = copy
+            state.captured_at = now
+            state.seq += 1
+            state.cond.notify_all()
+
+    def update_detections(self, stream_id, detections):
+        """Replace the boxes drawn on subsequent preview frames."""
+        state = self._state(stream_id)
+        with state.cond:
+            state.detections = [(d["object"], d["confidence"], d["bbox"]) for d in detections]
+
+    def remove(self, stream_id):
+        with self._lock:
+            state = self._streams.pop(stream_id, None)
+        if state is not None:
+            with state.cond:
+                state.frame = None
+                state.seq += 1
+                state.cond.notify_all()
+
+    @staticmethod
+    def normalise_width(width):
+        """Snap requested widths to a few sizes so viewers share encodings."""
+        width = min(max(int(width), PREVIEW_MIN_WIDTH), PREVIEW_MAX_WIDTH)
+        return max(PREVIEW_MIN_WIDTH, round(width / PREVIEW_WIDTH_STEP) * PREVIEW_WIDTH_STEP)
+
+    def _encode(self, state, width):
+        """
+        Return (seq, JPEG) for the state's current frame at `width`.
+
+        Only the references are taken under state.cond; stored frames are
+        never modified, so resizing, drawing and encoding run outside it and
+        never hold up the capture thread. A lock per width keeps viewers of
+        the same size from encoding one frame twice.
+        """
+        with state.cond:
+            encoder = state.encoders.setdefault(width, threading.Lock())
+        with encoder:
+            with state.cond:
+                frame, seq, detections = state.frame, state.seq, state.detections
+                cached = state.encoded.get(width)
+            if frame is None:
+                return seq, None
+            if cached is not None and cached[0] == seq:
+                return seq, cached[1]
+            jpeg = self._render(frame, detections, width)
+            with state.cond:
+                state.encoded[width] = (seq, jpeg)
+            return seq, jpeg
+
+    def _render(self, frame, detections, width):
+        """Resize, draw the boxes and JPEG-encode one frame."""
+        height, src_width = frame.shape[:2]
+        scale = width / src_width
+        if scale != 1.0:
+            frame = cv2.resize(frame, (width, int(height * scale)), interpolation=cv2.INTER_AREA)
+        else:
+            frame = frame.copy()
+
+        for name, confidence, (x1, y1, x2, y2) in detections:
+            x1, y1, x2, y2 = (int(v * scale) for v in (x1, y1, x2, y2))
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+            cv2.putText(frame, f"{name} {confidence:.2f}", (x1, max(y1 - 10, 0)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+
+        ok, buf = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        return buf.tobytes() if ok else None
+
+    def frames(self, stream_id, width=PREVIEW_DEFAULT_WIDTH, fps=PREVIEW_DEFAULT_FPS):
+        """
+        Generator of multipart MJPEG chunks for one viewer.
+
+        Args:
+            stream_id (str): Stream identifier
+            width (int): Requested preview width (snapped to PREVIEW_WIDTH_STEP)
+            fps (float): Maximum frames per second sent to this viewer
+        """
+        width = self.normalise_width(width)
+        interval = 1.0 / min(max(float(fps), 0.1), self.max_fps)
+        state = self._state(stream_id)
+        with state.cond:
+            state.viewers += 1
+        try:
+            last_seq = -1
+            while True:
+                with state.cond:
+                    if state.seq == last_seq:
+                        state.cond.wait(timeout=5)
+                    if self._streams.get(stream_id) is not state:
+                        return
+                    if state.frame is None or state.seq == last_seq:
+                        continue
+                last_seq, jpeg = self._encode(state, width)
+                if jpeg:
+                    yield (b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
+                           + str(len(jpeg)).encode() + b"\r\n\r\n" + jpeg + b"\r\n")
+                time.sleep(interval)
+        finally:
+            with state.cond:
+                state.viewers -= 1
+
+    def _encode_latest(self, state, width, last_seq):
+        """Encode the state's frame if it is newer than last_seq; returns (seq, jpeg or None)."""
+        with state.cond:
+            if state.frame is None or state.seq == last_seq:
+                return last_seq, None
+        return self._encode(state, width)
+
+    async def async_frames(self, stream_id, width=PREVIEW_DEFAULT_WIDTH, fps=PREVIEW_DEFAULT_FPS, executor=None):
+        """
+        Async generator counterpart of frames() for the ASGI server.
+
+        Polls for a new frame once per viewer interval instead of parking a
+        thread on the condition; resizing and JPEG encoding run on `executor`.
+        """
+        width = self.normalise_width(width)
+        interval = 1.0 / min(max(float(fps), 0.1), self.max_fps)
+        loop = asyncio.get_running_loop()
+        state = self._state(stream_id)
+        with state.cond:
+            state.viewers += 1
+        try:
+            last_seq = -1
+            while self._streams.get(stream_id) is state:
+                last_seq, jpeg = await loop.run_in_executor(executor, self._encode_latest, state, width, last_seq)
+                if jpeg:
+                    yield (b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
+                           + str(len(jpeg)).encode() + b"\r\n\r\n" + jpeg + b"\r\n")
+                await asyncio.sleep(interval)
+        finally:
+            with state.cond:
+                state.viewers -= 1
+
+    def stats(self):
+        """Return viewer counts per stream for health reporting."""
+        with self._lock:
+            return {stream_id: state.viewers for stream_id, state in self._streams.items() if state.viewers}
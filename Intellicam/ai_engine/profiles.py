@@ -0,0 +1,330 @@
+"""
+Pipeline profiles for Intellicam AI Engine.
+Named bundles of per-stream inference settings (threshold, classes, sample
+rate, input size, gating and region of interest) that can be edited while
+streams are running, so accuracy can be traded for throughput per camera.
+"""
+
+import threading
+
+import cv2
+
+from config import (
+    DETECTION_THRESHOLD, TARGET_CLASSES, FRAME_INTERVAL, PIPELINE_PROFILES,
+    DEFAULT_PIPELINE_PROFILE, MOTION_GATE_WIDTH, MOTION_GATE_MIN_AREA, PREPROCESS_IMGSZ
+)
+
+GATING_MODES = ("none", "motion", "cascade")
+PROFILE_FIELDS = ("threshold", "target_classes", "frame_interval", "imgsz", "gating", "roi")
+
+
+class PipelineProfile:
+    """
+    Immutable set of pipeline settings.
+
+    Edits create a new instance, so a reader that fetched a profile for a
+    frame keeps a consistent view even while the profile is being changed.
+    """
+
+    def __init__(self, name, threshold=DETECTION_THRESHOLD, target_classes=TARGET_CLASSES,
+                 frame_interval=FRAME_INTERVAL, imgsz=None, gating="none", roi=None):
+        """
+        Args:
+            name (str): Profile name
+            threshold (float): Detection confidence threshold
+            target_classes (iterable): Class names that count as threats
+            frame_interval (float): Target seconds between inferences
+            imgsz (int): Inference size; None uses the model's default
+            gating (str): "none", "motion" (skip frames without motion) or
+                "cascade" (low-resolution prefilter before full inference)
+            roi (list): [x1, y1, x2, y2] as fractions of the frame; only this
+                region is sent to the detector. None uses the whole frame
+
+        Raises:
+            ValueError: If a setting is out of range
+        """
+        threshold = float(threshold)
+        frame_interval = float(frame_interval)
+        if not 0 < threshold < 1:
+            raise ValueError("threshold must be between 0 and 1")
+        if frame_interval <= 0:
+            raise ValueError("frame_interval must be positive")
+        if isinstance(target_classes, str) or not target_classes:
+            raise ValueError("target_classes must be a non-empty list of class names")
+        if imgsz is not None:
+            imgsz = int(imgsz)
+            if imgsz < 32 or imgsz % 32:
+                raise ValueError("imgsz must be a multiple of 32")
+        if gating not in GATING_MODES:
+            raise ValueError(f"gating must be one of {', '.join(GATING_MODES)}")
+        if roi is not None:
+            roi = [float(v) for v in roi]
+            if len(roi) != 4 or not (0 <= roi[0] < roi[2] <= 1 and 0 <= roi[1] < roi[3] <= 1):
+                raise ValueError("roi must be [x1, y1, x2, y2] with 0 <= x1 < x2 <= 1 and 0 <= y1 < y2 <= 1")
+
+        self.name = name
+        self.threshold = threshold
+        self.target_classes = frozenset(target_classes)
+        self.frame_interval = frame_interval
+        self.imgsz = imgsz
+        self.gating = gating
+        self.roi = roi
+
+    def replace(self, name=None, **changes):
+        """Return a copy with some settings changed."""
+        unknown = set(changes) - set(PROFILE_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown profile settings: {', '.join(sorted(unknown))}")
+        settings = {field: getattr(self, field) for field in PROFILE_FIELDS}
+        settings.update(changes)
+        return PipelineProfile(name or self.name, **settings)
+
+    def predict_args(self):
+        """Keyword arguments for an ultralytics model call or Preprocessor.run()."""
+        args = {"conf": self.threshold, "verbose": False}
+        if self.imgsz:
+            args["imgsz"] = self.imgsz
+        return args
+
+    def crop(self, frame):
+        """
+        Cut the region of interest out of a frame.
+
+        Returns:
+            tuple: (frame or view of the ROI, (x offset, y offset))
+        """
+        if self.roi is None:
+            return frame, (0, 0)
+        height, width = frame.shape[:2]
+        x1, y1 = int(self.roi[0] * width), int(self.roi[1] * height)
+        x2, y2 = max(x1 + 1, int(self.roi[2] * width)), max(y1 + 1, int(self.roi[3] * height))
+        return frame[y1:y2, x1:x2], (x1, y1)
+
+    def accepts(self, class_name, confidence, bbox, width, height):
+        """
+        True if a detection (bbox in frame pixels) passes this profile's
+        threshold, class list and region of interest.
+        """
+        if confidence < self.threshold or class_name not in self.target_classes:
+            return False
+        if self.roi is None:
+            return True
+        x, y = (bbox[0] + bbox[2]) / 2 / width, (bbox[1] + bbox[3]) / 2 / height
+        return self.roi[0] <= x <= self.roi[2] and self.roi[1] <= y <= self.roi[3]
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "threshold": self.threshold,
+            "target_classes": sorted(self.target_classes),
+            "frame_interval": self.frame_interval,
+            "imgsz": self.imgsz,
+            "gating": self.gating,
+            "roi": self.roi,
+        }
+
+
+def merge_profiles(name, members):
+    """
+    One profile whose results cover every member's, for streams sharing a camera.
+
+    Uses the lowest threshold, every target class, the shortest interval,
+    the largest input size and the bounding box of the ROIs; gating is kept
+    only if all members use the same mode. Members then filter the shared
+    results with accepts(). A single member is returned unchanged.
+    """
+    members = list(members)
+    if len(members) == 1:
+        return members[0]
+    rois = [p.roi for p in members]
+    roi = None if any(r is None for r in rois) else [
+        min(r[0] for r in rois), min(r[1] for r in rois), max(r[2] for r in rois), max(r[3] for r in rois)]
+    sizes = [p.imgsz for p in members]
+    imgsz = None if all(size is None for size in sizes) else max(size or PREPROCESS_IMGSZ for size in sizes)
+    gatings = {p.gating for p in members}
+    return PipelineProfile(
+        name,
+        threshold=min(p.threshold for p in members),
+        target_classes=frozenset().union(*(p.target_classes for p in members)),
+        frame_interval=min(p.frame_interval for p in members),
+        imgsz=imgsz,
+        gating=gatings.pop() if len(gatings) == 1 else "none",
+        roi=roi,
+    )
+
+
+class ProfileRegistry:
+    """
+    Named profiles and the profile each stream currently uses.
+
+    Every stream maps to one resolved PipelineProfile object. Updating a
+    profile builds new objects and swaps them in with single assignments, so
+    the change lands between frames without restarting any stream.
+    """
+
+    def __init__(self, definitions=PIPELINE_PROFILES, default=DEFAULT_PIPELINE_PROFILE):
+        """
+        Args:
+            definitions (dict): name -> settings overriding the config defaults
+            default (str): Profile used by streams that don't name one
+        """
+        self.default = default
+        self._profiles = {}
+        self._assignments = {}  # stream_id -> (profile name, per-stream overrides)
+        self._resolved = {}  # stream_id -> PipelineProfile
+        self._listeners = []
+        self._lock = threading.Lock()
+        base = PipelineProfile(default)
+        self._profiles[default] = base.replace(**definitions.get(default, {}))
+        for name, settings in definitions.items():
+            if name != default:
+                self._profiles[name] = base.replace(name=name, **settings)
+
+    def on_change(self, callback):
+        """Call callback(stream_id, profile) whenever a stream's profile changes."""
+        self._listeners.append(callback)
+
+    def _resolve(self, stream_id):
+        # Caller holds the lock
+        name, overrides = self._assignments[stream_id]
+        profile = self._profiles[name]
+        if overrides:
+            profile = profile.replace(**overrides)
+        self._resolved[stream_id] = profile
+        return profile
+
+    def _notify(self, changed):
+        for stream_id, profile in changed:
+            for callback in self._listeners:
+                try:
+                    callback(stream_id, profile)
+                except Exception as e:
+                    print(f"Profile change handler error for {stream_id}: {e}")
+
+    def get(self, name):
+        return self._profiles.get(name)
+
+    def put(self, name, settings):
+        """
+        Create or update a profile; streams using it switch on their next frame.
+
+        Args:
+            name (str): Profile name
+            settings (dict): Settings to change; new profiles start from the default
+
+        Returns:
+            PipelineProfile: The new profile
+
+        Raises:
+            ValueError: If a setting is invalid
+        """
+        with self._lock:
+            base = self._profiles.get(name) or self._profiles[self.default]
+            profile = base.replace(name=name, **settings)
+            self._profiles[name] = profile
+            changed = [(stream_id, self._resolve(stream_id))
+                       for stream_id, (assigned, _) in self._assignments.items() if assigned == name]
+        self._notify(changed)
+        return profile
+
+    def delete(self, name):
+        """
+        Remove a profile.
+
+        Raises:
+            KeyError: If there is no such profile
+            ValueError: For the default profile or one still used by a stream
+        """
+        with self._lock:
+            if name not in self._profiles:
+                raise KeyError(name)
+            if name == self.default:
+                raise ValueError("The default profile cannot be deleted")
+            users = [stream_id for stream_id, (assigned, _) in self._assignments.items() if assigned == name]
+            if users:
+                raise ValueError(f"Profile is in use by: {', '.join(users)}")
+            del self._profiles[name]
+
+    def assign(self, stream_id, name=None, overrides=None):
+        """
+        Point a stream at a profile, optionally with per-stream overrides.
+
+        Returns:
+            PipelineProfile: The stream's resolved profile
+
+        Raises:
+            KeyError: If the profile does not exist
+            ValueError: If an override is invalid
+        """
+        name = name or self.default
+        with self._lock:
+            if name not in self._profiles:
+                raise KeyError(name)
+            previous = self._assignments.get(stream_id)
+            self._assignments[stream_id] = (name, dict(overrides or {}))
+            try:
+                profile = self._resolve(stream_id)
+            except ValueError:
+                if previous is None:
+                    del self._assignments[stream_id]
+                else:
+                    self._assignments[stream_id] = previous
+                raise
+        self._notify([(stream_id, profile)])
+        return profile
+
+    def release(self, stream_id):
+        with self._lock:
+            self._assignments.pop(stream_id, None)
+            self._resolved.pop(stream_id, None)
+
+    def for_stream(self, stream_id):
+        """Profile a stream's next frame should use (the default for unknown streams)."""
+        profile = self._resolved.get(stream_id)
+        return profile if profile is not None else self._profiles[self.default]
+
+    def stats(self):
+        """Profiles and the streams using each, for the API."""
+        with self._lock:
+            return {
+                "default": self.default,
+                "profiles": {name: p.to_dict() for name, p in self._profiles.items()},
+                "streams": {stream_id: {"profile": name, "overrides": overrides}
+                            for stream_id, (name, overrides) in self._assignments.items()},
+            }
+
+
+class MotionGate:
+    """
+    Cheap frame-difference check used by the "motion" gating mode.
+
+    Frames are shrunk to a small grayscale thumbnail and compared with the
+    previous checked frame; only a changed area above `min_area` (fraction
+    of the frame) lets the frame through to the detector.
+    """
+
+    def __init__(self, width=MOTION_GATE_WIDTH, min_area=MOTION_GATE_MIN_AREA):
+        self.width = width
+        self.min_area = min_area
+        self.previous = None
+        self.passed = 0
+        self.gated = 0
+
+    def check(self, frame):
+        """Return True if the frame differs enough from the last checked one."""
+        height, width = frame.shape[:2]
+        small = cv2.resize(frame, (self.width, max(1, int(height * self.width / width))),
+                           interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        previous, self.previous = self.previous, gray
+        if previous is None or previous.shape != gray.shape:
+            self.passed += 1
+            return True
+
+        diff = cv2.threshold(cv2.absdiff(previous, gray), 25, 255, cv2.THRESH_BINARY)[1]
+        moved = cv2.countNonZero(diff) / diff.size >= self.min_area
+        if moved:
+            self.passed += 1
+        else:
+            self.gated += 1
+        return moved
@@ -0,0 +1,137 @@
+"""
+Frame quality gate for Intellicam AI Engine.
+Cheap per-stream checks on a small grayscale thumbnail that keep dark,
+washed-out, blurry and duplicate frames away from the detector, and notice
+feeds that have frozen on one image so the stream can be reconnected.
+"""
+
+import time
+from collections import Counter
+
+import cv2
+
+from config import (
+    QUALITY_GATE_ENABLED, QUALITY_GATE_WIDTH, QUALITY_MIN_BRIGHTNESS, QUALITY_MAX_BRIGHTNESS,
+    QUALITY_MIN_SHARPNESS, QUALITY_DUPLICATE_DIFF, QUALITY_DUPLICATE_REFRESH, QUALITY_STALE_SECONDS
+)
+
+
+class FrameQualityGate:
+    """
+    Decides whether a captured frame is worth running inference on.
+
+    Each check works on one downscaled grayscale copy (under a millisecond
+    for a 720p frame). Near-duplicates of the last accepted frame are
+    skipped, but one is let through every QUALITY_DUPLICATE_REFRESH seconds
+    so tracks of objects that stand still stay alive. A feed whose frames
+    have not changed at all for QUALITY_STALE_SECONDS (or that returns no
+    frames) is reported as stale.
+    """
+
+    def __init__(self, width=QUALITY_GATE_WIDTH, min_brightness=QUALITY_MIN_BRIGHTNESS,
+                 max_brightness=QUALITY_MAX_BRIGHTNESS, min_sharpness=QUALITY_MIN_SHARPNESS,
+                 duplicate_diff=QUALITY_DUPLICATE_DIFF, duplicate_refresh=QUALITY_DUPLICATE_REFRESH,
+                 stale_seconds=QUALITY_STALE_SECONDS, enabled=QUALITY_GATE_ENABLED):
+        """
+        Args:
+            width (int): Thumbnail width the checks run on
+            min_brightness (float): Mean gray level below which a frame is too dark
+            max_brightness (float): Mean gray level above which a frame is washed out
+            min_sharpness (float): Laplacian variance below which a frame is blurry
+            duplicate_diff (float): Mean absolute difference (gray levels) to the
+                last accepted frame at or below which a frame is a duplicate
+            duplicate_refresh (float): Seconds after which a duplicate is
+                accepted anyway
+            stale_seconds (float): Seconds without any changed frame before
+                the feed counts as frozen
+            enabled (bool): When False every frame passes (staleness is still tracked)
+        """
+        self.width = width
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.min_sharpness = min_sharpness
+        self.duplicate_diff = duplicate_diff
+        self.duplicate_refresh = duplicate_refresh
+        self.stale_seconds = stale_seconds
+        self.enabled = enabled
+        self.passed = 0
+        self.rejected = Counter()
+        self.reconnects = 0
+        self.reset()
+
+    def reset(self, now=None):
+        """Forget previous frames, e.g. after the capture was reopened."""
+        now = time.monotonic() if now is None else now
+        self._previous = None  # Thumbnail of the last checked frame
+        self._reference = None  # Thumbnail of the last accepted frame
+        self._accepted_at = 0.0
+        self._changed_at = now
+        self.last_brightness = None
+        self.last_sharpness = None
+
+    def _thumbnail(self, frame):
+        height, width = frame.shape[:2]
+        small = cv2.resize(frame, (self.width, max(1, int(height * self.width / width))),
+                           interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+
+    def check(self, frame, now=None):
+        """
+        Run the quality checks on a frame.
+
+        Returns:
+            str: None if the frame should be inferred, otherwise the reason it
+                was rejected ("frozen", "duplicate", "dark", "bright" or "blurry")
+        """
+        now = time.monotonic() if now is None else now
+        gray = self._thumbnail(frame)
+        previous, self._previous = self._previous, gray
+
+        # Byte-identical thumbnails mean the source is repeating one image
+        if previous is not None and previous.shape == gray.shape and not cv2.norm(previous, gray, cv2.NORM_INF):
+            reason = "frozen" if self.enabled else None
+        else:
+            self._changed_at = now
+            reason = None
+
+        if reason is None and self.enabled:
+            brightness = self.last_brightness = float(gray.mean())
+            if brightness < self.min_brightness:
+                reason = "dark"
+            elif brightness > self.max_brightness:
+                reason = "bright"
+            else:
+                reference = self._reference
+                if (reference is not None and reference.shape == gray.shape
+                        and now - self._accepted_at < self.duplicate_refresh
+                        and cv2.norm(reference, gray, cv2.NORM_L1) / gray.size <= self.duplicate_diff):
+                    reason = "duplicate"
+                else:
+                    sharpness = self.last_sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+                    if sharpness < self.min_sharpness:
+                        reason = "blurry"
+
+        if reason is None:
+            self._reference = gray
+            self._accepted_at = now
+            self.passed += 1
+        else:
+            self.rejected[reason] += 1
+        return reason
+
+    def is_stale(self, now=None):
+        """True once no changed frame has been seen for stale_seconds."""
+        now = time.monotonic() if now is None else now
+        return now - self._changed_at >= self.stale_seconds
+
+    def stats(self, now=None):
+        now = time.monotonic() if now is None else now
+        return {
+            "passed": self.passed,
+            "rejected": dict(self.rejected),
+            "stale": self.is_stale(now),
+            "seconds_since_change": round(now - self._changed_at, 1),
+            "reconnects": self.reconnects,
+            "brightness": round(self.last_brightness, 1) if self.last_brightness is not None else None,
+            "sharpness": round(self.last_sharpness, 1) if self.last_sharpness is not None else None,
+        }
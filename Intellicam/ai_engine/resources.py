@@ -0,0 +1,256 @@
+"""
+CPU thread budget and core affinity for Intellicam AI Engine.
+Splits the engine's cores between capture/decode and inference so torch's
+intra-op pool, OpenCV's pool and the per-stream threads stop competing for
+the same cores.
+
+Thread pools (torch's OpenMP workers, OpenCV's pool) inherit the affinity
+of the thread that started them and keep it, so every change of split
+re-pins all of the process's threads rather than only the calling one.
+"""
+
+import os
+import threading
+import time
+
+import cv2
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+from config import CPU_CORES, INFERENCE_CORES, RESOURCE_AUTOTUNE, RESOURCE_AUTOTUNE_SECONDS
+
+
+def _parse_cores(spec):
+    """Parse a core list such as "0-3,6" into a sorted list of ints."""
+    cores = set()
+    for part in str(spec).split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            cores.update(range(int(start), int(end) + 1))
+        else:
+            cores.add(int(part))
+    return sorted(cores)
+
+
+def _available_cores():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _set_affinity(cores):
+    # On Linux pid 0 means the calling thread; threads it starts inherit the mask
+    if hasattr(os, "sched_setaffinity") and cores:
+        try:
+            os.sched_setaffinity(0, cores)
+        except OSError as e:
+            print(f"WARNING: Cannot set CPU affinity: {e}")
+
+
+def _thread_ids():
+    """Native IDs of the process's live threads; empty where /proc is unavailable."""
+    try:
+        return [int(tid) for tid in os.listdir("/proc/self/task")]
+    except OSError:
+        return []
+
+
+class ResourceManager:
+    """
+    Owns the split of cores between capture/decode and inference.
+
+    Inference worker threads pin themselves to the inference cores and size
+    torch's intra-op pool to match; capture threads pin themselves to the
+    remaining cores, which also bound OpenCV's internal pool.
+    """
+
+    def __init__(self, cores=None):
+        """
+        Args:
+            cores: Core list or spec ("0-7") the engine may use; defaults to
+                CPU_CORES or every core the process may run on
+        """
+        if cores is None:
+            cores = CPU_CORES
+        self.cores = _parse_cores(cores) if cores else _available_cores()
+        self.inference_cores = []
+        self.capture_cores = []
+        self.benchmarks = []
+        self._interop_set = False
+        self._pinned = {}  # native thread id -> "capture" or "inference"
+        self._lock = threading.Lock()
+
+    def configure(self, inference_count):
+        """
+        Split the cores and apply the thread budgets.
+
+        Args:
+            inference_count (int): Cores reserved for inference workers
+        """
+        total = len(self.cores)
+        inference_count = min(max(1, int(inference_count)), total)
+        previous = set(self.capture_cores), set(self.inference_cores)
+        self.inference_cores = self.cores[:inference_count]
+        # With a single core both sides have to share it
+        self.capture_cores = self.cores[inference_count:] or self.cores[-1:]
+
+        self.repin(*previous)
+        cv2.setNumThreads(len(self.capture_cores))
+        if torch is not None:
+            torch.set_num_threads(len(self.inference_cores))
+            if not self._interop_set:
+                try:
+                    torch.set_num_interop_threads(1)
+                except RuntimeError:
+                    pass  # Only allowed before the first parallel op
+                self._interop_set = True
+
+    def repin(self, previous_capture=(), previous_inference=()):
+        """
+        Move every live thread of the process onto the current split.
+
+        Threads pinned through pin_*_thread keep their side. Other threads
+        are pool workers or general threads: a worker inherited the mask of
+        the side that started it, so threads still on the previous capture
+        or inference cores follow that side, and the rest may use every core.
+
+        Args:
+            previous_capture: Capture cores of the split being replaced
+            previous_inference: Inference cores of the split being replaced
+        """
+        if not hasattr(os, "sched_setaffinity"):
+            return
+        targets = {"capture": set(self.capture_cores), "inference": set(self.inference_cores)}
+        live = _thread_ids()
+        with self._lock:
+            self._pinned = {tid: side for tid, side in self._pinned.items() if tid in live}
+            pinned = dict(self._pinned)
+        for tid in live:
+            try:
+                current = os.sched_getaffinity(tid)
+                side = pinned.get(tid)
+                if side is None and previous_capture and current == set(previous_capture):
+                    side = "capture"
+                elif side is None and previous_inference and current == set(previous_inference):
+                    side = "inference"
+                target = targets[side] if side else set(self.cores)
+                if current != target:
+                    os.sched_setaffinity(tid, target)
+            except OSError:
+                pass  # Thread exited meanwhile
+
+    def _pin(self, side, cores):
+        _set_affinity(cores)
+        with self._lock:
+            self._pinned[threading.get_native_id()] = side
+
+    def pin_inference_thread(self):
+        """Pin the calling thread (and threads it creates) to inference cores."""
+        self._pin("inference", self.inference_cores)
+
+    def pin_capture_thread(self):
+        """Pin the calling thread (and threads it creates) to capture cores."""
+        self._pin("capture", self.capture_cores)
+
+    def default_split(self):
+        """Three quarters of the cores for inference, at least one left for capture."""
+        total = len(self.cores)
+        return max(1, min(total - 1, round(total * 0.75))) if total > 1 else 1
+
+    def candidate_splits(self):
+        total = len(self.cores)
+        if total <= 1:
+            return [1]
+        shares = {max(1, min(total - 1, round(total * f))) for f in (0.5, 0.67, 0.75)}
+        shares.add(total - 1)
+        return sorted(shares)
+
+    def _measure(self, inference_count, infer_fn, decode_fn, duration):
+        self.configure(inference_count)
+        stop = threading.Event()
+        counts = {"decode": 0, "infer": 0}
+        lock = threading.Lock()
+
+        def decode_loop():
+            self.pin_capture_thread()
+            while not stop.is_set():
+                decode_fn()
+                with lock:
+                    counts["decode"] += 1
+
+        def infer_loop():
+            self.pin_inference_thread()
+            while not stop.is_set():
+                counts["infer"] += infer_fn()
+
+        threads = [threading.Thread(target=decode_loop, daemon=True) for _ in self.capture_cores]
+        threads.append(threading.Thread(target=infer_loop, daemon=True))
+        for thread in threads:
+            thread.start()
+        time.sleep(duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        decode_rate = counts["decode"] / duration
+        infer_rate = counts["infer"] / duration
+        # A frame is only useful once it is both decoded and inferred
+        return {
+            "inference_cores": len(self.inference_cores),
+            "capture_cores": len(self.capture_cores),
+            "decode_fps": round(decode_rate, 1),
+            "inference_fps": round(infer_rate, 1),
+            "pipeline_fps": round(min(decode_rate, infer_rate), 1),
+        }
+
+    def autotune(self, infer_fn, decode_fn, duration=RESOURCE_AUTOTUNE_SECONDS):
+        """
+        Benchmark a few splits and keep the one with the best pipeline throughput.
+
+        Args:
+            infer_fn: Callable running one inference batch and returning the
+                number of frames it processed
+            decode_fn: Callable decoding one representative frame
+            duration (float): Seconds to measure each split
+
+        Returns:
+            int: Number of inference cores chosen
+        """
+        self.benchmarks = [self._measure(n, infer_fn, decode_fn, duration) for n in self.candidate_splits()]
+        best = max(self.benchmarks, key=lambda b: b["pipeline_fps"])
+        self.configure(best["inference_cores"])
+        print(f"Resource autotune picked {best['inference_cores']} inference / "
+              f"{best['capture_cores']} capture cores ({best['pipeline_fps']} fps)")
+        return best["inference_cores"]
+
+    def setup(self):
+        """Apply INFERENCE_CORES or the default split; call before any model is loaded."""
+        self.configure(int(INFERENCE_CORES) if INFERENCE_CORES else self.default_split())
+
+    def maybe_autotune(self, infer_fn, decode_fn):
+        """
+        Autotune when RESOURCE_AUTOTUNE is on and INFERENCE_CORES is unset.
+
+        Meant for server startup, once the model is loaded and warmed up
+        under the split setup() applied.
+        """
+        if (RESOURCE_AUTOTUNE and not INFERENCE_CORES and RESOURCE_AUTOTUNE_SECONDS > 0
+                and len(self.candidate_splits()) > 1):
+            self.autotune(infer_fn, decode_fn)
+
+    def stats(self):
+        """Return the current split for health reporting."""
+        return {
+            "cores": self.cores,
+            "inference_cores": self.inference_cores,
+            "capture_cores": self.capture_cores,
+            "torch_threads": torch.get_num_threads() if torch is not None else None,
+            "opencv_threads": cv2.getNumThreads(),
+            "benchmarks": self.benchmarks,
+        }
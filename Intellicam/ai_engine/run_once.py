@@ -2,22 +2,23 @@
 One-shot test runner for Intellicam inference.
 Processes a few frames from the given stream and exits.
 """
-import cv2, time, json, requests, os, sys
+import cv2, time, requests, os, sys
 from datetime import datetime
 try:
     from ultralytics import YOLO
 except Exception as e:
     print('Failed to import ultralytics:', e)
     sys.exit(1)
+from journal import DetectionJournal
 
 STREAM = 'http://10.187.217.1:8080/video'
 DETECTION_THRESHOLD = 0.5
 BACKEND_URL = 'http://localhost:5000/api/alert'
 TARGET_CLASSES = {"knife", "scissors", "gun"}
 FRAME_DIR = os.path.join(os.path.dirname(__file__), 'frames')
-LOG_FILE = os.path.join(os.path.dirname(__file__), '..', '..', 'detections.log')
 
 os.makedirs(FRAME_DIR, exist_ok=True)
+journal = DetectionJournal(writer="run_once").start()
 
 print('Loading YOLOv8n...')
 model = YOLO('yolov8n.pt')
@@ -86,13 +87,8 @@ while processed < frames_to_process:
             'timestamp': datetime.now().isoformat(),
             'frame_id': frame_name
         }
-        # append to log
-        try:
-            with open(LOG_FILE,'a',encoding='utf-8') as f:
-                f.write(json.dumps(payload)+"\n")
-            print('Logged detection to', LOG_FILE)
-        except Exception as e:
-            print('Failed to write log:', e)
+        # record in the detection journal (written in the background)
+        journal.write(dict(payload, stream_id=STREAM, bbox=det['bbox']))
 
         # try POST once, retry once
         success = False
@@ -110,4 +106,5 @@ while processed < frames_to_process:
             print('Backend not reachable; continuing')
 
 cap.release()
+journal.close()
 print('Done processing')
@@ -0,0 +1,269 @@
+"""
+Deadline-aware inference scheduler for Intellicam AI Engine.
+Serialises model access across all camera streams so that high-priority
+streams are always served first when the engine is overloaded.
+"""
+
+import threading
+import time
+
+
+class _StreamSlot:
+    """Scheduling state for a single registered stream."""
+
+    def __init__(self, stream_id, interval, priority, on_result):
+        self.stream_id = stream_id
+        self.interval = interval
+        self.priority = priority
+        self.on_result = on_result
+        self.deadline = time.monotonic()
+        self.pending = None  # (frame, submitted_at, context)
+        self.served = 0
+        self.skipped = 0
+        self.superseded = 0
+        self.last_lateness = 0.0
+
+
+class InferenceScheduler:
+    """
+    Central scheduler that owns the inference loop for every stream.
+
+    Each stream has a deadline derived from its target interval. Capture
+    threads submit their latest frame; worker threads repeatedly pick the
+    highest-priority stream whose frame is most overdue and run inference
+    on it. When a lower-priority stream falls more than one interval behind
+    while higher-priority work is waiting, its frame is skipped instead of
+    delaying everyone else.
+    """
+
+    def __init__(self, infer_fn, batch_size=1, workers=1, thread_init=None, tracer=None):
+        """
+        Args:
+            infer_fn: Callable taking a list of frames and the matching list
+                of stream IDs, returning a list of results in the same order
+            batch_size (int): Maximum number of frames per inference call
+            workers (int): Number of inference worker threads
+            thread_init: Optional callable run at the start of each worker
+                thread (e.g. to pin it to inference cores)
+            tracer: Optional StageTracer; receives each frame's "queue" wait
+                and "batch" inference time
+        """
+        self.infer_fn = infer_fn
+        self.batch_size = max(1, int(batch_size))
+        self.workers = max(1, int(workers))
+        self.thread_init = thread_init
+        self.tracer = tracer
+        self._slots = {}
+        self._cond = threading.Condition()
+        self._threads = []
+        self._running = False
+        self._inflight = 0
+        self._skipped_total = 0
+        self._served_total = 0
+        self._last_batch_latency = 0.0
+        self._frame_latency = 0.0  # EWMA of per-frame inference seconds
+
+    def start(self):
+        """Start the inference worker threads."""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"inference-worker-{i}")
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Stop the worker threads after their current batch."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+    def register(self, stream_id, interval, priority, on_result):
+        """
+        Register a stream with the scheduler.
+
+        Args:
+            stream_id (str): Unique stream identifier
+            interval (float): Target seconds between inferences
+            priority (int): Higher values are served first
+            on_result: Callable(frame, result, context) invoked after inference,
+                with the context the frame was submitted with
+        """
+        with self._cond:
+            self._slots[stream_id] = _StreamSlot(stream_id, interval, priority, on_result)
+
+    def set_interval(self, stream_id, interval):
+        """Change a registered stream's target interval from its next deadline on."""
+        with self._cond:
+            slot = self._slots.get(stream_id)
+            if slot is not None:
+                slot.deadline = min(slot.deadline, time.monotonic() + interval)
+                slot.interval = interval
+
+    def set_priority(self, stream_id, priority):
+        """Change a registered stream's scheduling priority."""
+        with self._cond:
+            slot = self._slots.get(stream_id)
+            if slot is not None:
+                slot.priority = priority
+
+    def unregister(self, stream_id):
+        """Remove a stream and drop any frame it still has pending."""
+        with self._cond:
+            self._slots.pop(stream_id, None)
+
+    def is_due(self, stream_id):
+        """Return True if the stream's next frame would be accepted now."""
+        slot = self._slots.get(stream_id)
+        return slot is not None and time.monotonic() >= slot.deadline
+
+    def submit(self, stream_id, frame, context=None):
+        """
+        Offer the latest frame of a stream for inference.
+
+        Frames offered before the stream's deadline are ignored. A frame that
+        is still waiting when a newer one arrives is replaced.
+
+        Args:
+            stream_id (str): Registered stream identifier
+            frame: Frame to infer
+            context: Opaque value handed back to on_result with this frame
+                (e.g. its trace ID and capture time)
+
+        Returns:
+            bool: True if the frame was queued
+        """
+        now = time.monotonic()
+        with self._cond:
+            slot = self._slots.get(stream_id)
+            if slot is None or now < slot.deadline:
+                return False
+            if slot.pending is not None:
+                slot.superseded += 1
+            slot.pending = (frame, now, context)
+            self._cond.notify()
+            return True
+
+    def queue_depth(self):
+        """Number of frames waiting for or undergoing inference."""
+        with self._cond:
+            return self._inflight + sum(1 for s in self._slots.values() if s.pending is not None)
+
+    def frame_latency(self):
+        """Smoothed inference seconds per frame (0 until the first batch)."""
+        return self._frame_latency
+
+    def utilization(self, extra_interval=None):
+        """
+        Estimate the fraction of worker time the registered streams demand.
+
+        Args:
+            extra_interval (float): Interval of a stream about to be added
+
+        Returns:
+            float: Demanded frames per second times per-frame latency, per worker
+        """
+        with self._cond:
+            demand = sum(1.0 / s.interval for s in self._slots.values() if s.interval > 0)
+        if extra_interval:
+            demand += 1.0 / extra_interval
+        return demand * self._frame_latency / self.workers
+
+    def _next_batch(self):
+        """Pick the next batch of slots, skipping overdue low-priority frames."""
+        now = time.monotonic()
+        ready = [s for s in self._slots.values() if s.pending is not None]
+        if not ready:
+            return []
+
+        # Highest priority first, then most overdue
+        ready.sort(key=lambda s: (-s.priority, s.deadline))
+        batch = ready[:self.batch_size]
+        top_priority = batch[0].priority
+
+        for slot in ready[self.batch_size:]:
+            if slot.priority < top_priority and now - slot.deadline > slot.interval:
+                slot.pending = None
+                slot.skipped += 1
+                slot.deadline = now + slot.interval
+                self._skipped_total += 1
+
+        for slot in batch:
+            slot.last_lateness = max(0.0, now - slot.deadline)
+            slot.deadline = max(slot.deadline + slot.interval, now)
+        return batch
+
+    def _worker(self):
+        if self.thread_init is not None:
+            self.thread_init()
+        while True:
+            with self._cond:
+                while self._running and not any(s.pending is not None for s in self._slots.values()):
+                    self._cond.wait(timeout=1.0)
+                if not self._running:
+                    return
+                batch = self._next_batch()
+                jobs = [(slot, *slot.pending) for slot in batch]
+                for slot in batch:
+                    slot.pending = None
+                self._inflight += len(jobs)
+
+            if not jobs:
+                continue
+
+            started = time.monotonic()
+            try:
+                results = self.infer_fn([frame for _, frame, _, _ in jobs], [slot.stream_id for slot, _, _, _ in jobs])
+            except Exception as e:
+                print(f"Scheduler inference error: {e}")
+                results = [None] * len(jobs)
+            latency = time.monotonic() - started
+
+            with self._cond:
+                self._inflight -= len(jobs)
+                self._served_total += len(jobs)
+                self._last_batch_latency = latency
+                per_frame = latency / len(jobs)
+                self._frame_latency = per_frame if not self._frame_latency else 0.8 * self._frame_latency + 0.2 * per_frame
+                for slot, _, _, _ in jobs:
+                    slot.served += 1
+
+            if self.tracer is not None:
+                for slot, _, submitted_at, _ in jobs:
+                    self.tracer.record(slot.stream_id, "queue", started - submitted_at)
+                    self.tracer.record(slot.stream_id, "batch", latency)
+
+            for (slot, frame, _, context), result in zip(jobs, results):
+                if result is None:
+                    continue
+                try:
+                    slot.on_result(frame, result, context)
+                except Exception as e:
+                    print(f"Result handler error for {slot.stream_id}: {e}")
+
+    def stats(self):
+        """Return scheduler counters for health reporting."""
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "batch_size": self.batch_size,
+                "queue_depth": self._inflight + sum(1 for s in self._slots.values() if s.pending is not None),
+                "served_total": self._served_total,
+                "skipped_total": self._skipped_total,
+                "last_batch_latency_ms": round(self._last_batch_latency * 1000, 1),
+                "frame_latency_ms": round(self._frame_latency * 1000, 1),
+                "streams": {
+                    s.stream_id: {
+                        "priority": s.priority,
+                        "interval": s.interval,
+                        "served": s.served,
+                        "skipped": s.skipped,
+                        "superseded": s.superseded,
+                        "last_lateness_ms": round(s.last_lateness * 1000, 1),
+                    }
+                    for s in self._slots.values()
+                },
+            }
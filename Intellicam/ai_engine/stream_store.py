@@ -0,0 +1,147 @@
+"""
+Persisted stream registry for Intellicam AI Engine.
+Keeps the definition of every started stream in a small JSON file, so a
+restarted engine can bring its cameras back on its own, and resumes them
+one at a time after boot instead of reconnecting everything at once.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime
+
+from config import STREAM_STORE_PATH, STREAM_RESUME_DELAY, STREAM_RESUME_INTERVAL, STREAM_RESUME_JITTER
+
+
+class StreamStore:
+    """
+    stream_id -> stream definition, rewritten atomically on every change.
+
+    Definitions stay until the stream is stopped through the API, so a
+    camera that is offline when the engine boots is retried on the next
+    restart rather than forgotten.
+    """
+
+    def __init__(self, path=STREAM_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._streams = self._read()
+
+    def _read(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"Stream store {self.path} unreadable, starting empty: {e}")
+            return {}
+
+    def _write(self):
+        # Caller holds the lock
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(self._streams, f, indent=2)
+        os.replace(f"{self.path}.tmp", self.path)
+
+    def save(self, stream_id, definition):
+        """
+        Persist a stream definition.
+
+        Args:
+            stream_id (str): Stream identifier
+            definition (dict): stream_url, priority, profile and overrides
+        """
+        with self._lock:
+            self._streams[stream_id] = dict(definition, saved_at=datetime.now().isoformat())
+            self._write()
+
+    def update(self, stream_id, **changes):
+        """Change fields of a stored definition; unknown streams are ignored."""
+        with self._lock:
+            if stream_id in self._streams:
+                self._streams[stream_id].update(changes)
+                self._write()
+
+    def remove(self, stream_id):
+        with self._lock:
+            if self._streams.pop(stream_id, None) is not None:
+                self._write()
+
+    def all(self):
+        with self._lock:
+            return {stream_id: dict(definition) for stream_id, definition in self._streams.items()}
+
+
+class StreamResumer:
+    """
+    Restarts stored streams after boot, highest priority first.
+
+    Streams are started one at a time, STREAM_RESUME_INTERVAL seconds apart
+    (plus jitter), after an initial STREAM_RESUME_DELAY that lets the model
+    warm up; this spreads camera connects and first inferences out instead
+    of hitting every camera and the model at the same instant.
+    """
+
+    def __init__(self, store, start_fn, delay=STREAM_RESUME_DELAY, interval=STREAM_RESUME_INTERVAL,
+                 jitter=STREAM_RESUME_JITTER):
+        """
+        Args:
+            store (StreamStore): Definitions to resume
+            start_fn: Callable(stream_id, definition) -> (started, message)
+            delay (float): Seconds before the first stream is started
+            interval (float): Seconds between consecutive starts
+            jitter (float): Up to this many random seconds added to each gap
+        """
+        self.store = store
+        self.start_fn = start_fn
+        self.delay = delay
+        self.interval = interval
+        self.jitter = jitter
+        self._status = {}
+        self._lock = threading.Lock()
+
+    def _set(self, stream_id, status, message=None):
+        with self._lock:
+            self._status[stream_id] = {"status": status, "message": message,
+                                       "at": datetime.now().isoformat()}
+
+    def start(self):
+        """Queue every stored stream and resume them in a background thread."""
+        definitions = self.store.all()
+        for stream_id in definitions:
+            self._set(stream_id, "pending")
+        if definitions:
+            print(f"Resuming {len(definitions)} stored stream(s), one every {self.interval}s")
+            thread = threading.Thread(target=self._run, args=(definitions,), name="stream-resume")
+            thread.daemon = True
+            thread.start()
+        return self
+
+    def _run(self, definitions):
+        order = sorted(definitions.items(), key=lambda item: -int(item[1].get("priority", 0)))
+        time.sleep(self.delay)
+        for index, (stream_id, definition) in enumerate(order):
+            if index:
+                time.sleep(self.interval + random.uniform(0, self.jitter))
+            try:
+                started, message = self.start_fn(stream_id, definition)
+            except Exception as e:
+                started, message = False, str(e)
+            self._set(stream_id, "resumed" if started else "failed", message)
+            print(f"Stream {stream_id} {'resumed' if started else 'not resumed'}"
+                  + (f": {message}" if message else ""))
+
+    def status(self):
+        """Which stored streams were resumed, are still waiting, or failed."""
+        with self._lock:
+            streams = {stream_id: dict(entry) for stream_id, entry in self._status.items()}
+        counts = {"resumed": 0, "pending": 0, "failed": 0}
+        for entry in streams.values():
+            counts[entry["status"]] += 1
+        return dict(counts, streams=streams)
@@ -0,0 +1,102 @@
+"""
+Numerical parity tests for the CPU inference path (cpu_inference.py).
+
+Each optimisation is checked on its own against the stock ultralytics path
+on the same fixed frames (ultralytics' bundled sample images, letterboxed by
+the Preprocessor exactly as in serving):
+
+    pytest test_cpu_inference.py
+
+Needs torch, ultralytics and the model weights (MODEL_PATH); skipped otherwise.
+"""
+
+import os
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("ultralytics")
+from ultralytics import YOLO
+
+from config import MODEL_PATH, DETECTION_THRESHOLD, CPU_PARITY_CONF_TOL, CPU_PARITY_BF16_CONF_TOL
+from cpu_inference import CPUInferenceModel, fuse_model, compare_detections, sample_frames
+from preprocess import Preprocessor
+
+BATCH_SIZE = 2
+IMGSZ = 640
+PREDICT_ARGS = {"conf": DETECTION_THRESHOLD, "verbose": False}
+
+
+def fresh_model():
+    """A separately loaded model, so no test sees another's fusing or layout changes."""
+    return YOLO(MODEL_PATH)
+
+
+@pytest.fixture(scope="module")
+def stock():
+    if not os.path.exists(MODEL_PATH):
+        pytest.skip(f"model weights {MODEL_PATH} not found")
+    return fresh_model()
+
+
+@pytest.fixture(scope="module")
+def batch():
+    frames = sample_frames(BATCH_SIZE)
+    tensor, _ = Preprocessor(imgsz=IMGSZ, capacity=BATCH_SIZE, enabled=True).prepare(frames)
+    return torch.from_numpy(tensor.copy())
+
+
+@pytest.fixture(scope="module")
+def reference(stock, batch):
+    return stock(batch, **PREDICT_ARGS)
+
+
+def assert_parity(reference, candidate, conf_tol=CPU_PARITY_CONF_TOL):
+    report = compare_detections(reference, candidate, conf_tol=conf_tol)
+    assert report["matched"] > 0, "reference frames produced no detections to compare"
+    assert report["passed"], report
+
+
+def test_fuse(batch, reference):
+    """Conv+BN fusion alone, served through the stock predictor."""
+    fused = fresh_model()
+    fused.model.fuse(verbose=False)
+    assert_parity(reference, fused(batch, **PREDICT_ARGS))
+
+
+def test_channels_last(batch, reference):
+    """Channels-last layout and inference_mode alone, on the unfused network."""
+    yolo = fresh_model()
+    yolo.model.eval().to(memory_format=torch.channels_last)
+    model = CPUInferenceModel(yolo, "eager")
+    assert_parity(reference, model(batch, **PREDICT_ARGS))
+
+
+def test_eager(batch, reference):
+    """Fused + channels-last, the default served mode."""
+    model = CPUInferenceModel(fuse_model(fresh_model()), "eager")
+    assert_parity(reference, model(batch, **PREDICT_ARGS))
+
+
+def test_bf16(batch, reference):
+    """bf16 autocast, within the looser bf16 confidence tolerance."""
+    model = CPUInferenceModel(fuse_model(fresh_model()), "bf16")
+    assert_parity(reference, model(batch, **PREDICT_ARGS), conf_tol=CPU_PARITY_BF16_CONF_TOL)
+
+
+@pytest.mark.skipif(not hasattr(torch, "compile"), reason="torch.compile not available")
+def test_compile(batch, reference):
+    """torch.compile of the fused network."""
+    model = CPUInferenceModel(fuse_model(fresh_model()), "compile")
+    assert_parity(reference, model(batch, **PREDICT_ARGS))
+
+
+def test_results_match_stock_shape(batch, reference):
+    """Results from the optimised path expose the same fields the engine reads."""
+    model = CPUInferenceModel(fuse_model(fresh_model()), "eager")
+    results = model(batch, **PREDICT_ARGS)
+    assert len(results) == len(reference)
+    for ours, theirs in zip(results, reference):
+        assert ours.names == theirs.names
+        assert ours.orig_shape == theirs.orig_shape
+        assert ours.boxes.data.shape[1] == theirs.boxes.data.shape[1]
@@ -0,0 +1,51 @@
+"""
+Tests for offline footage processing (offline.py):
+
+    pytest test_offline.py
+
+Needs ultralytics and the model weights (MODEL_PATH); skipped otherwise.
+"""
+
+import json
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+pytest.importorskip("ultralytics")
+
+import offline
+from config import MODEL_PATH
+
+FPS = 10
+SECONDS = 30
+
+
+@pytest.fixture(scope="module", autouse=True)
+def weights():
+    if not os.path.exists(MODEL_PATH):
+        pytest.skip(f"model weights {MODEL_PATH} not found")
+
+
+def write_video(path, seconds=SECONDS, fps=FPS):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), fps, (320, 240))
+    for index in range(seconds * fps):
+        frame = np.full((240, 320, 3), index % 255, dtype=np.uint8)
+        writer.write(frame)
+    writer.release()
+    return str(path)
+
+
+def test_clean_run_has_no_failures(tmp_path):
+    """Workers exiting after their last segment must not fail segments whose frames are still queued."""
+    videos = [write_video(tmp_path / "v0.avi"), write_video(tmp_path / "v1.avi")]
+    output = str(tmp_path / "detections.jsonl")
+
+    failed = offline.main(videos, output, workers=2, segment_seconds=10, progress_interval=0)
+
+    assert failed == []
+    with open(f"{output}.checkpoint.json", encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    assert len(checkpoint) == 2 * SECONDS // 10
+    assert all(entry["done"] for entry in checkpoint.values())
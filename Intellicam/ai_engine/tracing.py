@@ -0,0 +1,263 @@
+"""
+Pipeline tracing for Intellicam AI Engine.
+Per-stream, per-stage timings kept in small rolling windows (cheap enough to
+leave on permanently), plus an on-demand sampling profiler that inspects
+every thread of a live engine without restarting it. End-to-end alert
+latency (frame capture to backend acknowledgement) is kept in fixed-bucket
+histograms per hop, keyed by a trace ID that travels with the alert.
+"""
+
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import contextmanager
+
+from config import TRACE_ENABLED, TRACE_WINDOW, PROFILE_INTERVAL, LATENCY_BUCKETS_MS
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an ascending list, or None if it is empty."""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class StageTracer:
+    """
+    Rolling latency samples per (stream, stage).
+
+    Recording is a deque append; percentiles are only computed when stats()
+    is called, so the hot path costs a few microseconds per span.
+    """
+
+    def __init__(self, window=TRACE_WINDOW, enabled=TRACE_ENABLED):
+        """
+        Args:
+            window (int): Samples kept per stream and stage
+            enabled (bool): When False every call is a no-op
+        """
+        self.window = window
+        self.enabled = enabled
+        self._samples = {}  # stream_id -> {stage: deque of seconds}
+        self._lock = threading.Lock()
+
+    def _window(self, stream_id, stage):
+        stages = self._samples.get(stream_id)
+        if stages is None or stage not in stages:
+            with self._lock:
+                stages = self._samples.setdefault(stream_id, {})
+                stages.setdefault(stage, deque(maxlen=self.window))
+        return stages[stage]
+
+    def record(self, stream_id, stage, seconds):
+        """Add one timing sample."""
+        if self.enabled:
+            self._window(stream_id, stage).append(seconds)
+
+    @contextmanager
+    def span(self, stream_id, stage):
+        """Time the enclosed block as one sample of `stage`."""
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._window(stream_id, stage).append(time.perf_counter() - started)
+
+    def record_result(self, stream_id, result):
+        """Record the preprocess/inference/postprocess split ultralytics measured for a result."""
+        speed = getattr(result, "speed", None)
+        if not self.enabled or not speed:
+            return
+        for stage in ("preprocess", "inference", "postprocess"):
+            if speed.get(stage) is not None:
+                self._window(stream_id, stage).append(speed[stage] / 1000)
+
+    def remove(self, stream_id):
+        with self._lock:
+            self._samples.pop(stream_id, None)
+
+    def stats(self, stream_id=None):
+        """
+        Percentiles per stream and stage.
+
+        Args:
+            stream_id (str): Limit the report to one stream
+
+        Returns:
+            dict: stream_id -> stage -> {count, mean_ms, p50_ms, p95_ms, p99_ms, max_ms}
+        """
+        with self._lock:
+            snapshot = {sid: {stage: list(samples) for stage, samples in stages.items()}
+                        for sid, stages in self._samples.items()
+                        if stream_id is None or sid == stream_id}
+        report = {}
+        for sid, stages in snapshot.items():
+            report[sid] = {}
+            for stage, samples in stages.items():
+                if not samples:
+                    continue
+                ordered = sorted(samples)
+                report[sid][stage] = {
+                    "count": len(ordered),
+                    "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+                    "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+                    "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+                    "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+                    "max_ms": round(ordered[-1] * 1000, 3),
+                }
+        return report
+
+
+def new_trace_id():
+    """Random ID that follows one captured frame to the backend and its notifications."""
+    return uuid.uuid4().hex[:16]
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram.
+
+    Unlike StageTracer's rolling windows it never forgets a sample, so
+    rare slow alerts stay visible; percentiles are bucket upper bounds.
+    """
+
+    def __init__(self, buckets_ms=LATENCY_BUCKETS_MS):
+        self.bounds = [b / 1000 for b in sorted(buckets_ms)]
+        self.counts = [0] * (len(self.bounds) + 1)  # Last bucket is overflow
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        seconds = max(0.0, seconds)
+        index = 0
+        while index < len(self.bounds) and seconds > self.bounds[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def _quantile(self, fraction):
+        target = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= target:
+                return round(bound * 1000, 1)
+        return round(self.max * 1000, 1)
+
+    def to_dict(self):
+        cumulative, buckets = 0, []
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            buckets.append({"le_ms": round(bound * 1000, 1), "count": cumulative})
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 1) if self.count else 0.0,
+            "p50_ms": self._quantile(0.50) if self.count else 0.0,
+            "p95_ms": self._quantile(0.95) if self.count else 0.0,
+            "p99_ms": self._quantile(0.99) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 1),
+            "buckets": buckets,
+        }
+
+
+class HopLatency:
+    """Named LatencyHistograms, one per hop of the alert path."""
+
+    def __init__(self, buckets_ms=LATENCY_BUCKETS_MS, enabled=TRACE_ENABLED):
+        self.buckets_ms = buckets_ms
+        self.enabled = enabled
+        self._hops = {}
+        self._lock = threading.Lock()
+
+    def observe(self, hop, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._hops.get(hop)
+            if histogram is None:
+                histogram = self._hops[hop] = LatencyHistogram(self.buckets_ms)
+            histogram.observe(seconds)
+
+    def stats(self):
+        """hop -> count, mean and percentile estimates, and cumulative buckets."""
+        with self._lock:
+            return {hop: histogram.to_dict() for hop, histogram in self._hops.items()}
+
+
+_profile_lock = threading.Lock()
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_profile(seconds, interval=PROFILE_INTERVAL, limit=25):
+    """
+    Sample the stacks of every thread for a while and aggregate them.
+
+    Unlike cProfile this sees all threads (capture, inference workers,
+    alert senders) and adds no overhead to them; the cost is one stack walk
+    per thread every `interval` seconds in the calling thread.
+
+    Args:
+        seconds (float): How long to sample
+        interval (float): Seconds between samples
+        limit (int): Entries returned per table
+
+    Returns:
+        dict: Sample counts per thread, top functions by self and cumulative
+            samples, and the most common stacks
+
+    Raises:
+        RuntimeError: If another profile is already running
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError("A profile is already running")
+    try:
+        own = threading.get_ident()
+        self_counts, cumulative, stacks, threads = Counter(), Counter(), Counter(), Counter()
+        samples = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                if not labels:
+                    continue
+                samples += 1
+                threads[names.get(ident, str(ident))] += 1
+                self_counts[labels[0]] += 1
+                cumulative.update(set(labels))
+                stacks[";".join(reversed(labels))] += 1
+            time.sleep(interval)
+    finally:
+        _profile_lock.release()
+
+    def table(counter):
+        return [{"function": name, "samples": count, "percent": round(100 * count / samples, 1)}
+                for name, count in counter.most_common(limit)] if samples else []
+
+    return {
+        "seconds": seconds,
+        "interval_ms": round(interval * 1000, 1),
+        "samples": samples,
+        "threads": dict(threads.most_common()),
+        "top_self": table(self_counts),
+        "top_cumulative": table(cumulative),
+        "top_stacks": [{"stack": stack, "samples": count} for stack, count in stacks.most_common(limit)],
+    }
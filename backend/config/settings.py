@@ -13,6 +13,12 @@ class Settings(BaseSettings):
     smtp_username: str
     smtp_password: str
     ai_url: str
+    ai_urls: Optional[str] = None  # Comma-separated AI engine nodes; defaults to ai_url
+    engine_health_interval: float = 10.0
+    bulk_alert_max_bytes: int = 8 * 1024 * 1024  # Decompressed body limit of POST /api/alerts/bulk
+    bulk_alert_max_items: int = 1000
+    alert_notify_min_confidence: float = 0.7  # Alerts below this are stored but notify nobody
+    alert_notify_cooldown_seconds: float = 60.0  # At most one notification per user and stream in this window
 
     model_config = {
         "env_file": ".env",
@@ -0,0 +1,218 @@
+"""
+Local end-to-end latency run for the alert path.
+
+Serves the backend with in-memory stand-ins for MongoDB and Twilio (each
+with a configurable delay) and a recording WebSocket standing in for the
+user's phone, pushes alerts through it and prints the per-hop histograms.
+
+Synthetic alerts (no AI engine needed):
+    python latency_harness.py --alerts 200 --mongo-ms 20 --twilio-ms 300
+
+With a real AI engine started as BACKEND_URL=http://localhost:5055/api/alerts/:
+    python latency_harness.py --engine-url http://localhost:8000 --stream-url knife.mp4 --seconds 30
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+
+# Settings are required at import time; none of them are used by the stand-ins
+for _key, _value in {
+    "MONGO_URI": "mongodb://stand-in", "JWT_SECRET_KEY": "latency-harness",
+    "SMTP_HOST": "localhost", "SMTP_PORT": "25", "SMTP_USERNAME": "harness", "SMTP_PASSWORD": "harness",
+    "AI_URL": "http://localhost:8000",
+}.items():
+    os.environ.setdefault(_key, _value)
+
+import httpx
+from bson import ObjectId
+
+import config.database as database
+import utils.alert as twilio_alerts
+from main import app
+from routers.alerts import alert_throttle
+from services.websocket_manager import ws_manager
+from utils.latency import alert_latency
+
+USER_ID = str(ObjectId())  # Sent as the alerts' user_id, like a real user's id
+
+
+class MemoryCollection:
+    """Async insert/find over a list, each call taking `delay` seconds."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.docs = []
+
+    async def insert_one(self, doc: dict):
+        await asyncio.sleep(self.delay)
+        doc.setdefault("_id", ObjectId())
+        self.docs.append(doc)
+        return SimpleNamespace(inserted_id=doc["_id"])
+
+    async def insert_many(self, docs: list, ordered: bool = True):
+        await asyncio.sleep(self.delay)
+        for doc in docs:
+            doc.setdefault("_id", ObjectId())
+        self.docs.extend(docs)
+        return SimpleNamespace(inserted_ids=[doc["_id"] for doc in docs])
+
+    async def find_one(self, query: dict):
+        await asyncio.sleep(self.delay)
+        for doc in self.docs:
+            if all(doc.get(key) == value for key, value in query.items()):
+                return doc
+        return None
+
+
+class MemoryDatabase:
+    def __init__(self, delay: float):
+        self.alerts = MemoryCollection(delay)
+        self.users = MemoryCollection(delay)
+
+
+class StandInTwilio:
+    """Blocks like the real (synchronous) Twilio client, then records the message."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.messages = self
+        self.sent = []
+
+    def create(self, **message):
+        time.sleep(self.delay)
+        self.sent.append(message)
+
+
+class RecordingSocket:
+    """Stands in for the user's WebSocket; stamps every alert it receives."""
+
+    def __init__(self):
+        self.received = []
+
+    async def send_text(self, payload: str):
+        self.received.append((time.time(), json.loads(payload)))
+
+
+def install_stand_ins(mongo_ms: float, twilio_ms: float) -> RecordingSocket:
+    database.database = MemoryDatabase(mongo_ms / 1000)
+    database.database.users.docs.append({"_id": ObjectId(USER_ID), "phone": "+15550000002"})
+    twilio_alerts.client = StandInTwilio(twilio_ms / 1000)
+    twilio_alerts.SMS_NUMBER = "+15550000000"
+    twilio_alerts.WHATSAPP_NUMBER = "whatsapp:+15550000001"
+    socket = RecordingSocket()
+    ws_manager.active_connections[USER_ID] = [socket]
+    alert_throttle.cooldown_seconds = 0  # Every alert takes the full notification path
+    return socket
+
+
+def synthetic_alert(engine_ms: float) -> dict:
+    """An alert shaped like the ones the AI engine posts."""
+    now = time.time()
+    return {
+        "object": "knife",
+        "confidence": 0.91,
+        "timestamp": datetime.now().isoformat(),
+        "stream_id": "harness_camera",
+        "user_id": USER_ID,
+        "clip_id": None,
+        "trace_id": uuid.uuid4().hex[:16],
+        "captured_at": now - engine_ms / 1000,
+        "sent_at": now,
+        "engine_ms": engine_ms,
+    }
+
+
+async def run_synthetic(args):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://harness") as client:
+        for _ in range(args.alerts):
+            alert = synthetic_alert(args.engine_ms)
+            response = await client.post("/api/alerts/", json=alert, headers={"X-Trace-Id": alert["trace_id"]})
+            response.raise_for_status()
+            if args.rate:
+                await asyncio.sleep(1 / args.rate)
+
+
+async def run_with_engine(args):
+    import uvicorn
+
+    # Lifespan off: the stand-ins replace the database connection and engine pool
+    server = uvicorn.Server(uvicorn.Config(app, host="0.0.0.0", port=args.port, lifespan="off", log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    stream_id = f"latency_{int(time.time())}"
+    async with httpx.AsyncClient(base_url=args.engine_url, timeout=10) as engine:
+        response = await engine.post("/start_detection", json={
+            "stream_url": args.stream_url, "stream_id": stream_id, "user_id": USER_ID,
+        })
+        response.raise_for_status()
+        print(f"Engine streaming {args.stream_url} as {stream_id} for {args.seconds}s "
+              f"(engine must post alerts to http://localhost:{args.port}/api/alerts/)")
+        try:
+            await asyncio.sleep(args.seconds)
+        finally:
+            await engine.post("/stop_detection", json={"stream_id": stream_id})
+        engine_hops = (await engine.get("/traces/latency")).json()
+
+    server.should_exit = True
+    await serving
+    return engine_hops
+
+
+def print_hops(title: str, hops: dict):
+    print(f"\n{title}")
+    print(f"  {'hop':<24}{'count':>7}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)")
+    for hop, h in sorted(hops.items(), key=lambda item: item[1]["mean_ms"]):
+        print(f"  {hop:<24}{h['count']:>7}{h['mean_ms']:>9}{h['p50_ms']:>9}{h['p95_ms']:>9}{h['p99_ms']:>9}{h['max_ms']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure alert latency through the backend with stand-in Mongo and Twilio")
+    parser.add_argument("--alerts", type=int, default=100, help="Synthetic alerts to send")
+    parser.add_argument("--rate", type=float, default=0, help="Synthetic alerts per second (0 = back to back)")
+    parser.add_argument("--engine-ms", type=float, default=0, help="Simulated engine capture-to-post time")
+    parser.add_argument("--mongo-ms", type=float, default=5, help="Stand-in Mongo delay per operation")
+    parser.add_argument("--twilio-ms", type=float, default=250, help="Stand-in Twilio delay per message")
+    parser.add_argument("--engine-url", help="Drive a real AI engine instead of sending synthetic alerts")
+    parser.add_argument("--stream-url", help="Stream for the engine to watch (with --engine-url)")
+    parser.add_argument("--seconds", type=float, default=30, help="How long to let the engine stream")
+    parser.add_argument("--port", type=int, default=5055, help="Port the backend listens on (with --engine-url)")
+    parser.add_argument("--budget-ms", type=float, default=500, help="Exit non-zero if capture-to-WebSocket p95 exceeds this")
+    args = parser.parse_args()
+    if args.engine_url and not args.stream_url:
+        parser.error("--stream-url is required with --engine-url")
+
+    socket = install_stand_ins(args.mongo_ms, args.twilio_ms)
+    if args.engine_url:
+        print_hops("AI engine hops", asyncio.run(run_with_engine(args)))
+    else:
+        asyncio.run(run_synthetic(args))
+
+    stats = alert_latency.stats(recent=1)
+    print_hops("Backend hops", stats["hops"])
+    print(f"\nAlerts delivered over WebSocket: {len(socket.received)}, "
+          f"Twilio messages: {len(twilio_alerts.client.sent)}")
+    if stats["recent"]:
+        print(f"Last trace: {json.dumps(stats['recent'][-1])}")
+
+    end_to_end = stats["hops"].get("capture_to_websocket")
+    if end_to_end is None:
+        print("No alert reached the WebSocket")
+        sys.exit(1)
+    within = end_to_end["p95_ms"] <= args.budget_ms
+    print(f"Capture to WebSocket p95 {end_to_end['p95_ms']} ms "
+          f"{'within' if within else 'exceeds'} the {args.budget_ms:g} ms budget")
+    sys.exit(0 if within else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,11 +5,14 @@ import uvicorn
 from config.database import connect_db, close_db
 from routers import users, alerts, monitoring
 from routers.websocket_router import ws_router
+from services.engine_pool import engine_pool
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await connect_db()
+    engine_pool.start()
     yield
+    await engine_pool.stop()
     await close_db()
 
 app = FastAPI(
@@ -30,6 +30,12 @@ class AlertBase(BaseModel):
     timestamp: datetime
     stream_id: str
     user_id: str
+    clip_id: Optional[str] = None
+    # Set by the AI engine so the alert's latency can be followed end to end
+    trace_id: Optional[str] = None
+    captured_at: Optional[float] = None  # Unix time the frame was captured
+    sent_at: Optional[float] = None  # Unix time the engine posted the alert
+    engine_ms: Optional[float] = None  # Capture-to-post time measured by the engine
 
 
 class AlertInDb(AlertBase):
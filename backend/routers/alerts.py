@@ -1,10 +1,17 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
 from auth.dependencies import get_user_with_token
 from config.database import get_database
+from config.settings import settings
 from bson import ObjectId
+from pymongo.errors import BulkWriteError
 from models.alert import AlertResponse, AlertBase
+from services.websocket_manager import ws_manager
+from utils.alert_throttle import AlertThrottle
+from utils.bulk_ingest import read_body, split_items, validate_items
+from utils.latency import alert_latency
 
 router = APIRouter()
+alert_throttle = AlertThrottle(settings.alert_notify_min_confidence, settings.alert_notify_cooldown_seconds)
 
 def serialize_doc(doc):
     """Convert MongoDB document to JSON-serializable dict"""
@@ -27,13 +34,103 @@ async def get_alerts(current_user = Depends(get_user_with_token)):
 
     return AlertResponse(serialized_alerts)
 
+async def notify(alert: AlertBase, trace):
+    """Push an alert to its user over WebSocket, SMS and WhatsApp, then close its trace"""
+    await ws_manager.broadcast_alert(
+        "threat_detected", alert.stream_id, alert.model_dump(mode="json"),
+        target_user_id=alert.user_id, trace=trace
+    )
+    trace.finish()
+
+
 @router.post("/", response_model=dict)
-async def receive_alert(detection: AlertBase):
-    """Receive alert and send alert based on confidence"""
+async def receive_alert(detection: AlertBase, request: Request, background_tasks: BackgroundTasks):
+    """
+    Store an alert from the AI engine and notify its user in the background.
+
+    Only alerts at or above ALERT_NOTIFY_MIN_CONFIDENCE notify, and at most
+    once per user and stream every ALERT_NOTIFY_COOLDOWN_SECONDS.
+    """
+    trace = alert_latency.start(
+        detection.trace_id or request.headers.get("X-Trace-Id"),
+        captured_at=detection.captured_at,
+        sent_at=detection.sent_at,
+        engine_ms=detection.engine_ms,
+    )
     db = get_database()
 
-    await db.alerts.insert_one(detection)
+    with trace.hop("mongo_insert"):
+        await db.alerts.insert_one(detection.model_dump())
+    trace.mark("stored")
+
+    if alert_throttle.allow(detection.user_id, detection.stream_id, detection.confidence):
+        background_tasks.add_task(notify, detection, trace)
+    else:
+        trace.finish()
+
+    return {
+        "message": "Sent succesfully",
+        "trace_id": trace.trace_id
+    }
+
+
+async def notify_latest(alerts):
+    """Notify each user once per stream, with the most confident alert of a bulk batch"""
+    latest = {}
+    for alert in alerts:
+        key = (alert.user_id, alert.stream_id)
+        if key not in latest or alert.confidence > latest[key].confidence:
+            latest[key] = alert
+    for alert in latest.values():
+        if not alert_throttle.allow(alert.user_id, alert.stream_id, alert.confidence):
+            continue
+        trace = alert_latency.start(alert.trace_id, captured_at=alert.captured_at,
+                                    sent_at=alert.sent_at, engine_ms=alert.engine_ms)
+        await notify(alert, trace)
+
+
+@router.post("/bulk", response_model=dict)
+async def receive_alerts_bulk(request: Request, background_tasks: BackgroundTasks):
+    """
+    Store a batch of alerts sent as a JSON array or NDJSON (optionally gzipped).
+
+    Items are validated individually and the valid ones written with one
+    unordered insert_many, so a bad item never blocks the rest. Users are
+    notified once per stream in the background, after the response.
+    """
+    body = await read_body(request, settings.bulk_alert_max_bytes)
+    items = split_items(body, request.headers.get("content-type", ""))
+    if not items:
+        raise HTTPException(status_code=400, detail="No alerts in request body")
+    if len(items) > settings.bulk_alert_max_items:
+        raise HTTPException(status_code=413, detail=f"At most {settings.bulk_alert_max_items} alerts per request")
+
+    alerts, results = validate_items(items)
+    docs = [alert.model_dump() for alert in alerts]
+    failed = {}
+    if docs:
+        db = get_database()
+        try:
+            await db.alerts.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            failed = {err["index"]: err.get("errmsg", "write failed") for err in e.details.get("writeErrors", [])}
+
+    for result in results:
+        position = result.pop("alert", None)
+        if position is None:
+            continue
+        if position in failed:
+            result.update(status="rejected", error=failed[position])
+        else:
+            result["id"] = str(docs[position]["_id"])
+
+    stored = [alert for position, alert in enumerate(alerts) if position not in failed]
+    if stored:
+        background_tasks.add_task(notify_latest, stored)
 
+    accepted = sum(1 for result in results if result["status"] == "accepted")
     return {
-        "message": "Sent succesfully"
-    }
\ No newline at end of file
+        "accepted": accepted,
+        "rejected": len(results) - accepted,
+        "results": results
+    }
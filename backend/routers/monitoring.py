@@ -2,8 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException
 from auth.dependencies import get_user_with_token
 from models.detection import DetectionRequest, DetectionResponse
 import logging
-import httpx
-from config.settings import settings
+from services.engine_pool import engine_pool
+from utils.latency import alert_latency
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -19,21 +19,15 @@ async def start_monitoring(stream: DetectionRequest, current_user = Depends(get_
             "user_id": current_user.user.id
         }
 
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            logger.info(f"📤 Starting Detection: stream.stream_url")
-            
-            response = await client.post(
-                f"{settings.ai_url}/start_detection",
-                json=detection_payload
-            )
-
-            print(response)
-            
-            logger.info(f"📥 Staging server response status: {response.status_code}")
-            if response.status_code < 400:
-                logger.info(f"✅ Started successful")
-            else:
-                logger.error(f"❌ Starting Detection failed: {response.text[:500]}")
+        logger.info(f"📤 Starting Detection: {stream.stream_url}")
+
+        response = await engine_pool.start_stream(detection_payload)
+
+        logger.info(f"📥 AI engine response status: {response.status_code}")
+        if response.status_code < 400:
+            logger.info(f"✅ Started successful")
+        else:
+            logger.error(f"❌ Starting Detection failed: {response.text[:500]}")
     except Exception as e:
         logger.error(f"Unexpected error in starting detection: {e}", exc_info=True)
         raise HTTPException(
@@ -50,29 +44,19 @@ async def start_monitoring(stream: DetectionRequest, current_user = Depends(get_
 
 
 @router.post("/stop", response_model=dict)
-async def start_monitoring(stream: DetectionRequest, current_user = Depends(get_user_with_token)):
+async def stop_monitoring(stream: DetectionRequest, current_user = Depends(get_user_with_token)):
     """Stop Detection"""
 
     try:
-        detection_payload = {
-            "stream_id": stream.stream_id,
-        }
+        logger.info(f"📤 Stopping Detection: {stream.stream_id}")
 
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            logger.info(f"📤 Stopping Detection: stream.stream_url")
-            
-            response = await client.post(
-                f"{settings.ai_url}/stop_detection",
-                json=detection_payload
-            )
-
-            print(response)
-            
-            logger.info(f"📥 Staging server response status: {response.status_code}")
-            if response.status_code < 400:
-                logger.info(f"✅ Stopped successful")
-            else:
-                logger.error(f"❌ Stopping Detection failed: {response.text[:500]}")
+        response = await engine_pool.stop_stream(stream.stream_id)
+
+        logger.info(f"📥 AI engine response status: {response.status_code}")
+        if response.status_code < 400:
+            logger.info(f"✅ Stopped successful")
+        else:
+            logger.error(f"❌ Stopping Detection failed: {response.text[:500]}")
     except Exception as e:
         logger.error(f"Unexpected error in stopping detection: {e}", exc_info=True)
         raise HTTPException(
@@ -84,4 +68,16 @@ async def start_monitoring(stream: DetectionRequest, current_user = Depends(get_
     return {
         "message": "Succesfully stopped detection",
         "status": response_data["status"]
-    }
\ No newline at end of file
+    }
+
+
+@router.get("/streams", response_model=dict)
+async def list_streams(current_user = Depends(get_user_with_token)):
+    """List active streams and the AI engine node running each one"""
+    return await engine_pool.list_streams()
+
+
+@router.get("/latency", response_model=dict)
+async def alert_latency_stats(recent: int = 20, current_user = Depends(get_user_with_token)):
+    """Per-hop latency histograms of received alerts, from frame capture to notification"""
+    return alert_latency.stats(recent)
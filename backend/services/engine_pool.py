@@ -0,0 +1,247 @@
+import asyncio
+import bisect
+import hashlib
+import logging
+from typing import Dict, List, Optional
+
+import httpx
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _hash(key: str) -> int:
+    return int(hashlib.md5(key.encode("utf-8")).hexdigest(), 16)
+
+
+class EngineNode:
+    """One AI engine process and its last known health."""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.capacity = 1.0
+        self.healthy = True
+        self.failures = 0
+        self.active_streams = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "capacity": self.capacity,
+            "active_streams": self.active_streams,
+        }
+
+
+class EnginePool:
+    """
+    Pool of AI engine nodes that streams are sharded across.
+
+    Streams are placed with consistent hashing on stream_id. Each node gets a
+    number of virtual points on the ring proportional to the capacity it
+    reports on /health, so bigger boxes own more streams. Placements are
+    sticky: a stream stays on its node until that node fails its health
+    check, at which point its streams are restarted on the next healthy node
+    of the ring. The failed node is told to stop them (best effort, retried
+    once it answers health checks again), so a node that only blipped does
+    not keep running streams that now live elsewhere.
+    """
+
+    def __init__(self, urls: List[str], vnodes: int = 64, health_interval: float = 10.0, failure_threshold: int = 2):
+        self.nodes: Dict[str, EngineNode] = {}
+        for url in urls:
+            node = EngineNode(url)
+            self.nodes[node.url] = node
+        self.vnodes = vnodes
+        self.health_interval = health_interval
+        self.failure_threshold = failure_threshold
+        # stream_id -> (node url, start payload) so failed nodes can be drained
+        self.assignments: Dict[str, tuple] = {}
+        # node url -> streams moved off that node that it has not yet confirmed stopping
+        self.released: Dict[str, set] = {}
+        self._ring: List[tuple] = []
+        self._ring_keys: List[int] = []
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._rebuild_ring()
+
+    def _rebuild_ring(self):
+        healthy = [n for n in self.nodes.values() if n.healthy]
+        mean_capacity = sum(n.capacity for n in healthy) / len(healthy) if healthy else 1.0
+        ring = []
+        for node in healthy:
+            points = max(8, round(self.vnodes * node.capacity / mean_capacity))
+            for i in range(points):
+                ring.append((_hash(f"{node.url}#{i}"), node.url))
+        ring.sort()
+        self._ring = ring
+        self._ring_keys = [point for point, _ in ring]
+
+    def owner_for(self, stream_id: str) -> Optional[EngineNode]:
+        """Return the healthy node that stream_id hashes to, if any."""
+        if not self._ring:
+            return None
+        index = bisect.bisect(self._ring_keys, _hash(stream_id)) % len(self._ring)
+        return self.nodes[self._ring[index][1]]
+
+    def node_for(self, stream_id: str) -> Optional[EngineNode]:
+        """Return the node currently running stream_id, falling back to its ring owner."""
+        assignment = self.assignments.get(stream_id)
+        if assignment:
+            return self.nodes.get(assignment[0])
+        return self.owner_for(stream_id)
+
+    async def _check_node(self, client: httpx.AsyncClient, node: EngineNode) -> bool:
+        """Refresh one node's health; return True if its ring placement changed."""
+        was_healthy, old_capacity = node.healthy, node.capacity
+        try:
+            response = await client.get(f"{node.url}/health")
+            response.raise_for_status()
+            data = response.json()
+            node.capacity = float(data.get("capacity", 1) or 1)
+            node.active_streams = int(data.get("active_streams", 0))
+            node.failures = 0
+            node.healthy = True
+        except Exception as e:
+            node.failures += 1
+            logger.warning(f"⚠️ AI engine {node.url} health check failed ({node.failures}): {e}")
+            if node.failures >= self.failure_threshold:
+                node.healthy = False
+        return node.healthy != was_healthy or node.capacity != old_capacity
+
+    async def refresh_health(self):
+        """Health-check every node and move streams off nodes that are down."""
+        async with httpx.AsyncClient(timeout=5.0) as client:
+            changed = await asyncio.gather(*(self._check_node(client, n) for n in self.nodes.values()))
+            # Nodes that are reachable again must drop streams that were moved away from them
+            for node in self.nodes.values():
+                if node.healthy and self.released.get(node.url):
+                    for stream_id in list(self.released[node.url]):
+                        await self._release(client, node.url, stream_id)
+
+        # Orphans are gathered on every round, not just when health flipped: start_stream
+        # may already have marked a node down, and an earlier reassignment may have failed
+        async with self._lock:
+            if any(changed):
+                self._rebuild_ring()
+            failed = {n.url for n in self.nodes.values() if not n.healthy}
+            orphaned = [(sid, payload) for sid, (url, payload) in self.assignments.items() if url in failed]
+
+        for stream_id, payload in orphaned:
+            logger.info(f"🔀 Reassigning stream {stream_id} from failed AI engine")
+            try:
+                await self.start_stream(payload, reassign=True)
+            except Exception as e:
+                logger.error(f"❌ Failed to reassign stream {stream_id}: {e}")
+
+    async def _release(self, client: httpx.AsyncClient, url: str, stream_id: str):
+        """Best-effort stop of a stream on a node that no longer owns it; remembered for retry on failure."""
+        async with self._lock:
+            assignment = self.assignments.get(stream_id)
+        if assignment and assignment[0] == url:
+            self.released.get(url, set()).discard(stream_id)  # The stream has moved back here
+            return
+        try:
+            response = await client.post(f"{url}/stop_detection", json={"stream_id": stream_id}, timeout=5.0)
+            if response.status_code < 400 or response.status_code == 404:
+                self.released.get(url, set()).discard(stream_id)
+                logger.info(f"🛑 Stopped stream {stream_id} on previous AI engine {url}")
+                return
+        except httpx.HTTPError:
+            pass
+        self.released.setdefault(url, set()).add(stream_id)
+
+    async def start_stream(self, payload: dict, reassign: bool = False) -> httpx.Response:
+        """Start a stream on its owning node, trying the next owner if that node is unreachable."""
+        stream_id = payload["stream_id"]
+        async with self._lock:
+            previous = self.assignments.get(stream_id)
+            if previous and not reassign:
+                node = self.nodes.get(previous[0])
+            else:
+                node = self.owner_for(stream_id)
+        if node is None:
+            raise RuntimeError("No healthy AI engine nodes available")
+
+        # Every node other than the final owner that may be running the stream
+        others = {previous[0]} if previous else set()
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            try:
+                response = await client.post(f"{node.url}/start_detection", json=payload)
+            except httpx.TransportError:
+                # A timed-out request may still have started the stream there
+                others.add(node.url)
+                async with self._lock:
+                    node.healthy = False
+                    node.failures = self.failure_threshold
+                    self._rebuild_ring()
+                    node = self.owner_for(stream_id)
+                if node is None:
+                    raise
+                response = await client.post(f"{node.url}/start_detection", json=payload)
+
+            if response.status_code < 400:
+                async with self._lock:
+                    self.assignments[stream_id] = (node.url, payload)
+                self.released.get(node.url, set()).discard(stream_id)
+                for url in others - {node.url}:
+                    await self._release(client, url, stream_id)
+        return response
+
+    async def stop_stream(self, stream_id: str) -> httpx.Response:
+        """Stop a stream on the node that owns it."""
+        node = self.node_for(stream_id)
+        if node is None:
+            raise RuntimeError("No healthy AI engine nodes available")
+
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            response = await client.post(f"{node.url}/stop_detection", json={"stream_id": stream_id})
+
+        if response.status_code < 400 or response.status_code == 404:
+            async with self._lock:
+                self.assignments.pop(stream_id, None)
+        return response
+
+    async def list_streams(self) -> dict:
+        """Collect active streams from every healthy node, tagged with their owner."""
+        streams = {}
+        async with httpx.AsyncClient(timeout=5.0) as client:
+            for node in self.nodes.values():
+                if not node.healthy:
+                    continue
+                try:
+                    response = await client.get(f"{node.url}/streams")
+                    for stream_id in response.json().get("stream_ids", []):
+                        streams[stream_id] = node.url
+                except Exception as e:
+                    logger.warning(f"⚠️ Could not list streams on {node.url}: {e}")
+        return {
+            "streams": streams,
+            "nodes": [n.to_dict() for n in self.nodes.values()],
+        }
+
+    async def _health_loop(self):
+        while True:
+            try:
+                await self.refresh_health()
+            except Exception as e:
+                logger.error(f"❌ AI engine health loop error: {e}")
+            await asyncio.sleep(self.health_interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._health_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+
+def _engine_urls() -> List[str]:
+    urls = [u.strip() for u in (settings.ai_urls or "").split(",") if u.strip()]
+    return urls or [settings.ai_url]
+
+
+# ✅ Create one global pool for the whole app
+engine_pool = EnginePool(_engine_urls(), health_interval=settings.engine_health_interval)
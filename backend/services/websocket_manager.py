@@ -1,9 +1,13 @@
+import asyncio
 from typing import Dict, List
 from fastapi import WebSocket
+from starlette.concurrency import run_in_threadpool
 import json
 import logging
+from bson import ObjectId
 from config.database import get_database
 from utils.alert import send_whatsapp, send_sms
+from utils.latency import AlertTrace, NO_TRACE
 
 logger = logging.getLogger(__name__)
 
@@ -58,7 +62,7 @@ class WebSocketManager:
         logger.info(f"❌ WebSocket disconnected for user {user_id}")
         logger.info(f"🧾 Remaining connections: {list(self.active_connections.keys())}")
 
-    async def send_to_user(self, user_id: str, message: dict):
+    async def send_to_user(self, user_id: str, message: dict, trace: AlertTrace = NO_TRACE):
         """Send a message to a specific connected user."""
         user_id = str(user_id)
         payload = json.dumps(message)
@@ -78,53 +82,74 @@ class WebSocketManager:
             return False
 
         sent_any = False
-        for ws in list(self.active_connections[user_id]):
-            try:
-                await ws.send_text(payload)
-                sent_any = True
-            except Exception as e:
-                logger.error(f"⚠️ Failed to send message to user {user_id}: {e}")
-                self.disconnect(ws, user_id)
+        with trace.hop("websocket_send"):
+            for ws in list(self.active_connections[user_id]):
+                try:
+                    await ws.send_text(payload)
+                    sent_any = True
+                except Exception as e:
+                    logger.error(f"⚠️ Failed to send message to user {user_id}: {e}")
+                    self.disconnect(ws, user_id)
+        if sent_any:
+            trace.mark("websocket")
 
         return sent_any
 
-    async def broadcast_alert(self, alert_type: str, camera_id: str, alert_data: dict, target_user_id: str = None):
+    async def send_twilio(self, phone: str, text: str, trace: AlertTrace = NO_TRACE):
+        """Send the SMS and WhatsApp messages side by side on worker threads; the Twilio client blocks."""
+        async def send(hop: str, sender, mark: str):
+            with trace.hop(hop):
+                sent = await run_in_threadpool(sender, phone, text)
+            if sent:
+                trace.mark(mark)
+
+        await asyncio.gather(send("twilio_sms", send_sms, "sms"), send("twilio_whatsapp", send_whatsapp, "whatsapp"))
+
+    async def broadcast_alert(self, alert_type: str, camera_id: str, alert_data: dict, target_user_id: str = None,
+                              trace: AlertTrace = NO_TRACE):
         """Broadcast alert globally or to a specific user."""
         message = {
             "event": "alert",
             "type": alert_type,
             "camera_id": camera_id,
             "timestamp": alert_data.get("timestamp"),
+            "trace_id": trace.trace_id,
             "details": alert_data,
         }
 
         if target_user_id:
             try:
                 db = get_database()
-                user = await db.users.find_one({"_id": target_user_id})
+                user = None
+                if ObjectId.is_valid(target_user_id):
+                    with trace.hop("user_lookup"):
+                        user = await db.users.find_one({"_id": ObjectId(target_user_id)})
+                else:
+                    logger.warning(f"⚠️ Alert for camera {camera_id} has invalid user id {target_user_id}")
                 phone = user.get("phone") if user else None
 
-                if phone:
-                    text = f"{alert_type.replace('_', ' ').title()} detected on camera {camera_id}, {alert_data}"
-                    send_sms(phone, text)
-                    send_whatsapp(phone, text)
-
-                sent = await self.send_to_user(str(target_user_id), message)
+                sent = await self.send_to_user(str(target_user_id), message, trace)
                 if sent:
                     logger.info(f"📤 Sent {alert_type} alert from {camera_id} to user {target_user_id}")
                 else:
                     logger.info(f"📤 No active WebSocket for user {target_user_id}; alert stored/sent via SMS if configured")
+
+                if phone:
+                    text = f"{alert_type.replace('_', ' ').title()} detected on camera {camera_id}, {alert_data}"
+                    await self.send_twilio(phone, text, trace)
             except Exception as e:
                 logger.error(f"❌ Failed to send alert for camera {camera_id}: {e}")
         else:
             payload = json.dumps(message)
-            for user_id, conns in self.active_connections.items():
-                for ws in conns:
-                    try:
-                        await ws.send_text(payload)
-                    except Exception as e:
-                        logger.error(f"⚠️ Failed to broadcast alert to {user_id}: {e}")
-                        self.disconnect(ws, user_id)
+            with trace.hop("websocket_send"):
+                for user_id, conns in list(self.active_connections.items()):
+                    for ws in list(conns):
+                        try:
+                            await ws.send_text(payload)
+                        except Exception as e:
+                            logger.error(f"⚠️ Failed to broadcast alert to {user_id}: {e}")
+                            self.disconnect(ws, user_id)
+            trace.mark("websocket")
 
 
 # ✅ Create one global instance for the whole app
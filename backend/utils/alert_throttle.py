@@ -0,0 +1,33 @@
+import time
+from typing import Dict, Optional, Tuple
+
+PRUNE_AT = 1024  # Tracked (user, stream) pairs before expired ones are dropped
+
+
+class AlertThrottle:
+    """
+    Decides which stored alerts notify their user.
+
+    An alert notifies only if its confidence reaches `min_confidence` and
+    no alert for the same user and stream notified within the last
+    `cooldown_seconds`, so a camera that keeps seeing the same object sends
+    one SMS, not one per frame.
+    """
+
+    def __init__(self, min_confidence: float, cooldown_seconds: float):
+        self.min_confidence = min_confidence
+        self.cooldown_seconds = cooldown_seconds
+        self._last: Dict[Tuple[Optional[str], str], float] = {}
+
+    def allow(self, user_id: Optional[str], stream_id: str, confidence: float) -> bool:
+        if confidence < self.min_confidence:
+            return False
+        now = time.monotonic()
+        key = (user_id, stream_id)
+        last = self._last.get(key)
+        if last is not None and now - last < self.cooldown_seconds:
+            return False
+        self._last[key] = now
+        if len(self._last) > PRUNE_AT:
+            self._last = {k: t for k, t in self._last.items() if now - t < self.cooldown_seconds}
+        return True
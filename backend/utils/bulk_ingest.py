@@ -0,0 +1,91 @@
+import json
+import zlib
+from typing import List, Tuple
+
+from fastapi import HTTPException, Request
+from pydantic import ValidationError
+
+from models.alert import AlertBase
+
+
+async def read_body(request: Request, max_bytes: int) -> bytes:
+    """
+    Read a request body, gunzipping it if Content-Encoding is gzip.
+
+    The limit applies to the decompressed size and is enforced while
+    streaming, so neither a large upload nor a gzip bomb is ever held in
+    memory in full.
+    """
+    encoding = request.headers.get("content-encoding", "identity").lower()
+    if encoding not in ("identity", "gzip"):
+        raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {encoding}")
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if encoding == "gzip" else None
+
+    chunks, size = [], 0
+    try:
+        async for data in request.stream():
+            while True:
+                # Cap each step so a small compressed chunk can't expand past the limit
+                chunk = decompressor.decompress(data, max_bytes - size + 1) if decompressor else data
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"Body exceeds {max_bytes} bytes")
+                chunks.append(chunk)
+                if decompressor is None or not decompressor.unconsumed_tail:
+                    break
+                data = decompressor.unconsumed_tail
+        if decompressor is not None:
+            if not decompressor.eof:
+                raise HTTPException(status_code=400, detail="Invalid gzip body: truncated")
+            chunks.append(decompressor.flush())
+    except zlib.error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid gzip body: {e}")
+    return b"".join(chunks)
+
+
+def split_items(body: bytes, content_type: str) -> List[Tuple[object, str]]:
+    """
+    Split a JSON array or NDJSON body into raw items.
+
+    Returns:
+        list: (item, error) pairs; NDJSON lines that are not valid JSON come
+            back as (None, error) so they are rejected individually
+    """
+    text = body.decode("utf-8", errors="replace")
+    if "ndjson" in content_type or "jsonlines" in content_type or not text.lstrip().startswith("["):
+        items = []
+        for number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                items.append((json.loads(line), None))
+            except ValueError as e:
+                items.append((None, f"line {number}: invalid JSON ({e})"))
+        return items
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON array: {e}")
+    return [(item, None) for item in data]
+
+
+def validate_items(items: List[Tuple[object, str]]) -> Tuple[List[AlertBase], List[dict]]:
+    """
+    Validate raw items as AlertBase in one pass.
+
+    Returns:
+        tuple: (valid alerts, results) where results has one entry per item
+            in request order; valid entries carry "alert" with the alert's
+            position in the valid list
+    """
+    alerts, results = [], []
+    for index, (item, error) in enumerate(items):
+        if error is None:
+            try:
+                alerts.append(AlertBase.model_validate(item))
+                results.append({"index": index, "status": "accepted", "alert": len(alerts) - 1})
+                continue
+            except ValidationError as e:
+                error = "; ".join(f"{'.'.join(map(str, err['loc'])) or 'item'}: {err['msg']}" for err in e.errors())
+        results.append({"index": index, "status": "rejected", "error": error})
+    return alerts, results
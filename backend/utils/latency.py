@@ -0,0 +1,156 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# Upper bounds (ms) of the hop histograms; matches the AI engine's buckets
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+RECENT_TRACES = 200
+
+
+class LatencyHistogram:
+    """Fixed-bucket histogram; percentiles are reported as bucket upper bounds."""
+
+    def __init__(self, buckets_ms=LATENCY_BUCKETS_MS):
+        self.bounds = [b / 1000 for b in sorted(buckets_ms)]
+        self.counts = [0] * (len(self.bounds) + 1)  # Last bucket is overflow
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        seconds = max(0.0, seconds)
+        index = 0
+        while index < len(self.bounds) and seconds > self.bounds[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def _quantile(self, fraction: float) -> float:
+        target = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= target:
+                return round(bound * 1000, 1)
+        return round(self.max * 1000, 1)
+
+    def to_dict(self) -> dict:
+        cumulative, buckets = 0, []
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            buckets.append({"le_ms": round(bound * 1000, 1), "count": cumulative})
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 1) if self.count else 0.0,
+            "p50_ms": self._quantile(0.50) if self.count else 0.0,
+            "p95_ms": self._quantile(0.95) if self.count else 0.0,
+            "p99_ms": self._quantile(0.99) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 1),
+            "buckets": buckets,
+        }
+
+
+class AlertTrace:
+    """
+    Hop timings of one alert on its way from the AI engine to the user.
+
+    Hops measured here use the monotonic clock. "capture_to_*" marks compare
+    the wall clock with the engine's captured_at stamp, so they include any
+    clock skew between the engine and backend hosts; "engine" is the
+    engine's own skew-free capture-to-send time.
+    """
+
+    def __init__(self, recorder: Optional["LatencyRecorder"], trace_id: Optional[str],
+                 captured_at: Optional[float] = None, sent_at: Optional[float] = None,
+                 engine_ms: Optional[float] = None):
+        self.recorder = recorder
+        self.trace_id = trace_id
+        self.captured_at = captured_at
+        self.received_at = time.time()
+        self._started = time.monotonic()
+        self.hops: Dict[str, float] = {}
+        if engine_ms is not None:
+            self.hops["engine"] = engine_ms / 1000
+        if sent_at is not None:
+            self.hops["engine_to_backend"] = self.received_at - sent_at
+        self.mark("received")
+
+    def add(self, hop: str, seconds: float):
+        if self.recorder is not None:
+            self.hops[hop] = self.hops.get(hop, 0.0) + seconds
+
+    @contextmanager
+    def hop(self, name: str):
+        """Time the enclosed block as one hop of this alert."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(name, time.monotonic() - started)
+
+    def mark(self, name: str):
+        """Record the time from frame capture until now as capture_to_<name>."""
+        if self.captured_at is not None:
+            self.add(f"capture_to_{name}", time.time() - self.captured_at)
+
+    def finish(self):
+        """Close the trace and feed its hops into the histograms."""
+        if self.recorder is None:
+            return
+        self.add("backend_total", time.monotonic() - self._started)
+        self.recorder.record(self)
+        self.recorder = None
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "received_at": self.received_at,
+            "hops_ms": {hop: round(seconds * 1000, 1) for hop, seconds in self.hops.items()},
+        }
+
+
+# Stand-in for callers that are not part of a traced alert
+NO_TRACE = AlertTrace(None, None)
+
+
+class LatencyRecorder:
+    """Per-hop histograms and the most recent traces of received alerts."""
+
+    def __init__(self, buckets_ms=LATENCY_BUCKETS_MS, recent: int = RECENT_TRACES):
+        self.buckets_ms = buckets_ms
+        self._hops: Dict[str, LatencyHistogram] = {}
+        self._recent = deque(maxlen=recent)
+        self._lock = threading.Lock()
+
+    def start(self, trace_id: Optional[str], captured_at: Optional[float] = None,
+              sent_at: Optional[float] = None, engine_ms: Optional[float] = None) -> AlertTrace:
+        return AlertTrace(self, trace_id, captured_at, sent_at, engine_ms)
+
+    def record(self, trace: AlertTrace):
+        with self._lock:
+            for hop, seconds in trace.hops.items():
+                histogram = self._hops.get(hop)
+                if histogram is None:
+                    histogram = self._hops[hop] = LatencyHistogram(self.buckets_ms)
+                histogram.observe(seconds)
+            self._recent.append(trace.to_dict())
+
+    def stats(self, recent: int = 20) -> dict:
+        with self._lock:
+            traces: List[dict] = list(self._recent)[-recent:] if recent > 0 else []
+            return {
+                "hops": {hop: histogram.to_dict() for hop, histogram in self._hops.items()},
+                "recent": traces,
+            }
+
+    def reset(self):
+        with self._lock:
+            self._hops.clear()
+            self._recent.clear()
+
+
+alert_latency = LatencyRecorder()